@@ -0,0 +1,380 @@
+"""
+Scene benchmark: renders Nivel1 or a synthetic scene of many meshes along a
+camera path, with a fixed time step, and reports the startup time, the CPU
+time of each phase, the draw calls and the frame time distribution as JSON.
+
+    python -m benchmarks.scene_benchmark --suite --output results.json
+    python -m benchmarks.scene_benchmark --suite --baseline
+    python -m benchmarks.scene_benchmark --scene synthetic --meshes 10000 --frames 60
+
+Runs headless (EGL, see core/headless.py) unless --window is given.
+With --baseline, results are compared to a stored run (by default
+benchmarks/baseline.json) and the exit status is 1 when a measure got
+worse than the tolerance allows. Times only compare on the same machine:
+the committed baseline was measured on Mesa llvmpipe, without Nivel1,
+whose assets were missing. Regenerate it on the machine that runs the
+comparison, before the change being measured:
+
+    python -m benchmarks.scene_benchmark --suite --output benchmarks/baseline.json
+
+Each scene replays the camera path stored in benchmarks/paths/<scene>.json;
+--write-paths creates the missing files with orbits around the scene.
+To replay real play, record a path in the game with F5 (start and stop)
+and copy the camera_path.json it writes to benchmarks/paths/nivel1.json.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+# The OpenGL platform must be chosen before OpenGL is imported
+if __name__ == "__main__" and "--window" not in sys.argv:
+    from core import headless
+    headless.setup_environment()
+
+import OpenGL.GL as GL
+import numpy as np
+
+from core.base import Base
+from core_ext.camera import Camera
+from core_ext.mesh import Mesh
+from core_ext.renderer2 import Renderer
+from core_ext.scene import Scene
+from core_ext.static_batcher import StaticBatcher
+from extras.camera_path import CameraPath
+from geometry.box import BoxGeometry
+from geometry.sphere import SphereGeometry
+from light.ambient import AmbientLight
+from light.directional import DirectionalLight
+from material.lambert import LambertMaterial
+
+# Scenes of the suite: (scene, number of meshes, frames)
+SUITE = [("nivel1", None, 300),
+         ("synthetic", 1000, 300),
+         ("synthetic", 10000, 120),
+         ("synthetic", 100000, 30)]
+# Stored camera paths and results
+PATH_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "paths")
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+# Distance between the meshes of the synthetic grid
+GRID_SPACING = 2.5
+# Measures compared with the baseline; larger values are worse
+COMPARED_MEASURES = [("startup", "total_ms"), ("frame", "p50"), ("frame", "p95"),
+                     ("draw_calls", "mean")]
+
+
+def scene_key(scene_name, mesh_count=None, static_batching=False):
+    """ Name of a benchmarked scene in the results, e.g. synthetic-10k or synthetic-10k-batched """
+    key = scene_name
+    if scene_name == "synthetic":
+        key += f"-{mesh_count // 1000}k" if mesh_count % 1000 == 0 else f"-{mesh_count}"
+    return key + "-batched" if static_batching else key
+
+
+def camera_path_file(scene_name, mesh_count=None):
+    """ File of the camera path replayed in a scene; batched scenes use the path of the scene """
+    return os.path.join(PATH_DIRECTORY, scene_key(scene_name, mesh_count) + ".json")
+
+
+def default_camera_path(scene_name, mesh_count=None):
+    """ Orbit around a scene, looking at its center """
+    if scene_name == "nivel1":
+        # Around the course, from the start to the final portal and the checkpoint
+        return CameraPath.orbit(center=(15, 15, -10), radius=45, height=20, duration=10)
+    # From outside the grid of the synthetic scene
+    size = math.ceil(mesh_count ** (1 / 3)) * GRID_SPACING
+    return CameraPath.orbit(radius=size * 1.2, height=size * 0.5, duration=10)
+
+
+class SceneBenchmark(Base):
+    """
+    Application rendering a benchmark scene for a number of frames,
+    measuring each phase with the profiler
+    """
+    def __init__(self, scene_name="synthetic", mesh_count=1000, camera_path=None, static_batching=False,
+                 warmup_frames=10, screen_size=(800, 600), headless=True):
+        start = time.perf_counter()
+        super().__init__(screen_size, headless)
+        self._scene_name = scene_name
+        self._mesh_count = mesh_count
+        self._camera_path = camera_path
+        self._static_batching = static_batching
+        self._warmup_frames = warmup_frames
+        self._startup = {"context_ms": (time.perf_counter() - start) * 1000}
+        self._frame_index = 0
+        self._render_stats_list = []
+        self.profiler.enabled = True
+
+    def initialize(self):
+        start = time.perf_counter()
+        width, height = self.screen_size
+        self.renderer = Renderer(clear_color=(0.5, 0.7, 0.9))
+        self.renderer.default_render_target = self.render_target
+        self.renderer.profiler = self.profiler
+        self.scene = Scene()
+        self.camera = Camera(aspect_ratio=width / height)
+        self.scene.add(self.camera)
+        self._nivel = None
+        self._moving_mesh_list = []
+        if self._scene_name == "nivel1":
+            # The level already batches its static meshes
+            self._build_nivel1()
+        else:
+            self._build_synthetic()
+        self._source_mesh_count = len(self.scene.descendants_of_type(Mesh))
+        if self._static_batching and self._nivel is None:
+            moving_set = set(map(id, self._moving_mesh_list))
+            static_mesh_list = [mesh for mesh in self.scene.descendants_of_type(Mesh) if id(mesh) not in moving_set]
+            StaticBatcher().batch(self.scene, static_mesh_list)
+        if self._camera_path is None:
+            self._camera_path = default_camera_path(self._scene_name, self._mesh_count)
+        self._startup["scene_ms"] = (time.perf_counter() - start) * 1000
+        # Read while the context exists
+        self._environment = environment()
+
+    def _build_nivel1(self):
+        # Imported here: the level needs its asset files only when it is benchmarked
+        from extras.movement_rig import MovementRig
+        from extras.movement_rig3 import MovementRig3
+        from nivel.nivel1 import Nivel1
+        rig = MovementRig()
+        rig3 = MovementRig3()
+        self._nivel = Nivel1(self.scene, rig, rig3, self.time)
+        self.scene.add(rig)
+
+    def _build_synthetic(self):
+        """
+        A grid of meshes sharing three geometries and eight materials, lit by two lights;
+        one mesh in a hundred turns every frame
+        """
+        self.scene.add(AmbientLight(color=[0.2, 0.2, 0.2]))
+        self.scene.add(DirectionalLight(color=[0.8, 0.8, 0.8], direction=[-1, -1, -1]))
+        geometry_list = [BoxGeometry(), SphereGeometry(radius=0.6, theta_segments=8, phi_segments=16),
+                         BoxGeometry(width=1.5, height=0.3, depth=1)]
+        random = np.random.default_rng(0)
+        material_list = [LambertMaterial(property_dict={"baseColor": list(random.uniform(0.2, 1, 3))},
+                                         number_of_light_sources=2) for _ in range(8)]
+        side = math.ceil(self._mesh_count ** (1 / 3))
+        spacing = GRID_SPACING
+        for index in range(self._mesh_count):
+            x, y, z = index % side, (index // side) % side, index // (side * side)
+            mesh = Mesh(geometry_list[index % len(geometry_list)], material_list[index % len(material_list)])
+            mesh.set_position([(x - side / 2) * spacing, (y - side / 2) * spacing, (z - side / 2) * spacing])
+            self.scene.add(mesh)
+            if index % 100 == 0:
+                self._moving_mesh_list.append(mesh)
+
+    def update(self):
+        start = time.perf_counter()
+        if self._frame_index == self._warmup_frames:
+            # Shader compilation and first uploads belong to the startup
+            self.profiler.reset()
+            self._render_stats_list = []
+        with self.profiler.scope("camera"):
+            self._camera_path.apply(self.camera, self.time)
+        with self.profiler.scope("scene"):
+            if self._nivel is not None:
+                self._nivel.time = self.time
+                self._nivel.distort_material.uniform_dict["time"].data += self.delta_time / 5
+                self._nivel.update_Cubos()
+                self._nivel.update_jump(self.delta_time)
+            for mesh in self._moving_mesh_list:
+                mesh.rotate_y(self.delta_time)
+        with self.profiler.scope("render"):
+            self.renderer.render(self.scene, self.camera)
+        self._render_stats_list.append(dict(self.renderer.render_stats))
+        if self._frame_index == 0:
+            # Includes compiling the shaders and the first upload of the uniforms
+            self._startup["first_frame_ms"] = (time.perf_counter() - start) * 1000
+        self._frame_index += 1
+
+    @property
+    def environment(self):
+        return self._environment
+
+    def results(self):
+        """ Measures of the run, as a dictionary that can be stored as JSON """
+        summary = self.profiler.summary()
+        frame_times = self.profiler.times("frame")
+        startup = dict(self._startup)
+        startup["total_ms"] = sum(startup.values())
+        draw_calls = np.array([stats["draw_calls"] for stats in self._render_stats_list])
+        return {
+            "scene": self._scene_name,
+            "meshes": self._source_mesh_count,
+            "drawn_meshes": len(self.scene.descendants_of_type(Mesh)),
+            "static_batching": self._static_batching,
+            "frames": len(frame_times),
+            "startup": startup,
+            "frame": summary["frame"],
+            "phases": {name: stats for name, stats in summary.items() if name != "frame"},
+            "draw_calls": {"mean": float(draw_calls.mean()) if len(draw_calls) else 0.0,
+                           "max": int(draw_calls.max()) if len(draw_calls) else 0},
+            "culled": float(np.mean([stats["culled"] for stats in self._render_stats_list] or [0])),
+            "discarded_gpu_results": self.profiler.discarded_gpu_results,
+        }
+
+
+def environment():
+    """ Describe the machine and the code measured """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"commit": commit,
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "renderer": GL.glGetString(GL.GL_RENDERER).decode() if GL.glGetString(GL.GL_RENDERER) else None}
+
+
+def run_scene(scene_name, mesh_count, frame_count, path_file=None, static_batching=False,
+              warmup_frames=10, headless=True):
+    """
+    Benchmark one scene in this process; return its results and the environment.
+    Without path_file, the stored path of the scene is replayed, or an orbit when there is none.
+    """
+    if path_file is None and os.path.isfile(camera_path_file(scene_name, mesh_count)):
+        path_file = camera_path_file(scene_name, mesh_count)
+    camera_path = CameraPath.load(path_file) if path_file else None
+    benchmark = SceneBenchmark(scene_name, mesh_count, camera_path, static_batching,
+                               warmup_frames, headless=headless)
+    benchmark.run_frames(frame_count + warmup_frames)
+    results = benchmark.results()
+    results["camera_path"] = os.path.relpath(path_file) if path_file else "orbit"
+    return results, benchmark.environment
+
+
+def run_suite(frame_scale=1.0, path_file=None, static_batching=False, extra_arguments=()):
+    """
+    Benchmark every scene of the suite, each in a new process:
+    the OpenGL context and the asset caches of a run must not leak into the next
+    """
+    scene_dict = {}
+    environment_dict = None
+    for scene_name, mesh_count, frame_count in SUITE:
+        name = scene_key(scene_name, mesh_count, static_batching)
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "result.json")
+            command = [sys.executable, "-m", "benchmarks.scene_benchmark", "--scene", scene_name,
+                       "--frames", str(max(1, round(frame_count * frame_scale))), "--output", output]
+            if mesh_count is not None:
+                command += ["--meshes", str(mesh_count)]
+            if path_file:
+                command += ["--path", path_file]
+            if static_batching:
+                command.append("--batch")
+            command += list(extra_arguments)
+            print(f"{name}: {' '.join(command[1:])}", flush=True)
+            if subprocess.run(command).returncode != 0 or not os.path.isfile(output):
+                scene_dict[name] = {"error": "benchmark failed"}
+                continue
+            with open(output) as in_file:
+                stored = json.load(in_file)
+        environment_dict = stored["environment"]
+        scene_dict[name] = next(iter(stored["scenes"].values()))
+    return {"environment": environment_dict, "scenes": scene_dict}
+
+
+def compare(results, baseline, tolerance=0.1):
+    """
+    Return the regressions of the results against a baseline: the measures
+    more than tolerance (a fraction) larger than in the baseline
+    """
+    regression_list = []
+    for name, scene in results["scenes"].items():
+        base_scene = baseline.get("scenes", {}).get(name)
+        if base_scene is None or "error" in base_scene:
+            continue
+        if "error" in scene:
+            regression_list.append(f"{name}: {scene['error']}")
+            continue
+        for group, measure in COMPARED_MEASURES:
+            new_value = scene[group][measure]
+            old_value = base_scene[group][measure]
+            if old_value > 0 and new_value > old_value * (1 + tolerance):
+                regression_list.append(f"{name} {group}.{measure}: {old_value:.2f} -> {new_value:.2f} "
+                                       f"(+{(new_value / old_value - 1) * 100:.0f}%)")
+    return regression_list
+
+
+def write_camera_paths():
+    """ Store the default path of every scene of the suite that has no stored path """
+    os.makedirs(PATH_DIRECTORY, exist_ok=True)
+    for scene_name, mesh_count, _ in SUITE:
+        file_name = camera_path_file(scene_name, mesh_count)
+        if os.path.isfile(file_name):
+            print(f"{file_name}: kept")
+            continue
+        default_camera_path(scene_name, mesh_count).save(file_name)
+        print(f"{file_name}: written")
+
+
+def print_results(results):
+    print(f"{'scene':<24}{'meshes':>8}{'startup':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'draws':>8}  (ms)")
+    for name, scene in results["scenes"].items():
+        if "error" in scene:
+            print(f"{name:<24}  {scene['error']}")
+            continue
+        frame = scene["frame"]
+        print(f"{name:<24}{scene['meshes']:>8}{scene['startup']['total_ms']:>10.0f}{frame['p50']:>10.2f}"
+              f"{frame['p95']:>10.2f}{frame['p99']:>10.2f}{scene['draw_calls']['mean']:>8.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scene rendering benchmark")
+    parser.add_argument("--suite", action="store_true", help="run every scene of the suite")
+    parser.add_argument("--scene", default="synthetic", choices=["synthetic", "nivel1"])
+    parser.add_argument("--meshes", type=int, default=1000, help="meshes of the synthetic scene")
+    parser.add_argument("--frames", type=int, default=120, help="measured frames, after the warm-up")
+    parser.add_argument("--warmup", type=int, default=10, help="frames run before measuring")
+    parser.add_argument("--frame-scale", type=float, default=1.0, help="scale the frames of the suite")
+    parser.add_argument("--path", help="camera path recorded as JSON (see CameraPath)")
+    parser.add_argument("--batch", action="store_true", help="merge the static meshes of the synthetic scene with StaticBatcher")
+    parser.add_argument("--output", help="file to store the results as JSON")
+    parser.add_argument("--baseline", nargs="?", const=BASELINE_FILE,
+                        help="results of a previous run to compare with (default: benchmarks/baseline.json)")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed increase over the baseline")
+    parser.add_argument("--window", action="store_true", help="render in a window instead of offscreen")
+    parser.add_argument("--write-paths", action="store_true", help="store the missing camera paths of the suite")
+    arguments = parser.parse_args()
+
+    if arguments.write_paths:
+        write_camera_paths()
+        return
+
+    if arguments.suite:
+        extra_arguments = ["--warmup", str(arguments.warmup)] + (["--window"] if arguments.window else [])
+        results = run_suite(arguments.frame_scale, arguments.path, arguments.batch, extra_arguments)
+    else:
+        scene_results, environment_dict = run_scene(arguments.scene, arguments.meshes, arguments.frames,
+                                                    arguments.path, arguments.batch, arguments.warmup,
+                                                    headless=not arguments.window)
+        name = scene_key(arguments.scene, arguments.meshes, arguments.batch)
+        results = {"environment": environment_dict, "scenes": {name: scene_results}}
+    print_results(results)
+    if arguments.output:
+        with open(arguments.output, "w") as out_file:
+            json.dump(results, out_file, indent=1)
+    if arguments.baseline:
+        with open(arguments.baseline) as in_file:
+            baseline = json.load(in_file)
+        if (baseline.get("environment") or {}).get("renderer") != (results["environment"] or {}).get("renderer"):
+            print(f"Warning: the baseline was measured on {baseline['environment']['renderer']}; "
+                  f"times only compare on the same machine")
+        regression_list = compare(results, baseline, arguments.tolerance)
+        for regression in regression_list:
+            print(f"REGRESSION {regression}")
+        if regression_list:
+            sys.exit(1)
+        print(f"No regressions against {arguments.baseline} (commit {(baseline.get('environment') or {}).get('commit')})")
+
+
+if __name__ == '__main__':
+    main()
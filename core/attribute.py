@@ -1,34 +1,101 @@
 import OpenGL.GL as GL
 import numpy as np
 
+from core.resource_tracker import GLResource, ResourceTracker
 
-class Attribute:
-    def __init__(self, data_type, data):
+
+class Attribute(GLResource):
+    # Number of components of each data type
+    _COMPONENT_COUNT = {"int": 1, "float": 1, "vec2": 2, "vec3": 3, "vec4": 4}
+
+    def __init__(self, data_type, data, usage=GL.GL_STATIC_DRAW):
         # type of elements in data array: int | float | vec2 | vec3 | vec4
         self._data_type = data_type
-        # array of data to be stored in buffer
-        self._data = data
+        # data to be stored in buffer, as a contiguous float32 array
+        # with one row per vertex (a single column for int and float)
+        self._data = self._as_array(data)
+        # GL_STATIC_DRAW for data uploaded once; GL_DYNAMIC_DRAW or GL_STREAM_DRAW
+        # for data changed often, which is updated without reallocating the buffer
+        self._usage = usage
         # reference of available buffer from GPU
         self._buffer_ref = GL.glGenBuffers(1)
+        ResourceTracker.track("buffer", self._buffer_ref, self)
+        # bytes allocated in the GPU buffer; dynamic buffers may have room to spare
+        self._buffer_size = 0
         # Upload data immediately
         self.upload_data()
 
+    @property
+    def data_type(self):
+        return self._data_type
+
     @property
     def data(self):
         return self._data
 
     @data.setter
     def data(self, data):
-        self._data = data
+        self._data = self._as_array(data)
+
+    @property
+    def usage(self):
+        return self._usage
+
+    @property
+    def dynamic(self):
+        return self._usage != GL.GL_STATIC_DRAW
+
+    def _as_array(self, data):
+        """ Convert data to a float32 array of the attribute shape; float32 arrays are not copied """
+        data = np.ascontiguousarray(data, dtype=np.float32)
+        component_count = self._COMPONENT_COUNT.get(self._data_type, 1)
+        if component_count == 1:
+            return data.reshape(-1)
+        return data.reshape(-1, component_count)
+
+    def extend(self, data):
+        """ Append elements to the data; upload_data must be called afterwards """
+        self._data = np.concatenate([self._data, self._as_array(data)])
 
     def upload_data(self):
         """ Upload the data to a GPU buffer """
-        # Convert data to numpy array format; convert numbers to 32-bit floats
-        data = np.array(self._data).astype(np.float32)
+        data = self._data
         # Select buffer used by the following functions
         GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self._buffer_ref)
-        # Store data in currently bound buffer
-        GL.glBufferData(GL.GL_ARRAY_BUFFER, data.ravel(), GL.GL_STATIC_DRAW)
+        if not self.dynamic:
+            # Store data in currently bound buffer
+            GL.glBufferData(GL.GL_ARRAY_BUFFER, data.ravel(), self._usage)
+            self._buffer_size = data.nbytes
+        elif data.nbytes > self._buffer_size:
+            # Grow geometrically, so that data growing every frame is rarely reallocated
+            self._buffer_size = max(data.nbytes, 2 * self._buffer_size)
+            GL.glBufferData(GL.GL_ARRAY_BUFFER, self._buffer_size, None, self._usage)
+            GL.glBufferSubData(GL.GL_ARRAY_BUFFER, 0, data.nbytes, data.ravel())
+        else:
+            # Orphan the storage: the driver hands out fresh memory of the same size
+            # instead of waiting for draws that still read the previous data
+            GL.glBufferData(GL.GL_ARRAY_BUFFER, self._buffer_size, None, self._usage)
+            GL.glBufferSubData(GL.GL_ARRAY_BUFFER, 0, data.nbytes, data.ravel())
+        ResourceTracker.resize("buffer", self._buffer_ref, self._buffer_size)
+
+    def release(self):
+        """ Delete the GPU buffer """
+        if self._buffer_ref is not None:
+            GL.glDeleteBuffers(1, [self._buffer_ref])
+            ResourceTracker.untrack("buffer", self._buffer_ref)
+            self._buffer_ref = None
+            self._buffer_size = 0
+
+    def upload_range(self, start, end):
+        """ Upload only the elements start..end-1 of the data, e.g. the vertices changed this frame """
+        element_size = self._COMPONENT_COUNT[self._data_type] * 4
+        if end * element_size > self._buffer_size:
+            # The buffer is too small for the new elements
+            self.upload_data()
+            return
+        data = self._data[start:end]
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self._buffer_ref)
+        GL.glBufferSubData(GL.GL_ARRAY_BUFFER, start * element_size, data.nbytes, data.ravel())
 
     def associate_variable(self, program_ref, variable_name):
         """ Associate variable in program with the buffer """
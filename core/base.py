@@ -1,45 +1,65 @@
 import pygame
 import sys
+import numpy as np
 import OpenGL.GL as GL
 
 
+from core import headless as headless_context
 from core.input import Input
+from core.profiler import Profiler
 from core.utils import Utils
+from core_ext.render_target import RenderTarget
 
 
 class Base:
-    def __init__(self, screen_size=(512, 512)):
+    def __init__(self, screen_size=(512, 512), headless=False):
         # Initialize all pygame modules
         pygame.init()
         self.screen_size = screen_size
-        # Indicate rendering details
-        self.display_flags = pygame.DOUBLEBUF | pygame.OPENGL | pygame.FULLSCREEN
-        #self.display_flags = pygame.DOUBLEBUF | pygame.OPENGL
-
-        # Initialize buffers to perform antialiasing
-        pygame.display.gl_set_attribute(pygame.GL_MULTISAMPLEBUFFERS, 1)
-        pygame.display.gl_set_attribute(pygame.GL_MULTISAMPLESAMPLES, 4)
-        # Use a core OpenGL profile for cross-platform compatibility
-        pygame.display.gl_set_attribute(pygame.GL_CONTEXT_PROFILE_MASK, pygame.GL_CONTEXT_PROFILE_CORE)
-        # Create and display the window
-        self._screen = pygame.display.set_mode((0,0), self.display_flags)
-        #self._screen = pygame.display.set_mode(self.screen_size, self.display_flags)
-        # Set the text and icon that appears in the title bar of the window
-        pygame.display.set_caption("BeachRush")
-        icon = pygame.image.load('images/icon.png')
-        pygame.display.set_icon(icon)
+        # Without a display, frames are rendered offscreen into render_target;
+        # headless.setup_environment() must have been called before importing this module
+        self._headless = headless
+        self._render_target = None
+        self._egl_context = None
+        if headless:
+            # The dummy video driver still gives pygame a screen surface, used for its size
+            self._screen = pygame.display.set_mode(screen_size)
+            self._egl_context = headless_context.create_context()
+            self._render_target = RenderTarget(screen_size)
+        else:
+            # Indicate rendering details
+            self.display_flags = pygame.DOUBLEBUF | pygame.OPENGL | pygame.FULLSCREEN
+            #self.display_flags = pygame.DOUBLEBUF | pygame.OPENGL
+
+            # Initialize buffers to perform antialiasing
+            pygame.display.gl_set_attribute(pygame.GL_MULTISAMPLEBUFFERS, 1)
+            pygame.display.gl_set_attribute(pygame.GL_MULTISAMPLESAMPLES, 4)
+            # Use a core OpenGL profile for cross-platform compatibility
+            pygame.display.gl_set_attribute(pygame.GL_CONTEXT_PROFILE_MASK, pygame.GL_CONTEXT_PROFILE_CORE)
+            # Create and display the window
+            self._screen = pygame.display.set_mode((0,0), self.display_flags)
+            #self._screen = pygame.display.set_mode(self.screen_size, self.display_flags)
+            # Set the text and icon that appears in the title bar of the window
+            pygame.display.set_caption("BeachRush")
+            icon = pygame.image.load('images/icon.png')
+            pygame.display.set_icon(icon)
         # Determine if main loop is active
         self._running = True
         # Manage time-related data and operations
         self._clock = pygame.time.Clock()
         # Manage user input
         self._input = Input()
+        # Times the parts of each frame; F3 turns it on and off
+        self._profiler = Profiler()
         # number of seconds application has been running
         self._time = 0
         # 
         self.resize = False
+        # seconds since the previous frame
+        self._delta_time = 0
 
-        pygame.mouse.set_visible(False)
+        if not headless:
+            pygame.mouse.set_visible(False)
         # Print the system information
         Utils.print_system_info()
 
@@ -47,10 +67,23 @@ class Base:
     def delta_time(self):
         return self._delta_time
 
+    @property
+    def headless(self):
+        return self._headless
+
+    @property
+    def render_target(self):
+        """ Target of the rendered frames in headless mode; None when drawing to the window """
+        return self._render_target
+
     @property
     def input(self):
         return self._input
 
+    @property
+    def profiler(self):
+        return self._profiler
+
     @property
     def time(self):
         return self._time
@@ -79,12 +112,18 @@ class Base:
         """ Implement by extending class """
         pass
 
+    def shutdown(self):
+        """ Implement by extending class; called when the main loop ends, while the context exists """
+        pass
+
     def run(self):
         # Startup #
         self.initialize()
         # main loop #
         while self._running:
+            self._profiler.begin_frame()
             # process input #
+            self._profiler.begin("input")
             self._input.update()
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
@@ -93,6 +132,9 @@ class Base:
             
             if self._input.quit:
                 self._running = False
+            if self._input.is_key_down("f3"):
+                self._profiler.toggle()
+            self._profiler.end()
 
             #if self._input._fullscreen:
                 #self.toggle_fullscreen()
@@ -103,16 +145,60 @@ class Base:
             # Increment time application has been running
             self._time += self._delta_time
             # Update #
+            self._profiler.begin("update")
             self.update()
+            self._profiler.end()
 
             if self._input._fullscreen:
                 self._input._fullscreen = False
 
             # Render #
             # Display image on screen
+            self._profiler.begin("flip")
             pygame.display.flip()
+            self._profiler.end()
             # Pause if necessary to achieve 60 FPS
+            self._profiler.begin("tick")
             self._clock.tick(60)
+            self._profiler.end()
+            self._profiler.end_frame()
         # Shutdown #
+        self.shutdown()
         pygame.quit()
         sys.exit()
+
+    def run_frames(self, frame_count, time_step=1/60, seed=0, on_frame=None):
+        """
+        Run a fixed number of frames unattended, e.g. in headless mode. Each frame
+        advances the time by time_step instead of the clock time and random numbers
+        are seeded, so every run computes the same frames. The GPU is waited for at the
+        end of each frame, or the window is updated. on_frame(self, frame_index) is called after each frame,
+        e.g. to save the image of render_target.
+        """
+        np.random.seed(seed)
+        self.initialize()
+        self._delta_time = time_step
+        for frame_index in range(frame_count):
+            self._profiler.begin_frame()
+            self._profiler.begin("input")
+            self._input.update()
+            self._profiler.end()
+            self._time += time_step
+            self._profiler.begin("update")
+            self.update()
+            self._profiler.end()
+            self._profiler.begin("finish")
+            if self._headless:
+                GL.glFinish()
+            else:
+                pygame.display.flip()
+            self._profiler.end()
+            self._profiler.end_frame()
+            if on_frame is not None:
+                on_frame(self, frame_index)
+            if not self._running:
+                break
+        self.shutdown()
+        if self._egl_context is not None:
+            headless_context.destroy_context(*self._egl_context)
+            self._egl_context = None
@@ -0,0 +1,81 @@
+"""
+Offscreen OpenGL context for running without a display, e.g. on servers.
+PyOpenGL chooses its platform when first imported, so setup_environment()
+must run before any module importing OpenGL:
+
+    from core import headless
+    headless.setup_environment()
+    from main import Main
+"""
+import ctypes
+import os
+
+
+def setup_environment():
+    """ Make PyOpenGL use EGL and pygame use its dummy video and audio drivers """
+    os.environ["PYOPENGL_PLATFORM"] = "egl"
+    # Mesa can create contexts without any window system
+    os.environ.setdefault("EGL_PLATFORM", "surfaceless")
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+
+def create_context(major_version=3, minor_version=3):
+    """
+    Create an OpenGL core profile context with EGL and make it current.
+    It has no default framebuffer: draw into a RenderTarget.
+    Without a GPU, Mesa renders on the CPU (llvmpipe).
+    """
+    if os.environ.get("PYOPENGL_PLATFORM") != "egl":
+        raise RuntimeError("Call headless.setup_environment() before importing OpenGL")
+    from OpenGL import EGL
+    display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+    major, minor = EGL.EGLint(), EGL.EGLint()
+    if display == EGL.EGL_NO_DISPLAY or not EGL.eglInitialize(display, ctypes.pointer(major), ctypes.pointer(minor)):
+        raise RuntimeError("No EGL display available; install Mesa (libEGL) for offscreen rendering")
+    # The default surface type is a window, which surfaceless displays do not have
+    config_attributes = [EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+                         EGL.EGL_RED_SIZE, 8, EGL.EGL_GREEN_SIZE, 8, EGL.EGL_BLUE_SIZE, 8, EGL.EGL_DEPTH_SIZE, 24, EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT, EGL.EGL_NONE]
+    config = EGL.EGLConfig()
+    config_count = EGL.EGLint()
+    if not EGL.eglChooseConfig(display, (EGL.EGLint * len(config_attributes))(*config_attributes),
+                               ctypes.pointer(config), 1, ctypes.pointer(config_count)) or not config_count.value:
+        raise RuntimeError("No EGL configuration supports desktop OpenGL")
+    EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+    context_attributes = [EGL.EGL_CONTEXT_MAJOR_VERSION, major_version,
+                          EGL.EGL_CONTEXT_MINOR_VERSION, minor_version,
+                          EGL.EGL_CONTEXT_OPENGL_PROFILE_MASK, EGL.EGL_CONTEXT_OPENGL_CORE_PROFILE_BIT,
+                          EGL.EGL_NONE]
+    context = EGL.eglCreateContext(display, config, EGL.EGL_NO_CONTEXT,
+                                   (EGL.EGLint * len(context_attributes))(*context_attributes))
+    if context == EGL.EGL_NO_CONTEXT:
+        raise RuntimeError(f"Cannot create an OpenGL {major_version}.{minor_version} core context")
+    if not EGL.eglMakeCurrent(display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, context):
+        raise RuntimeError("Cannot make the EGL context current")
+    return display, context
+
+
+def destroy_context(display, context):
+    from OpenGL import EGL
+    EGL.eglMakeCurrent(display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, EGL.EGL_NO_CONTEXT)
+    EGL.eglDestroyContext(display, context)
+    EGL.eglTerminate(display)
+
+
+def read_pixels(render_target):
+    """ Return the color image of a render target as a (height, width, 4) uint8 array, top row first """
+    import OpenGL.GL as GL
+    import numpy as np
+    GL.glBindFramebuffer(GL.GL_FRAMEBUFFER, render_target.framebuffer_ref)
+    data = GL.glReadPixels(0, 0, render_target.width, render_target.height, GL.GL_RGBA, GL.GL_UNSIGNED_BYTE)
+    pixels = np.frombuffer(data, dtype=np.uint8).reshape(render_target.height, render_target.width, 4)
+    # OpenGL rows start at the bottom
+    return pixels[::-1]
+
+
+def save_image(render_target, file_name):
+    """ Save the color image of a render target, e.g. as PNG """
+    import pygame
+    pixels = read_pixels(render_target)
+    surface = pygame.image.frombuffer(pixels.tobytes(), (render_target.width, render_target.height), "RGBA")
+    pygame.image.save(surface, file_name)
@@ -0,0 +1,56 @@
+import OpenGL.GL as GL
+import numpy as np
+
+from core.resource_tracker import GLResource, ResourceTracker
+
+
+class Index(GLResource):
+    """ Element array buffer with the vertex indices of an indexed geometry """
+    def __init__(self, data):
+        # array of vertex indices, three per triangle
+        self._data = data
+        # reference of available buffer from GPU
+        self._buffer_ref = GL.glGenBuffers(1)
+        ResourceTracker.track("buffer", self._buffer_ref, self)
+        # Upload data immediately
+        self.upload_data()
+
+    @property
+    def data(self):
+        return self._data
+
+    @data.setter
+    def data(self, data):
+        self._data = data
+
+    @property
+    def count(self):
+        """ Number of indices to draw """
+        return len(self._data)
+
+    def upload_data(self):
+        """ Upload the indices to a GPU buffer """
+        # Indices are drawn as GL_UNSIGNED_INT
+        data = np.ascontiguousarray(self._data, dtype=np.uint32)
+        # The element buffer binding belongs to the bound vertex array object:
+        # unbind it, or this buffer would replace the indices of another mesh
+        GL.glBindVertexArray(0)
+        # Select buffer used by the following functions
+        GL.glBindBuffer(GL.GL_ELEMENT_ARRAY_BUFFER, self._buffer_ref)
+        # Store data in currently bound buffer
+        GL.glBufferData(GL.GL_ELEMENT_ARRAY_BUFFER, data.ravel(), GL.GL_STATIC_DRAW)
+        ResourceTracker.resize("buffer", self._buffer_ref, data.nbytes)
+
+    def release(self):
+        """ Delete the GPU buffer """
+        if self._buffer_ref is not None:
+            GL.glDeleteBuffers(1, [self._buffer_ref])
+            ResourceTracker.untrack("buffer", self._buffer_ref)
+            self._buffer_ref = None
+
+    def associate(self):
+        """
+        Bind the buffer to the currently bound vertex array object,
+        which stores the association
+        """
+        GL.glBindBuffer(GL.GL_ELEMENT_ARRAY_BUFFER, self._buffer_ref)
@@ -2,9 +2,23 @@
 #          Sergio Jesus, CG 2024 (modified)
 #
 """Read vertices from OBJ file"""
-from typing import List
-def my_obj_reader(filename: str) -> List:
-    """Get the vertices from the file"""
+import os
+import time
+from typing import List, Tuple
+
+import numpy as np
+
+# Compiled meshes are stored next to their source file, in this folder
+CACHE_DIR_NAME = "__objcache__"
+# Bump when the layout of the cached arrays changes
+CACHE_VERSION = 3
+# Available parsers: "numpy" tokenizes the whole file in bulk,
+# "python" is the original line by line reader
+PARSERS = ("numpy", "python")
+
+
+def _parse_obj(filename: str) -> Tuple[List, List]:
+    """Parse the text OBJ file, expanding every face corner into a vertex"""
     vertices = list()
     vt_list = list()
     faces = list()
@@ -20,7 +34,7 @@ def my_obj_reader(filename: str) -> List:
                     vt_list.append([float(i) for i in line.split()[1:]])
             elif line[0] == 'f':
                 faces.append([list(map(int, i.split('/'))) for i in line.split()[1:]])
-    
+
     for face in faces:
         for elem in face:
             position_list.append(vertices[elem[0]-1])
@@ -28,7 +42,202 @@ def my_obj_reader(filename: str) -> List:
 
     return position_list, texture_list
 
+
+def _float_block(lines: List[str], width: int) -> np.ndarray:
+    """Convert a list of whitespace separated number lines into a (len(lines), width) array"""
+    if not lines:
+        return np.zeros((0, width), dtype=np.float32)
+    # split() accepts any amount of whitespace; numpy converts the strings in bulk
+    values = np.array(" ".join(lines).split(), dtype=np.float32)
+    per_line = values.size // len(lines)
+    if per_line * len(lines) != values.size or per_line < width:
+        raise ValueError("OBJ file has an inconsistent number of coordinates per line")
+    return values.reshape(-1, per_line)[:, :width]
+
+
+def _parse_obj_numpy(filename: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Parse the OBJ file in bulk with numpy.
+    Faces with more than three corners are fan triangulated,
+    negative (relative) indices are resolved and missing texture
+    coordinates are replaced by (0, 0).
+    """
+    with open(filename, 'r') as in_file:
+        lines = in_file.read().replace("\t", " ").splitlines()
+    # Select lines by their keyword; numpy converts the numbers in bulk
+    vertices = _float_block([line[2:] for line in lines if line[:2] == "v "], 3)
+    vt_list = _float_block([line[3:] for line in lines if line[:3] == "vt "], 2)
+    faces = [line[2:].strip() for line in lines if line[:2] == "f "]
+    if not faces:
+        return np.zeros((0, 3), dtype=np.float32), np.zeros((0, 2), dtype=np.float32)
+
+    face_text = " ".join(faces)
+    if "  " in face_text:
+        faces = [" ".join(face.split()) for face in faces]
+        face_text = " ".join(faces)
+    corner_count = np.array([face.count(" ") + 1 for face in faces], dtype=np.int64)
+    # Corner format is one of v, v/vt, v//vn or v/vt/vn; use 0 for a missing vt
+    face_text = face_text.replace("//", "/0/")
+    characters = np.frombuffer(face_text.encode(), dtype=np.uint8)
+    corner_of_slash = np.searchsorted(np.flatnonzero(characters == ord(" ")),
+                                      np.flatnonzero(characters == ord("/")))
+    slash_count = np.bincount(corner_of_slash, minlength=int(corner_count.sum()))
+    if (slash_count == slash_count[0]).all():
+        components = int(slash_count[0]) + 1
+        indices = np.array(face_text.replace("/", " ").split(), dtype=np.int64)
+    else:
+        # Formats are mixed within the file; pad every corner to v/vt/vn
+        corners = [(corner.split("/") + ["0", "0"])[:3] for corner in face_text.split()]
+        indices = np.array(corners, dtype=np.int64)
+        components = 3
+    indices = indices.reshape(-1, components)
+    v_index = indices[:, 0]
+    vt_index = indices[:, 1] if components > 1 else np.zeros_like(v_index)
+
+    # Negative indices refer to the elements defined before the face
+    if (v_index < 0).any() or (vt_index < 0).any():
+        kinds = np.array([line.split(" ", 1)[0] for line in lines])
+        is_face = kinds == "f"
+        v_before = np.repeat(np.cumsum(kinds == "v")[is_face], corner_count)
+        vt_before = np.repeat(np.cumsum(kinds == "vt")[is_face], corner_count)
+        v_index = np.where(v_index < 0, v_index + v_before + 1, v_index)
+        vt_index = np.where(vt_index < 0, vt_index + vt_before + 1, vt_index)
+
+    # Fan triangulation: corners (0, i, i + 1) of each face, for i in 1..n-2
+    triangle_count = corner_count - 2
+    face_start = np.cumsum(corner_count) - corner_count
+    first_corner = np.repeat(face_start, triangle_count)
+    triangle_start = np.cumsum(triangle_count) - triangle_count
+    fan = np.arange(triangle_count.sum()) - np.repeat(triangle_start, triangle_count) + 1
+    corners = np.stack([first_corner, first_corner + fan, first_corner + fan + 1], axis=1).ravel()
+
+    position = vertices[v_index[corners] - 1]
+    vt_corners = vt_index[corners]
+    if len(vt_list) > 0:
+        uv = vt_list[np.maximum(vt_corners, 1) - 1]
+        uv[vt_corners == 0] = 0
+    else:
+        uv = np.zeros((len(corners), 2), dtype=np.float32)
+    return position, uv
+
+
+def _make_indexed(position: np.ndarray, uv: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Merge the face corners that share the same position and texture coordinates.
+    Unique vertices keep the order of their first use, so that consecutive
+    triangles keep referencing nearby vertices.
+    """
+    rows = np.ascontiguousarray(np.hstack([position, uv]))
+    # View each row as a single opaque value so np.unique compares whole rows
+    keys = rows.view(np.dtype((np.void, rows.dtype.itemsize * rows.shape[1]))).ravel()
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    index = rank[inverse.ravel()].astype(np.uint32)
+    return position[first[order]], uv[first[order]], index
+
+
+def cache_path(filename: str, indexed: bool = False) -> str:
+    """Return the path of the compiled cache file for an OBJ file"""
+    directory, base_name = os.path.split(os.path.abspath(filename))
+    suffix = ".indexed.npz" if indexed else ".npz"
+    return os.path.join(directory, CACHE_DIR_NAME, base_name + suffix)
+
+
+def _source_key(filename: str, parser: str, indexed: bool) -> np.ndarray:
+    """Identify a version of the source file by its size and modification time"""
+    stat = os.stat(filename)
+    return np.array([CACHE_VERSION, PARSERS.index(parser), int(indexed),
+                     stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+
+def _load_cache(filename: str, key: np.ndarray, indexed: bool):
+    """Return the cached arrays, or None if the cache is missing or stale"""
+    path = cache_path(filename, indexed)
+    if not os.path.isfile(path):
+        return None
+    try:
+        with np.load(path) as cached:
+            if not np.array_equal(cached["key"], key):
+                return None
+            if str(cached["source"]) != os.path.abspath(filename):
+                return None
+            if indexed:
+                return cached["position"], cached["uv"], cached["index"]
+            return cached["position"], cached["uv"]
+    except (OSError, ValueError, KeyError):
+        # Corrupted or truncated cache file; it will be regenerated
+        return None
+
+
+def _save_cache(filename: str, key: np.ndarray, arrays: dict) -> None:
+    """Store the arrays in the cache; failing to write the cache is not an error"""
+    path = cache_path(filename, "index" in arrays)
+    temp_path = path + ".tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(temp_path, 'wb') as out_file:
+            np.savez(out_file, key=key, source=np.array(os.path.abspath(filename)), **arrays)
+        # Replace atomically so a concurrent reader never sees half a file
+        os.replace(temp_path, path)
+    except OSError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def my_obj_reader(filename: str, use_cache: bool = True,
+                  parser: str = "numpy", indexed: bool = False) -> Tuple[np.ndarray, ...]:
+    """
+    Get the vertices from the file, as contiguous float32 arrays
+    of shape (N, 3) for positions and (N, 2) for texture coordinates.
+    With indexed=True, every distinct vertex is stored once and a third
+    uint32 array holds three vertex indices per triangle.
+    The parsed arrays are cached on disk and only regenerated when the file changes.
+    """
+    if parser not in PARSERS:
+        raise ValueError(f"Unknown OBJ parser: {parser}")
+    key = _source_key(filename, parser, indexed)
+    if use_cache:
+        cached = _load_cache(filename, key, indexed)
+        if cached is not None:
+            return cached
+
+    if parser == "numpy":
+        position, uv = _parse_obj_numpy(filename)
+    else:
+        position, uv = _parse_obj(filename)
+    position = np.ascontiguousarray(np.array(position, dtype=np.float32).reshape(-1, 3))
+    uv = np.ascontiguousarray(np.array(uv, dtype=np.float32).reshape(-1, 2))
+    arrays = {"position": position, "uv": uv}
+    if indexed:
+        arrays["position"], arrays["uv"], arrays["index"] = _make_indexed(position, uv)
+
+    if use_cache:
+        _save_cache(filename, key, arrays)
+    return tuple(arrays.values())
+
+
+def benchmark(directory: str = "objetos") -> None:
+    """Compare both parsers (without cache) on every OBJ file of a folder"""
+    print(f"{'file':<22}{'python (s)':>12}{'numpy (s)':>12}{'speedup':>10}  same")
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".obj"):
+            continue
+        filename = os.path.join(directory, name)
+        start = time.perf_counter()
+        python_result = my_obj_reader(filename, use_cache=False, parser="python")
+        python_time = time.perf_counter() - start
+        start = time.perf_counter()
+        numpy_result = my_obj_reader(filename, use_cache=False, parser="numpy")
+        numpy_time = time.perf_counter() - start
+        # Only triangle-only files are expected to match, the python
+        # reader does not triangulate quads and ngons
+        same = all(a.shape == b.shape and np.array_equal(a, b)
+                   for a, b in zip(python_result, numpy_result))
+        print(f"{name:<22}{python_time:>12.3f}{numpy_time:>12.3f}"
+              f"{python_time / max(numpy_time, 1e-9):>9.1f}x  {same}")
+
+
 if __name__ == '__main__':
-    f_in = "cubo.obj"
-    result = my_obj_reader(f_in)
-    print(result)
\ No newline at end of file
+    benchmark()
@@ -0,0 +1,228 @@
+import collections
+import contextlib
+import csv
+import ctypes
+import json
+import time
+
+import OpenGL.GL as GL
+import OpenGL.raw.GL.VERSION.GL_3_3 as GL_3_3
+import numpy as np
+
+from core.resource_tracker import GLResource, ResourceTracker
+
+# Returned by scope() while the profiler is off, so that timed code costs one call
+_NULL_SCOPE = contextlib.nullcontext()
+# Prefix of the names of GPU times, measured with timer queries
+GPU_PREFIX = "gpu."
+
+
+class Profiler(GLResource):
+    """
+    Measures the time of named parts of each frame and keeps the last frames,
+    to report percentiles (p50/p95/p99) and export them as CSV or JSON.
+    Parts are timed with scope(name) blocks, or begin(name) / end() pairs;
+    times of a name used several times in a frame are added up.
+    With gpu=True the GPU time of the part is also measured, by a timer query
+    whose result is read some frames later, without waiting for the GPU.
+    GPU parts cannot be nested; an inner one is timed on the CPU only.
+    Turning the profiler on or off takes effect at the next frame; while off,
+    scope() and begin() return at once.
+    Mesa llvmpipe returns a meaningless time for the first timer query, so
+    by default (discard_first_gpu_result=None) that single result is dropped
+    on llvmpipe only; True or False forces the choice. The number of dropped
+    results is exported with the statistics.
+    """
+    def __init__(self, history=600, enabled=False, gpu_timing=True, discard_first_gpu_result=None):
+        # The last recorded frames, as dictionaries name -> milliseconds
+        self._frame_list = collections.deque(maxlen=history)
+        self._enabled = False
+        self._enabled_next = enabled
+        self.gpu_timing = gpu_timing
+        # Names in the order they were first measured
+        self._name_list = ["frame"]
+        self._frame_index = 0
+        self._frame_start = None
+        self._current = None
+        # [name, start time, query or None] of the parts being measured
+        self._stack = []
+        self._gpu_active = False
+        # [frame record, name, query] of the timer queries not read yet
+        self._pending_list = []
+        self._query_pool = []
+        # None: decided from the driver name when the first query is read
+        self._discard_first_gpu_result = discard_first_gpu_result
+        self._first_query_read = False
+        self._discarded_gpu_results = 0
+
+    @property
+    def enabled(self):
+        return self._enabled_next
+
+    @enabled.setter
+    def enabled(self, enabled):
+        self._enabled_next = enabled
+
+    def toggle(self):
+        self._enabled_next = not self._enabled_next
+
+    @property
+    def frame_count(self):
+        return len(self._frame_list)
+
+    @property
+    def name_list(self):
+        return list(self._name_list)
+
+    def begin_frame(self):
+        """ Start measuring a frame; call at the start of each iteration of the main loop """
+        self._enabled = self._enabled_next
+        self._stack = []
+        self._gpu_active = False
+        self._read_queries()
+        if not self._enabled:
+            self._current = None
+            return
+        self._frame_index += 1
+        self._current = {"index": self._frame_index}
+        self._frame_start = time.perf_counter()
+
+    def end_frame(self):
+        """ Store the measures of the frame """
+        if self._current is None:
+            return
+        self._current["frame"] = (time.perf_counter() - self._frame_start) * 1000
+        self._frame_list.append(self._current)
+        self._current = None
+
+    def begin(self, name, gpu=False):
+        """ Start measuring a part of the frame """
+        if self._current is None:
+            return
+        query = None
+        if gpu and self.gpu_timing and not self._gpu_active:
+            query = self._query_pool.pop() if self._query_pool else self._new_query()
+            GL.glBeginQuery(GL.GL_TIME_ELAPSED, query)
+            self._gpu_active = True
+        self._stack.append([name, time.perf_counter(), query])
+
+    def end(self):
+        """ Stop measuring the part started last """
+        if self._current is None or not self._stack:
+            return
+        name, start, query = self._stack.pop()
+        self._add(self._current, name, (time.perf_counter() - start) * 1000)
+        if query is not None:
+            GL.glEndQuery(GL.GL_TIME_ELAPSED)
+            self._gpu_active = False
+            self._pending_list.append([self._current, GPU_PREFIX + name, query])
+
+    @contextlib.contextmanager
+    def _scope(self, name, gpu):
+        self.begin(name, gpu)
+        try:
+            yield
+        finally:
+            self.end()
+
+    def scope(self, name, gpu=False):
+        """ Context manager measuring the code of a with block """
+        if self._current is None:
+            return _NULL_SCOPE
+        return self._scope(name, gpu)
+
+    def _add(self, record, name, milliseconds):
+        if name not in record:
+            if name not in self._name_list:
+                self._name_list.append(name)
+            record[name] = 0.0
+        record[name] += milliseconds
+
+    def _new_query(self):
+        query = GL.glGenQueries(1)[0]
+        ResourceTracker.track("query", query, self)
+        return query
+
+    def _read_queries(self):
+        """ Store the results of the finished timer queries; results come in order """
+        while self._pending_list:
+            record, name, query = self._pending_list[0]
+            if not GL.glGetQueryObjectiv(query, GL.GL_QUERY_RESULT_AVAILABLE):
+                break
+            self._pending_list.pop(0)
+            # The PyOpenGL wrapper has no array type for the 64 bit result
+            nanoseconds = ctypes.c_uint64()
+            GL_3_3.glGetQueryObjectui64v(query, GL.GL_QUERY_RESULT, ctypes.byref(nanoseconds))
+            if not self._first_query_read and self._discards_first_result():
+                self._discarded_gpu_results += 1
+            else:
+                self._add(record, name, nanoseconds.value / 1e6)
+            self._first_query_read = True
+            self._query_pool.append(query)
+
+    def _discards_first_result(self):
+        if self._discard_first_gpu_result is None:
+            renderer = GL.glGetString(GL.GL_RENDERER) or b""
+            self._discard_first_gpu_result = b"llvmpipe" in renderer
+        return self._discard_first_gpu_result
+
+    @property
+    def discarded_gpu_results(self):
+        """ Number of GPU times dropped as meaningless (see discard_first_gpu_result) """
+        return self._discarded_gpu_results
+
+    def times(self, name="frame"):
+        """ Milliseconds of a part in the recorded frames that measured it """
+        return np.array([record[name] for record in self._frame_list if name in record])
+
+    def stats(self, name="frame"):
+        """ Return the count, mean, p50, p95, p99 and maximum of the times of a part, in milliseconds """
+        times = self.times(name)
+        if len(times) == 0:
+            return {"count": 0, "mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+        p50, p95, p99 = np.percentile(times, [50, 95, 99])
+        return {"count": len(times), "mean": float(times.mean()), "p50": float(p50),
+                "p95": float(p95), "p99": float(p99), "max": float(times.max())}
+
+    def summary(self):
+        """ Statistics of every measured part """
+        return {name: self.stats(name) for name in self._name_list}
+
+    def report(self):
+        """ Return a text table of the statistics """
+        lines = [f"{'part':<28}{'p50':>8}{'p95':>8}{'p99':>8}{'max':>8}  (ms, {self.frame_count} frames)"]
+        for name, stats in self.summary().items():
+            if stats["count"]:
+                lines.append(f"{name:<28}{stats['p50']:>8.2f}{stats['p95']:>8.2f}"
+                             f"{stats['p99']:>8.2f}{stats['max']:>8.2f}")
+        if self._discarded_gpu_results:
+            lines.append(f"(meaningless GPU results dropped: {self._discarded_gpu_results})")
+        return "\n".join(lines)
+
+    def export_csv(self, file_name):
+        """ Write one row per recorded frame, one column per part; parts not measured are empty """
+        with open(file_name, "w", newline="") as out_file:
+            writer = csv.DictWriter(out_file, fieldnames=["index"] + self._name_list)
+            writer.writeheader()
+            for record in self._frame_list:
+                writer.writerow(record)
+
+    def export_json(self, file_name):
+        """ Write the statistics and the recorded frames """
+        with open(file_name, "w") as out_file:
+            json.dump({"summary": self.summary(), "discarded_gpu_results": self._discarded_gpu_results,
+                       "frames": list(self._frame_list)}, out_file, indent=1)
+
+    def reset(self):
+        """ Forget the recorded frames """
+        self._frame_list.clear()
+
+    def release(self):
+        """ Delete the timer queries """
+        query_list = self._query_pool + [query for _, _, query in self._pending_list]
+        if query_list:
+            GL.glDeleteQueries(len(query_list), query_list)
+        for query in query_list:
+            ResourceTracker.untrack("query", query)
+        self._query_pool = []
+        self._pending_list = []
@@ -0,0 +1,138 @@
+import os
+import sys
+import time
+import weakref
+
+# Folders of the engine; the creator of a resource is the first caller outside them
+_PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_ENGINE_DIRS = tuple(os.path.join(_PROJECT_DIR, name) + os.sep
+                     for name in ("core", "core_ext", "extras", "geometry", "light", "material"))
+
+
+class ResourceTracker:
+    """
+    Records every live OpenGL object: its kind, the object owning it,
+    the line of game code that created it, its size in bytes and its age.
+    Objects are added when created and removed when released, so what is
+    left after a scene is unloaded is leaked. Objects whose owner was
+    garbage collected without release() are certainly leaked.
+    """
+    # (kind, GL reference) -> record
+    _record_dict = {}
+    # Recording the creator walks the call stack; it can be turned off
+    record_creator = True
+
+    @staticmethod
+    def track(kind, ref, owner=None, size=0):
+        """ Record a new GL object of a kind such as "texture", "buffer" or "program" """
+        ResourceTracker._record_dict[(kind, ref)] = {
+            "kind": kind,
+            "ref": ref,
+            "owner": weakref.ref(owner) if owner is not None else None,
+            "owner_type": type(owner).__name__ if owner is not None else None,
+            "creator": ResourceTracker._creator() if ResourceTracker.record_creator else "?",
+            "size": size,
+            "created": time.monotonic(),
+        }
+
+    @staticmethod
+    def resize(kind, ref, size):
+        """ Update the bytes used by a GL object, e.g. after new data is uploaded """
+        record = ResourceTracker._record_dict.get((kind, ref))
+        if record is not None:
+            record["size"] = size
+
+    @staticmethod
+    def untrack(kind, ref):
+        ResourceTracker._record_dict.pop((kind, ref), None)
+
+    @staticmethod
+    def _creator():
+        frame = sys._getframe(2)
+        last = frame
+        while frame is not None and frame.f_code.co_filename.startswith(_ENGINE_DIRS):
+            frame = frame.f_back
+            if frame is not None:
+                last = frame
+        frame = frame or last
+        file_name = os.path.relpath(frame.f_code.co_filename, _PROJECT_DIR)
+        return f"{file_name}:{frame.f_lineno}"
+
+    @staticmethod
+    def live_objects(kind=None):
+        """ Return the records of the live GL objects, with their age in seconds and leak status """
+        now = time.monotonic()
+        record_list = []
+        for record in ResourceTracker._record_dict.values():
+            if kind is not None and record["kind"] != kind:
+                continue
+            owner = record["owner"]
+            record_list.append(dict(record, age=now - record["created"],
+                                    orphaned=owner is not None and owner() is None))
+        return record_list
+
+    @staticmethod
+    def count(kind=None):
+        return len(ResourceTracker.live_objects(kind))
+
+    @staticmethod
+    def total_size(kind=None):
+        """ Bytes of GPU memory held by the live objects """
+        return sum(record["size"] for record in ResourceTracker.live_objects(kind))
+
+    @staticmethod
+    def report(min_age=0.0, limit=20):
+        """
+        Return a text summary of the live objects: totals per kind, then the
+        creators holding the most memory among the objects older than min_age
+        seconds, with the number of objects whose owner no longer exists
+        """
+        record_list = ResourceTracker.live_objects()
+        lines = ["GPU resources:"]
+        for kind in sorted({record["kind"] for record in record_list}):
+            kind_list = [record for record in record_list if record["kind"] == kind]
+            size = sum(record["size"] for record in kind_list)
+            lines.append(f"  {kind}: {len(kind_list)} live, {size / 2 ** 20:.1f} MB")
+        group_dict = {}
+        for record in record_list:
+            if record["age"] < min_age:
+                continue
+            key = (record["creator"], record["kind"], record["owner_type"])
+            group = group_dict.setdefault(key, {"count": 0, "size": 0, "age": 0.0, "orphaned": 0})
+            group["count"] += 1
+            group["size"] += record["size"]
+            group["age"] = max(group["age"], record["age"])
+            group["orphaned"] += record["orphaned"]
+        if group_dict:
+            lines.append(f"Created by (older than {min_age:.0f} s):")
+        group_list = sorted(group_dict.items(), key=lambda item: (-item[1]["orphaned"], -item[1]["size"]))
+        for (creator, kind, owner_type), group in group_list[:limit]:
+            leaked = f", {group['orphaned']} leaked" if group["orphaned"] else ""
+            lines.append(f"  {creator}: {group['count']} {kind} ({owner_type}), "
+                         f"{group['size'] / 2 ** 20:.2f} MB, oldest {group['age']:.0f} s{leaked}")
+        return "\n".join(lines)
+
+    @staticmethod
+    def dump(file_name, min_age=0.0):
+        """ Write the report to a file """
+        with open(file_name, "w") as out_file:
+            out_file.write(ResourceTracker.report(min_age, limit=len(ResourceTracker._record_dict)) + "\n")
+
+
+class GLResource:
+    """
+    Base of the classes that own OpenGL objects. release() deletes them; it may be
+    called more than once. Resources can be used as context managers:
+        with Texture("images/sky.jpg") as texture:
+            ...
+    """
+    def release(self):
+        """ Implement by extending class """
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+        return False
@@ -1,7 +1,33 @@
 import OpenGL.GL as GL
+import numpy as np
 
 
 class Uniform:
+    # Texture object bound to each texture unit by uniform uploads, so that
+    # consecutive draws sharing a texture do not bind it again
+    _bound_texture_dict = {}
+    # Number of glBindTexture calls issued, read by the renderer statistics
+    texture_bind_count = 0
+    # Last value uploaded to each (program, location); a program keeps its uniform
+    # values, and materials sharing a program share these entries
+    _uploaded_value_dict = {}
+    # Number of uploads issued and skipped because the program already held the value
+    upload_stats = {"performed": 0, "skipped": 0}
+    # Method that uploads each data type, and function that turns the data into
+    # a comparable value (None: always upload, the data is a mutable object)
+    _UPLOAD_DICT = {
+        "int":          ("_upload_int", int),
+        "bool":         ("_upload_int", int),
+        "float":        ("_upload_float", float),
+        "vec2":         ("_upload_vec2", lambda data: tuple(map(float, data))),
+        "vec3":         ("_upload_vec3", lambda data: tuple(map(float, data))),
+        "vec4":         ("_upload_vec4", lambda data: tuple(map(float, data))),
+        "mat4":         ("_upload_mat4", lambda data: np.asarray(data, dtype=np.float64).tobytes()),
+        "sampler2D":    ("_upload_sampler2d", lambda data: data[1]),
+        "Light":        ("_upload_light", None),
+        "Shadow":       ("_upload_shadow", None),
+    }
+
     def __init__(self, data_type, data):
         # type of data:
         # int | bool | float | vec2 | vec3 | vec4
@@ -10,6 +36,14 @@ class Uniform:
         self._data = data
         # reference for variable location in program
         self._variable_ref = None
+        # resolved by locate_variable from the data type
+        self._upload_function = None
+        self._value_function = None
+        self._value_key = None
+
+    @property
+    def data_type(self):
+        return self._data_type
 
     @property
     def data(self):
@@ -19,8 +53,36 @@ class Uniform:
     def data(self, data):
         self._data = data
 
+    @staticmethod
+    def forget_texture_bindings():
+        """
+        Textures may be bound outside of uniform uploads (e.g. when they are created),
+        so the renderer forgets the known bindings at the start of every frame
+        """
+        Uniform._bound_texture_dict = {}
+
+    @staticmethod
+    def forget_program(program_ref):
+        """ Forget the values uploaded to a program, e.g. before it is deleted """
+        for key in [key for key in Uniform._uploaded_value_dict if key[0] == program_ref]:
+            del Uniform._uploaded_value_dict[key]
+
+    @staticmethod
+    def bind_texture(texture_object_ref, texture_unit_ref):
+        """ Bind a texture object to a texture unit, unless it is already bound there """
+        if Uniform._bound_texture_dict.get(texture_unit_ref) != texture_object_ref:
+            # Activate texture unit
+            GL.glActiveTexture(GL.GL_TEXTURE0 + texture_unit_ref)
+            # Associate texture object reference to currently active texture unit
+            GL.glBindTexture(GL.GL_TEXTURE_2D, texture_object_ref)
+            Uniform._bound_texture_dict[texture_unit_ref] = texture_object_ref
+            Uniform.texture_bind_count += 1
+
     def locate_variable(self, program_ref, variable_name):
-        """ Get and store reference for program variable with given name """
+        """
+        Get and store reference for program variable with given name,
+        and choose the upload function for the data type
+        """
         if self._data_type == 'Light':
             self._variable_ref = {
                 "lightType":    GL.glGetUniformLocation(program_ref, variable_name + ".lightType"),
@@ -40,48 +102,69 @@ class Uniform:
             }
         else:
             self._variable_ref = GL.glGetUniformLocation(program_ref, variable_name)
+            self._value_key = (program_ref, self._variable_ref)
+        upload_method_name, self._value_function = Uniform._UPLOAD_DICT[self._data_type]
+        self._upload_function = getattr(self, upload_method_name)
 
     def upload_data(self):
-        """ Store data in uniform variable previously located """
+        """
+        Store data in uniform variable previously located,
+        unless the program already holds the same value
+        """
         # If the program does not reference the variable, then exit
-        if self._variable_ref != -1:
-            if self._data_type == 'int':
-                GL.glUniform1i(self._variable_ref, self._data)
-            elif self._data_type == 'bool':
-                GL.glUniform1i(self._variable_ref, self._data)
-            elif self._data_type == 'float':
-                GL.glUniform1f(self._variable_ref, self._data)
-            elif self._data_type == 'vec2':
-                GL.glUniform2f(self._variable_ref, *self._data)
-            elif self._data_type == 'vec3':
-                GL.glUniform3f(self._variable_ref, *self._data)
-            elif self._data_type == 'vec4':
-                GL.glUniform4f(self._variable_ref, *self._data)
-            elif self._data_type == 'mat4':
-                GL.glUniformMatrix4fv(self._variable_ref, 1, GL.GL_TRUE, self._data)
-            elif self._data_type == "sampler2D":
-                texture_object_ref, texture_unit_ref = self._data
-                # Activate texture unit
-                GL.glActiveTexture(GL.GL_TEXTURE0 + texture_unit_ref)
-                # Associate texture object reference to currently active texture unit
-                GL.glBindTexture(GL.GL_TEXTURE_2D, texture_object_ref)
-                # Upload texture unit number (0...15) to uniform variable in shader
-                GL.glUniform1i(self._variable_ref, texture_unit_ref)
-            elif self._data_type == "Light":
-                GL.glUniform1i(self._variable_ref["lightType"], self._data.light_type)
-                GL.glUniform3f(self._variable_ref["color"], *self._data.color)
-                GL.glUniform3f(self._variable_ref["direction"], *self._data.direction)
-                GL.glUniform3f(self._variable_ref["position"], *self._data.local_position)
-                GL.glUniform3f(self._variable_ref["attenuation"], *self._data.attenuation)
-            elif self._data_type == "Shadow":
-                GL.glUniform3f(self._variable_ref["lightDirection"], *self._data.light_source.direction)
-                GL.glUniformMatrix4fv(self._variable_ref["projectionMatrix"], 1, GL.GL_TRUE, self._data.camera.projection_matrix)
-                GL.glUniformMatrix4fv(self._variable_ref["viewMatrix"], 1, GL.GL_TRUE, self._data.camera.view_matrix)
-                # Configure depth texture
-                texture_object_ref = self._data.render_target.texture.texture_ref
-                texture_unit_ref = 3
-                GL.glActiveTexture(GL.GL_TEXTURE0 + texture_unit_ref)
-                GL.glBindTexture(GL.GL_TEXTURE_2D, texture_object_ref)
-                GL.glUniform1i(self._variable_ref["depthTextureSampler"], texture_unit_ref)
-                GL.glUniform1f(self._variable_ref["strength"], self._data.strength)
-                GL.glUniform1f(self._variable_ref["bias"], self._data.bias)
+        if self._variable_ref == -1:
+            return
+        if self._value_function is not None:
+            value = self._value_function(self._data)
+            if Uniform._uploaded_value_dict.get(self._value_key) == value:
+                # Texture units are bound on every draw, even if the unit number is unchanged
+                if self._data_type == "sampler2D":
+                    Uniform.bind_texture(*self._data)
+                Uniform.upload_stats["skipped"] += 1
+                return
+            Uniform._uploaded_value_dict[self._value_key] = value
+        self._upload_function()
+        Uniform.upload_stats["performed"] += 1
+
+    def _upload_int(self):
+        GL.glUniform1i(self._variable_ref, self._data)
+
+    def _upload_float(self):
+        GL.glUniform1f(self._variable_ref, self._data)
+
+    def _upload_vec2(self):
+        GL.glUniform2f(self._variable_ref, *self._data)
+
+    def _upload_vec3(self):
+        GL.glUniform3f(self._variable_ref, *self._data)
+
+    def _upload_vec4(self):
+        GL.glUniform4f(self._variable_ref, *self._data)
+
+    def _upload_mat4(self):
+        GL.glUniformMatrix4fv(self._variable_ref, 1, GL.GL_TRUE, self._data)
+
+    def _upload_sampler2d(self):
+        texture_object_ref, texture_unit_ref = self._data
+        Uniform.bind_texture(texture_object_ref, texture_unit_ref)
+        # Upload texture unit number (0...15) to uniform variable in shader
+        GL.glUniform1i(self._variable_ref, texture_unit_ref)
+
+    def _upload_light(self):
+        GL.glUniform1i(self._variable_ref["lightType"], self._data.light_type)
+        GL.glUniform3f(self._variable_ref["color"], *self._data.color)
+        GL.glUniform3f(self._variable_ref["direction"], *self._data.direction)
+        GL.glUniform3f(self._variable_ref["position"], *self._data.local_position)
+        GL.glUniform3f(self._variable_ref["attenuation"], *self._data.attenuation)
+
+    def _upload_shadow(self):
+        GL.glUniform3f(self._variable_ref["lightDirection"], *self._data.light_source.direction)
+        GL.glUniformMatrix4fv(self._variable_ref["projectionMatrix"], 1, GL.GL_TRUE, self._data.camera.projection_matrix)
+        GL.glUniformMatrix4fv(self._variable_ref["viewMatrix"], 1, GL.GL_TRUE, self._data.camera.view_matrix)
+        # Configure depth texture
+        texture_object_ref = self._data.render_target.texture.texture_ref
+        texture_unit_ref = 3
+        Uniform.bind_texture(texture_object_ref, texture_unit_ref)
+        GL.glUniform1i(self._variable_ref["depthTextureSampler"], texture_unit_ref)
+        GL.glUniform1f(self._variable_ref["strength"], self._data.strength)
+        GL.glUniform1f(self._variable_ref["bias"], self._data.bias)
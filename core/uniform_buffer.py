@@ -0,0 +1,61 @@
+import OpenGL.GL as GL
+import numpy as np
+
+from core.resource_tracker import GLResource, ResourceTracker
+
+
+class UniformBuffer(GLResource):
+    """
+    Uniform buffer object: a block of uniform values stored once on the GPU
+    and read by every program that declares a uniform block with the same layout
+    """
+    def __init__(self, binding_point, size):
+        # index of the binding point that programs associate with their block
+        self._binding_point = binding_point
+        # size of the block in bytes
+        self._size = size
+        # reference of available buffer from GPU
+        self._buffer_ref = GL.glGenBuffers(1)
+        ResourceTracker.track("buffer", self._buffer_ref, self, size)
+        GL.glBindBuffer(GL.GL_UNIFORM_BUFFER, self._buffer_ref)
+        # Allocate storage; the contents are replaced by upload_data
+        GL.glBufferData(GL.GL_UNIFORM_BUFFER, size, None, GL.GL_DYNAMIC_DRAW)
+        GL.glBindBuffer(GL.GL_UNIFORM_BUFFER, 0)
+
+    @property
+    def binding_point(self):
+        return self._binding_point
+
+    @property
+    def size(self):
+        return self._size
+
+    def upload_data(self, data):
+        """ Replace the contents of the block and attach the buffer to its binding point """
+        data = np.ascontiguousarray(data)
+        if data.nbytes != self._size:
+            raise ValueError(f"Uniform block data has {data.nbytes} bytes, expected {self._size}")
+        GL.glBindBuffer(GL.GL_UNIFORM_BUFFER, self._buffer_ref)
+        GL.glBufferSubData(GL.GL_UNIFORM_BUFFER, 0, data.nbytes, data)
+        GL.glBindBuffer(GL.GL_UNIFORM_BUFFER, 0)
+        # Binding again every upload lets several buffers share the binding point
+        GL.glBindBufferBase(GL.GL_UNIFORM_BUFFER, self._binding_point, self._buffer_ref)
+
+    def release(self):
+        """ Delete the GPU buffer """
+        if self._buffer_ref is not None:
+            GL.glDeleteBuffers(1, [self._buffer_ref])
+            ResourceTracker.untrack("buffer", self._buffer_ref)
+            self._buffer_ref = None
+
+    @staticmethod
+    def bind_block(program_ref, block_name, binding_point):
+        """
+        Associate a uniform block of a program with a binding point;
+        return False if the program does not declare the block
+        """
+        block_index = GL.glGetUniformBlockIndex(program_ref, block_name)
+        if block_index == GL.GL_INVALID_INDEX:
+            return False
+        GL.glUniformBlockBinding(program_ref, block_index, binding_point)
+        return True
@@ -1,12 +1,29 @@
+import ctypes
+import hashlib
+import os
+import time
+
 import OpenGL.GL as GL
 
 from collections import namedtuple
 
+from core.resource_tracker import ResourceTracker
+from core.uniform import Uniform
+
 
 class Utils:
     """
     Static methods to load and compile OpenGL shaders and link to create programs
     """
+    # Required OpenGL/GLSL version, prepended to every shader
+    GLSL_VERSION = "330"
+    # Linked programs, indexed by the hash of their sources
+    _program_cache = {}
+    # Folder where linked program binaries are stored (None disables the disk cache)
+    program_binary_dir = None
+    # Cache hits (in memory and on disk), misses and total time spent building programs
+    program_cache_stats = {"hits": 0, "binary_hits": 0, "misses": 0, "build_time": 0.0}
+
     @staticmethod
     def get_system_info():
         vendor = GL.glGetString(GL.GL_VENDOR).decode('utf-8')
@@ -19,7 +36,7 @@ class Utils:
     @staticmethod
     def initialize_shader(shader_code, shader_type):
         # Specify required OpenGL/GLSL version
-        shader_code = '#version 330\n' + shader_code
+        shader_code = '#version ' + Utils.GLSL_VERSION + '\n' + shader_code
         # Create empty shader object and return reference value
         shader_ref = GL.glCreateShader(shader_type)
         # Stores the source code in the shader
@@ -40,8 +57,49 @@ class Utils:
         # Compilation was successful; return shader reference value
         return shader_ref
 
+    @staticmethod
+    def program_key(vertex_shader_code, fragment_shader_code):
+        """ Hash identifying a program by its GLSL version and shader sources """
+        sources = '\0'.join([Utils.GLSL_VERSION, vertex_shader_code, fragment_shader_code])
+        return hashlib.sha1(sources.encode('utf-8')).hexdigest()
+
     @staticmethod
     def initialize_program(vertex_shader_code, fragment_shader_code):
+        """
+        Return a linked program for the given shader sources.
+        Byte-identical sources are compiled only once per process and,
+        when program_binary_dir is set, reloaded from the driver's binary on later runs.
+        """
+        key = Utils.program_key(vertex_shader_code, fragment_shader_code)
+        if key in Utils._program_cache:
+            Utils.program_cache_stats["hits"] += 1
+            return Utils._program_cache[key]
+        start_time = time.perf_counter()
+        program_ref = Utils._load_program_binary(key)
+        if program_ref is None:
+            Utils.program_cache_stats["misses"] += 1
+            program_ref = Utils.compile_program(vertex_shader_code, fragment_shader_code)
+            Utils._save_program_binary(key, program_ref)
+        else:
+            Utils.program_cache_stats["binary_hits"] += 1
+        Utils.program_cache_stats["build_time"] += time.perf_counter() - start_time
+        Utils._program_cache[key] = program_ref
+        ResourceTracker.track("program", program_ref)
+        return program_ref
+
+    @staticmethod
+    def delete_program(program_ref):
+        """ Delete a program and forget it in the program cache """
+        for key, cached_ref in list(Utils._program_cache.items()):
+            if cached_ref == program_ref:
+                del Utils._program_cache[key]
+        # A new program may reuse the reference; it holds none of the old values
+        Uniform.forget_program(program_ref)
+        GL.glDeleteProgram(program_ref)
+        ResourceTracker.untrack("program", program_ref)
+
+    @staticmethod
+    def compile_program(vertex_shader_code, fragment_shader_code):
         vertex_shader_ref = Utils.initialize_shader(vertex_shader_code, GL.GL_VERTEX_SHADER)
         fragment_shader_ref = Utils.initialize_shader(fragment_shader_code, GL.GL_FRAGMENT_SHADER)
         # Create empty program object and store reference to it
@@ -49,6 +107,9 @@ class Utils:
         # Attach previously compiled shader programs
         GL.glAttachShader(program_ref, vertex_shader_ref)
         GL.glAttachShader(program_ref, fragment_shader_ref)
+        # Ask the driver to keep the binary available for the disk cache
+        if Utils.program_binary_dir is not None:
+            GL.glProgramParameteri(program_ref, GL.GL_PROGRAM_BINARY_RETRIEVABLE_HINT, GL.GL_TRUE)
         # Link vertex shader to fragment shader
         GL.glLinkProgram(program_ref)
         # queries whether program link was successful
@@ -62,9 +123,80 @@ class Utils:
             error_message = '\n' + error_message.decode('utf-8')
             # Raise exception: halt application and print error message
             raise Exception(error_message)
+        # The shaders are no longer needed once the program is linked
+        GL.glDetachShader(program_ref, vertex_shader_ref)
+        GL.glDetachShader(program_ref, fragment_shader_ref)
+        GL.glDeleteShader(vertex_shader_ref)
+        GL.glDeleteShader(fragment_shader_ref)
         # Linking was successful; return program reference value
         return program_ref
 
+    @staticmethod
+    def _program_binary_path(key):
+        # Binaries are only valid for the driver that produced them
+        info = Utils.get_system_info()
+        driver = hashlib.sha1((info.vendor + info.renderer + info.opengl).encode('utf-8')).hexdigest()
+        return os.path.join(Utils.program_binary_dir, driver[:12] + '-' + key + '.bin')
+
+    @staticmethod
+    def _load_program_binary(key):
+        """ Return a program created from a stored binary, or None if unavailable """
+        if Utils.program_binary_dir is None:
+            return None
+        if GL.glGetIntegerv(GL.GL_NUM_PROGRAM_BINARY_FORMATS) < 1:
+            return None
+        try:
+            with open(Utils._program_binary_path(key), 'rb') as binary_file:
+                content = binary_file.read()
+        except OSError:
+            return None
+        # The file starts with the 4 byte binary format
+        if len(content) < 4:
+            return None
+        binary_format = int.from_bytes(content[:4], 'little')
+        binary = content[4:]
+        program_ref = GL.glCreateProgram()
+        # The driver rejects binaries from other versions, either by failing the link
+        # or with an error (e.g. GL_INVALID_ENUM for an unknown format); compile from source instead
+        try:
+            GL.glProgramBinary(program_ref, binary_format, binary, len(binary))
+            linked = GL.glGetProgramiv(program_ref, GL.GL_LINK_STATUS)
+        except GL.GLError:
+            linked = False
+        if not linked:
+            GL.glDeleteProgram(program_ref)
+            return None
+        return program_ref
+
+    @staticmethod
+    def _save_program_binary(key, program_ref):
+        if Utils.program_binary_dir is None:
+            return
+        if GL.glGetIntegerv(GL.GL_NUM_PROGRAM_BINARY_FORMATS) < 1:
+            return
+        length = GL.glGetProgramiv(program_ref, GL.GL_PROGRAM_BINARY_LENGTH)
+        if length < 1:
+            return
+        binary = (ctypes.c_ubyte * length)()
+        binary_format = GL.GLenum()
+        binary_length = GL.GLsizei()
+        GL.glGetProgramBinary(program_ref, length, ctypes.byref(binary_length),
+                              ctypes.byref(binary_format), binary)
+        try:
+            os.makedirs(Utils.program_binary_dir, exist_ok=True)
+            with open(Utils._program_binary_path(key), 'wb') as binary_file:
+                binary_file.write(binary_format.value.to_bytes(4, 'little'))
+                binary_file.write(bytes(binary)[:binary_length.value])
+        except OSError:
+            # The disk cache is optional
+            pass
+
+    @staticmethod
+    def print_program_cache_stats():
+        stats = Utils.program_cache_stats
+        print(f"Shader programs: {stats['misses']} compiled, {stats['binary_hits']} loaded from binary, "
+              f"{stats['hits']} reused; {stats['build_time'] * 1000:.1f} ms building programs")
+
     @staticmethod
     def print_system_info():
         info = Utils.get_system_info()
@@ -0,0 +1,121 @@
+import os
+
+from core.utils import Utils
+from core_ext.texture import Texture
+from core_ext.texture_atlas import TextureAtlas
+
+
+class AssetRegistry:
+    """
+    Shared cache of GPU assets: textures loaded from files, texture atlases,
+    geometries and compiled shader programs. Identical assets are created once and handed
+    out to every user. Each request increments a reference count, release()
+    decrements it, and evict_unused() frees the GPU memory of assets that
+    are no longer referenced.
+    """
+    # key -> [asset, reference count]
+    _entry_dict = {}
+    # number of assets created (misses) and shared (hits), per kind
+    _created = {"texture": 0, "geometry": 0, "program": 0}
+    _shared = {"texture": 0, "geometry": 0, "program": 0}
+    # Optional TextureLoader; when set, texture files are decoded in the background
+    texture_loader = None
+    # Optional TextureCache, used to load texture files when there is no loader
+    texture_cache = None
+
+    @staticmethod
+    def _acquire(key, create):
+        """ Return the asset stored with key, creating it on the first request """
+        kind = key[0]
+        entry = AssetRegistry._entry_dict.get(key)
+        if entry is None:
+            entry = [create(), 0]
+            AssetRegistry._entry_dict[key] = entry
+            AssetRegistry._created[kind] += 1
+        else:
+            AssetRegistry._shared[kind] += 1
+        entry[1] += 1
+        return entry[0]
+
+    @staticmethod
+    def texture(file_name, property_dict=None):
+        """ Return the shared texture of an image file """
+        properties = tuple(sorted(property_dict.items())) if property_dict else ()
+        key = ("texture", os.path.abspath(file_name), properties)
+        if AssetRegistry.texture_loader is not None:
+            return AssetRegistry._acquire(key, lambda: AssetRegistry.texture_loader.load(file_name, property_dict))
+        if AssetRegistry.texture_cache is not None:
+            return AssetRegistry._acquire(key, lambda: AssetRegistry.texture_cache.load(file_name, property_dict))
+        return AssetRegistry._acquire(key, lambda: Texture(file_name, property_dict))
+
+    @staticmethod
+    def texture_atlas(file_name_list, **kwargs):
+        """ Return the shared atlas packing the images of file_name_list, in that order """
+        key = ("texture", "atlas", tuple(os.path.abspath(file_name) for file_name in file_name_list),
+               tuple(sorted(kwargs.items())))
+        return AssetRegistry._acquire(key, lambda: TextureAtlas(file_name_list, **kwargs))
+
+    @staticmethod
+    def geometry(geometry_class, *args, **kwargs):
+        """ Return the shared instance of geometry_class built with the given arguments """
+        key = ("geometry", geometry_class, args, tuple(sorted(kwargs.items())))
+        return AssetRegistry._acquire(key, lambda: geometry_class(*args, **kwargs))
+
+    @staticmethod
+    def program(vertex_shader_code, fragment_shader_code):
+        """ Return the shared program reference compiled from the shader sources """
+        # Utils keeps the compiled program cache; the registry counts references to it
+        program_ref = Utils.initialize_program(vertex_shader_code, fragment_shader_code)
+        key = ("program", Utils.program_key(vertex_shader_code, fragment_shader_code))
+        return AssetRegistry._acquire(key, lambda: program_ref)
+
+    @staticmethod
+    def _find(asset):
+        for key, entry in AssetRegistry._entry_dict.items():
+            if entry[0] is asset:
+                return key, entry
+        raise KeyError("Asset is not managed by the registry")
+
+    @staticmethod
+    def reference_count(asset):
+        return AssetRegistry._find(asset)[1][1]
+
+    @staticmethod
+    def release(asset):
+        """ Give up one reference to an asset; its memory is freed by evict_unused() """
+        key, entry = AssetRegistry._find(asset)
+        if entry[1] == 0:
+            raise ValueError(f"Asset {key} was released more times than it was acquired")
+        entry[1] -= 1
+
+    @staticmethod
+    def evict(asset):
+        """ Free the GPU memory of an asset, even if it is still referenced """
+        key, entry = AssetRegistry._find(asset)
+        AssetRegistry._free(key[0], entry[0])
+        del AssetRegistry._entry_dict[key]
+
+    @staticmethod
+    def evict_unused():
+        """ Free the GPU memory of every asset without references; return their number """
+        unused_key_list = [key for key, entry in AssetRegistry._entry_dict.items() if entry[1] == 0]
+        for key in unused_key_list:
+            AssetRegistry._free(key[0], AssetRegistry._entry_dict.pop(key)[0])
+        return len(unused_key_list)
+
+    @staticmethod
+    def _free(kind, asset):
+        if kind in ("texture", "geometry"):
+            asset.release()
+        elif kind == "program":
+            Utils.delete_program(asset)
+
+    @staticmethod
+    def report():
+        """ Return a text summary of the created and shared assets """
+        lines = []
+        for kind in AssetRegistry._created:
+            alive = sum(1 for key in AssetRegistry._entry_dict if key[0] == kind)
+            lines.append(f"{kind}: {AssetRegistry._created[kind]} created, "
+                         f"{AssetRegistry._shared[kind]} shared, {alive} alive")
+        return "\n".join(lines)
@@ -1,3 +1,4 @@
+import numpy as np
 from numpy.linalg import inv
 
 from core.matrix import Matrix
@@ -19,6 +20,19 @@ class Camera(Object3D):
     def view_matrix(self):
         return self._view_matrix
 
+    @property
+    def frustum_planes(self):
+        """
+        Return the six planes (left, right, bottom, top, near, far) bounding the
+        visible region, as rows (a, b, c, d) in world coordinates; a point
+        (x, y, z) is inside the region when a*x + b*y + c*z + d >= 0 for every plane.
+        Uses the view matrix of the last update_view_matrix call.
+        """
+        m = self._projection_matrix @ self._view_matrix
+        return np.array([m[3] + m[0], m[3] - m[0],
+                         m[3] + m[1], m[3] - m[1],
+                         m[3] + m[2], m[3] - m[2]])
+
     def set_perspective(self, angle_of_view=50, aspect_ratio=1, near=0.1, far=1000):
         self._projection_matrix = Matrix.make_perspective(angle_of_view, aspect_ratio, near, far)
 
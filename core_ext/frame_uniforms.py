@@ -0,0 +1,91 @@
+import numpy as np
+
+from core.uniform_buffer import UniformBuffer
+
+
+class FrameUniforms:
+    """
+    Values shared by every mesh during a frame: camera matrices, lights
+    and shadow data. The renderer uploads them once per frame to a uniform
+    buffer object; shaders read them by including FrameUniforms.shader_code.
+    """
+    BLOCK_NAME = "FrameData"
+    BINDING_POINT = 0
+    # Size of the light array in the block
+    MAX_LIGHTS = 4
+    # Texture unit holding the depth texture of the shadow pass
+    SHADOW_TEXTURE_UNIT = 3
+
+    # Declaration of the block, identical in every shader that uses it.
+    # std140 fixes the memory layout; row_major matches numpy matrices.
+    shader_code = """
+            struct Light
+            {
+                int lightType;  // 1 = AMBIENT, 2 = DIRECTIONAL, 3 = POINT
+                vec3 color;  // used by all lights
+                vec3 direction;  // used by directional lights
+                vec3 position;  // used by point lights
+                vec3 attenuation;  // used by point lights
+            };
+
+            layout (std140, row_major) uniform FrameData
+            {
+                mat4 projectionMatrix;
+                mat4 viewMatrix;
+                vec3 viewPosition;
+                // data from camera that produces the shadow depth texture
+                mat4 shadowProjectionMatrix;
+                mat4 shadowViewMatrix;
+                // direction of light that casts shadow
+                vec3 shadowLightDirection;
+                // regions in shadow multiplied by (1-strength)
+                float shadowStrength;
+                // reduces unwanted visual artifacts
+                float shadowBias;
+                Light lights[""" + str(MAX_LIGHTS) + """];
+            };
+    """
+
+    # Offsets of the block members, in 4-byte units, following the std140 rules
+    _PROJECTION_MATRIX = 0
+    _VIEW_MATRIX = 16
+    _VIEW_POSITION = 32
+    _SHADOW_PROJECTION_MATRIX = 36
+    _SHADOW_VIEW_MATRIX = 52
+    _SHADOW_LIGHT_DIRECTION = 68
+    _SHADOW_STRENGTH = 71
+    _SHADOW_BIAS = 72
+    _LIGHTS = 76
+    # Each Light takes 80 bytes: an int and four vec3, each aligned to 16 bytes
+    _LIGHT_STRIDE = 20
+    _SIZE = _LIGHTS + MAX_LIGHTS * _LIGHT_STRIDE
+
+    def __init__(self):
+        self._data = np.zeros(self._SIZE, dtype=np.float32)
+        # Light types are integers stored in the same memory
+        self._int_data = self._data.view(np.int32)
+        self._buffer = UniformBuffer(self.BINDING_POINT, self._data.nbytes)
+
+    def update(self, camera, light_list, shadow=None):
+        """ Store the values of the current frame and upload them """
+        data = self._data
+        data[self._PROJECTION_MATRIX:self._PROJECTION_MATRIX + 16] = np.ravel(camera.projection_matrix)
+        data[self._VIEW_MATRIX:self._VIEW_MATRIX + 16] = np.ravel(camera.view_matrix)
+        data[self._VIEW_POSITION:self._VIEW_POSITION + 3] = camera.global_position
+        if shadow is not None:
+            data[self._SHADOW_PROJECTION_MATRIX:self._SHADOW_PROJECTION_MATRIX + 16] = \
+                np.ravel(shadow.camera.projection_matrix)
+            data[self._SHADOW_VIEW_MATRIX:self._SHADOW_VIEW_MATRIX + 16] = np.ravel(shadow.camera.view_matrix)
+            data[self._SHADOW_LIGHT_DIRECTION:self._SHADOW_LIGHT_DIRECTION + 3] = shadow.light_source.direction
+            data[self._SHADOW_STRENGTH] = shadow.strength
+            data[self._SHADOW_BIAS] = shadow.bias
+        # Unused light slots have type 0 and add no light
+        data[self._LIGHTS:] = 0
+        for light_number, light in enumerate(light_list[0:self.MAX_LIGHTS]):
+            offset = self._LIGHTS + light_number * self._LIGHT_STRIDE
+            self._int_data[offset] = light.light_type
+            data[offset + 4:offset + 7] = light.color
+            data[offset + 8:offset + 11] = light.direction
+            data[offset + 12:offset + 15] = light.local_position
+            data[offset + 16:offset + 19] = light.attenuation
+        self._buffer.upload_data(data)
@@ -0,0 +1,152 @@
+import ctypes
+
+import OpenGL.GL as GL
+import numpy as np
+
+from core.matrix import Matrix
+from core.resource_tracker import ResourceTracker
+from core_ext.mesh import Mesh
+
+
+class InstancedMesh(Mesh):
+    """
+    Draws many copies of one geometry and material with a single draw call.
+    Each instance has its own model matrix, stored in a per-instance vertex
+    buffer and read by the shader through the "instanceMatrix" attribute;
+    the final transform of an instance is modelMatrix * instanceMatrix.
+    """
+    def __init__(self, geometry, material, matrix_list=None, radiusTrue=False, radiusValue=1.0):
+        super().__init__(geometry, material, radiusTrue, radiusValue)
+        if matrix_list is None:
+            matrix_list = [Matrix.make_identity()]
+        # instance matrices, shape (instance count, 4, 4)
+        self._instance_matrices = np.array(matrix_list, dtype=np.float32).reshape(-1, 4, 4)
+        # range of instances changed since the last upload
+        self._dirty_range = None
+        # The bounding box of all the instances is recomputed after they change
+        self._instances_bounds = None
+        self._instance_buffer_ref = GL.glGenBuffers(1)
+        ResourceTracker.track("buffer", self._instance_buffer_ref, self)
+        self._instance_buffer_size = 0
+        self.upload_instance_data()
+        # Vertex array objects reading the buffers with other programs, by program reference
+        self._program_vao_dict = {}
+        GL.glBindVertexArray(self._vao_ref)
+        self._associate_instance_buffer(material.program_ref)
+        GL.glBindVertexArray(0)
+
+    def _associate_instance_buffer(self, program_ref):
+        """ Read the instance matrices into the "instanceMatrix" attribute of a program, in the bound VAO """
+        # A mat4 attribute takes four consecutive locations, one per column
+        variable_ref = GL.glGetAttribLocation(program_ref, "instanceMatrix")
+        if variable_ref == -1:
+            raise Exception("InstancedMesh requires a material with an 'instanceMatrix' attribute")
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self._instance_buffer_ref)
+        for column in range(4):
+            GL.glVertexAttribPointer(variable_ref + column, 4, GL.GL_FLOAT, False, 64,
+                                     ctypes.c_void_p(column * 16))
+            GL.glEnableVertexAttribArray(variable_ref + column)
+            # Advance to the next matrix once per instance, not per vertex
+            GL.glVertexAttribDivisor(variable_ref + column, 1)
+
+    def vao_ref_for(self, program_ref):
+        """
+        Vertex array object drawing the instances with another program, e.g. the
+        instanced depth material of the shadow pass; attribute locations differ between programs
+        """
+        if program_ref == self._material.program_ref:
+            return self._vao_ref
+        vao_ref = self._program_vao_dict.get(program_ref)
+        if vao_ref is None:
+            vao_ref = GL.glGenVertexArrays(1)
+            ResourceTracker.track("vertex array", vao_ref, self)
+            GL.glBindVertexArray(vao_ref)
+            for variable_name, attribute_object in self._geometry.attribute_dict.items():
+                attribute_object.associate_variable(program_ref, variable_name)
+            if self._geometry.index is not None:
+                self._geometry.index.associate()
+            self._associate_instance_buffer(program_ref)
+            GL.glBindVertexArray(0)
+            self._program_vao_dict[program_ref] = vao_ref
+        return vao_ref
+
+    @classmethod
+    def from_positions(cls, geometry, material, position_list, **kwargs):
+        """ Create one instance translated to each of the given positions """
+        matrix_list = [Matrix.make_translation(*position) for position in position_list]
+        return cls(geometry, material, matrix_list, **kwargs)
+
+    @property
+    def instance_count(self):
+        return len(self._instance_matrices)
+
+    def instance_matrix(self, index):
+        return self._instance_matrices[index].astype(float)
+
+    def instance_position(self, index):
+        return list(self._instance_matrices[index, 0:3, 3].astype(float))
+
+    def set_instance_matrix(self, index, matrix):
+        self._instance_matrices[index] = matrix
+        self._mark_dirty(index, index + 1)
+
+    def set_instance_position(self, index, position):
+        """ Set the position of an instance relative to this mesh """
+        self._instance_matrices[index, 0:3, 3] = position[0:3]
+        self._mark_dirty(index, index + 1)
+
+    def set_instance_matrices(self, matrix_list):
+        """ Replace all instances; the number of instances may change """
+        self._instance_matrices = np.array(matrix_list, dtype=np.float32).reshape(-1, 4, 4)
+        self._mark_dirty(0, len(self._instance_matrices))
+
+    def release(self, release_geometry=False, release_material=False):
+        """ Delete the buffer of the instance matrices and the vertex array object """
+        if self._instance_buffer_ref is not None:
+            GL.glDeleteBuffers(1, [self._instance_buffer_ref])
+            ResourceTracker.untrack("buffer", self._instance_buffer_ref)
+            self._instance_buffer_ref = None
+        for vao_ref in self._program_vao_dict.values():
+            GL.glDeleteVertexArrays(1, [vao_ref])
+            ResourceTracker.untrack("vertex array", vao_ref)
+        self._program_vao_dict = {}
+        super().release(release_geometry, release_material)
+
+    @property
+    def local_bounds(self):
+        """ Center and half size of the box containing every instance, in local coordinates """
+        if self._instances_bounds is None and self.instance_count == 0:
+            # No instances: an empty box at the center of the geometry
+            self._instances_bounds = (self._local_bounds[0], np.zeros(3))
+        if self._instances_bounds is None:
+            center, extent = self._local_bounds
+            matrices = self._instance_matrices.astype(float)
+            centers = np.einsum("nij,j->ni", matrices[:, 0:3, 0:3], center) + matrices[:, 0:3, 3]
+            extents = np.abs(matrices[:, 0:3, 0:3]) @ extent
+            minimum = (centers - extents).min(axis=0)
+            maximum = (centers + extents).max(axis=0)
+            self._instances_bounds = ((minimum + maximum) / 2, (maximum - minimum) / 2)
+        return self._instances_bounds
+
+    def _mark_dirty(self, start, end):
+        self._instances_bounds = None
+        if self._dirty_range is None:
+            self._dirty_range = [start, end]
+        else:
+            self._dirty_range = [min(start, self._dirty_range[0]), max(end, self._dirty_range[1])]
+
+    def upload_instance_data(self):
+        """ Send changed instance matrices to the GPU; called by the renderer before drawing """
+        # Shaders read matrices column by column
+        if self._instance_buffer_size != self._instance_matrices.nbytes:
+            data = np.ascontiguousarray(self._instance_matrices.transpose(0, 2, 1))
+            GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self._instance_buffer_ref)
+            GL.glBufferData(GL.GL_ARRAY_BUFFER, data.ravel(), GL.GL_DYNAMIC_DRAW)
+            self._instance_buffer_size = data.nbytes
+            ResourceTracker.resize("buffer", self._instance_buffer_ref, data.nbytes)
+        elif self._dirty_range is not None:
+            start, end = self._dirty_range
+            data = np.ascontiguousarray(self._instance_matrices[start:end].transpose(0, 2, 1))
+            GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self._instance_buffer_ref)
+            GL.glBufferSubData(GL.GL_ARRAY_BUFFER, start * 64, data.nbytes, data.ravel())
+        self._dirty_range = None
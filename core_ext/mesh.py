@@ -1,10 +1,11 @@
 import OpenGL.GL as GL
 import numpy as np
 
+from core.resource_tracker import GLResource, ResourceTracker
 from core_ext.object3d import Object3D
 
 
-class Mesh(Object3D):
+class Mesh(Object3D, GLResource):
     """
     Contains geometric data that specifies vertex-related properties and material data
     that specifies the general appearance of the object
@@ -22,11 +23,18 @@ class Mesh(Object3D):
         # Set up associations between attributes stored in geometry
         # and shader program stored in material
         self._vao_ref = GL.glGenVertexArrays(1)
+        ResourceTracker.track("vertex array", self._vao_ref, self)
         GL.glBindVertexArray(self._vao_ref)
         for variable_name, attribute_object in geometry.attribute_dict.items():
             attribute_object.associate_variable(material.program_ref, variable_name)
+        # The element buffer binding is also stored in the vertex array object
+        if geometry.index is not None:
+            geometry.index.associate()
         # Unbind this vertex array object
         GL.glBindVertexArray(0)
+        # Center and half size of the box containing the geometry, used for frustum culling
+        minimum, maximum = geometry.bounding_box
+        self._local_bounds = ((minimum + maximum) / 2, (maximum - minimum) / 2)
         self.heightMesh()
         self.radiusMesh()
 
@@ -45,17 +53,48 @@ class Mesh(Object3D):
     @property
     def visible(self):
         return self._visible
+
+    def release(self, release_geometry=False, release_material=False):
+        """
+        Delete the vertex array object. Geometries and materials may be shared
+        between meshes, so they are only released when asked to
+        """
+        if self._vao_ref is not None:
+            GL.glDeleteVertexArrays(1, [self._vao_ref])
+            ResourceTracker.untrack("vertex array", self._vao_ref)
+            self._vao_ref = None
+        if release_geometry:
+            self._geometry.release()
+        if release_material:
+            self._material.release()
+
+    @property
+    def local_bounds(self):
+        """ Center and half size of the axis-aligned bounding box, in local coordinates """
+        return self._local_bounds
+
+    @property
+    def world_bounds(self):
+        """ Center and half size of an axis-aligned box containing the mesh, in world coordinates """
+        matrix = self.global_matrix
+        center, extent = self.local_bounds
+        world_center = matrix[0:3, 0:3] @ center + matrix[0:3, 3]
+        # Each world axis of the box spans the projections of all the local axes
+        world_extent = np.abs(matrix[0:3, 0:3]) @ extent
+        return world_center, world_extent
+
+    @property
+    def bounding_sphere(self):
+        """ Center and radius of a sphere containing the mesh, in world coordinates """
+        center, extent = self.world_bounds
+        return center, float(np.linalg.norm(extent))
     
     
     def heightMesh(self):
         position_data = self._geometry._attribute_dict["vertexPosition"].data
-        minY = 0
-        maxY = 0
-        for pos in position_data:
-            if pos[1] < minY:
-                minY = pos[1]
-            if pos[1] > maxY:
-                maxY = pos[1]
+        # Extremes of the y coordinates, counting y = 0 as a point of the mesh
+        minY = float(position_data[:, 1].min(initial=0))
+        maxY = float(position_data[:, 1].max(initial=0))
         self._heightMesh = maxY - minY
         return self._heightMesh
     
@@ -91,21 +130,11 @@ class Mesh(Object3D):
     
     def CenterMesh(self):
         position_data = self._geometry._attribute_dict["vertexPosition"].data
-        minX = 0
-        maxX = 0
-        for pos in position_data:
-            if pos[0] < minX:
-                minX = pos[0]
-            if pos[0] > maxX:
-                maxX = pos[0]
+        minX = float(position_data[:, 0].min(initial=0))
+        maxX = float(position_data[:, 0].max(initial=0))
         centerX = (maxX + minX) / 2
-        minZ = 0
-        maxZ = 0
-        for pos in position_data:
-            if pos[1] < minZ:
-                minZ = pos[1]
-            if pos[1] > maxZ:
-                maxZ = pos[1]
+        minZ = float(position_data[:, 1].min(initial=0))
+        maxZ = float(position_data[:, 1].max(initial=0))
         centerZ = (maxZ + minZ) / 2
         self._centerMesh = np.array([centerX, 0, centerZ])
         return self._centerMesh
@@ -1,3 +1,5 @@
+import time
+
 import numpy as np
 from core.matrix import Matrix
 from core_ext import camera
@@ -10,6 +12,12 @@ class Object3D:
         self._matrix = Matrix.make_identity()
         self._parent = None
         self._children_list = []
+        # Cached transform relative to the root; None when it must be recalculated
+        # because this object or one of its ancestors moved
+        self._global_matrix = None
+        # Cached flattened lists of descendants, by type (None for all of them);
+        # cleared whenever the tree below this object changes
+        self._descendant_cache = {}
         # Initialize bounding cylinder properties
         self._center = np.array([0, 0, 0])  # Center of the bounding cylinder
         self._height = 1.0                   # Height of the bounding cylinder
@@ -36,42 +44,74 @@ class Object3D:
     @children_list.setter
     def children_list(self, children_list):
         self._children_list = children_list
+        self._invalidate_descendant_cache()
 
     @property
     def descendant_list(self):
         """ Return a single list containing all descendants """
-        # master list of all descendant nodes
-        descendant_list = []
-        # nodes to be added to descendant list,
-        # and whose children will be added to this list
-        nodes_to_process = [self]
-        # continue processing nodes while any are left
-        while len(nodes_to_process) > 0:
-            # remove first node from list
-            node = nodes_to_process.pop(0)
-            # add this node to descendant list
-            descendant_list.append(node)
-            # children of this node must also be processed
-            nodes_to_process = node._children_list + nodes_to_process
+        return list(self.descendants_of_type(None))
+
+    def descendants_of_type(self, object_type):
+        """
+        Return the descendants (including this object) that are instances of
+        object_type, or all of them for None, in depth-first order.
+        The list is cached until the tree changes and must not be modified.
+        """
+        descendant_list = self._descendant_cache.get(object_type)
+        if descendant_list is None:
+            if object_type is None:
+                descendant_list = []
+                # nodes still to be added to descendant list; the last one is processed first
+                nodes_to_process = [self]
+                while nodes_to_process:
+                    node = nodes_to_process.pop()
+                    descendant_list.append(node)
+                    # children are pushed in reverse so that the first child comes out next
+                    nodes_to_process.extend(reversed(node._children_list))
+            else:
+                descendant_list = [node for node in self.descendants_of_type(None)
+                                   if isinstance(node, object_type)]
+            self._descendant_cache[object_type] = descendant_list
         return descendant_list
 
+    def _invalidate_descendant_cache(self):
+        """ Clear the cached descendant lists of this object and all its ancestors """
+        node = self
+        while node is not None:
+            node._descendant_cache = {}
+            node = node._parent
+
     @property
     def global_matrix(self):
         """
         Calculate the transformation of this Object3D
         relative to the root Object3D of the scene graph
         """
-        if self._parent is None:
-            return self._matrix
-        else:
-            return self._parent.global_matrix @ self._matrix
+        if self._global_matrix is None:
+            if self._parent is None:
+                self._global_matrix = self._matrix
+            else:
+                self._global_matrix = self._parent.global_matrix @ self._matrix
+        return self._global_matrix
+
+    def _invalidate_global_matrix(self):
+        """ Mark the cached global matrix of this object and its descendants as outdated """
+        nodes_to_process = [self]
+        while nodes_to_process:
+            node = nodes_to_process.pop()
+            # A matrix is only cached after the matrices of all its ancestors,
+            # so the descendants of an outdated node are already outdated
+            if node._global_matrix is not None:
+                node._global_matrix = None
+                nodes_to_process.extend(node._children_list)
 
     @property
     def global_position(self):
         """ Return the global or world position of the object """
-        return [self.global_matrix.item((0, 3)),
-                self.global_matrix.item((1, 3)),
-                self.global_matrix.item((2, 3))]
+        global_matrix = self.global_matrix
+        return [global_matrix.item((0, 3)),
+                global_matrix.item((1, 3)),
+                global_matrix.item((2, 3))]
 
     @property
     def local_matrix(self):
@@ -80,6 +120,7 @@ class Object3D:
     @local_matrix.setter
     def local_matrix(self, matrix):
         self._matrix = matrix
+        self._invalidate_global_matrix()
 
     @property
     def local_position(self):
@@ -99,6 +140,7 @@ class Object3D:
     @parent.setter
     def parent(self, parent):
         self._parent = parent
+        self._invalidate_global_matrix()
 
     @property
     def rotation_matrix(self):
@@ -120,10 +162,12 @@ class Object3D:
     def add(self, child):
         self._children_list.append(child)
         child.parent = self
+        self._invalidate_descendant_cache()
 
     def remove(self, child):
         self._children_list.remove(child)
         child.parent = None
+        self._invalidate_descendant_cache()
 
     # apply geometric transformations
     def apply_matrix(self, matrix, local=True):
@@ -133,6 +177,7 @@ class Object3D:
         else:
             # global transform
             self._matrix = matrix @ self._matrix
+        self._invalidate_global_matrix()
 
     def translate(self, x, y, z, local=True):
         m = Matrix.make_translation(x, y, z)
@@ -159,9 +204,11 @@ class Object3D:
         self._matrix.itemset((0, 3), position[0])
         self._matrix.itemset((1, 3), position[1])
         self._matrix.itemset((2, 3), position[2])
+        self._invalidate_global_matrix()
 
     def look_at(self, target_position):
         self._matrix = Matrix.make_look_at(self.global_position, target_position)
+        self._invalidate_global_matrix()
 
     def set_direction(self, direction):
         position = self.local_position
@@ -191,4 +238,51 @@ class Object3D:
 
         # Neste ponto, os cilindros podem se interceptar. Você pode adicionar uma verificação mais precisa se necessário.
 
-        return True
\ No newline at end of file
+        return True
+
+
+def benchmark(node_count=10000, frame_count=20, moving_fraction=0.01):
+    """
+    Time the transforms of a frame in a scene of node_count objects: a few objects
+    move, then every global matrix is read, as the renderer does. The uncached
+    time recalculates each global matrix through the whole chain of parents.
+    Then time the flattening of the scene tree, with and without the cache.
+    """
+    def uncached_global_matrix(node):
+        if node._parent is None:
+            return node._matrix
+        return uncached_global_matrix(node._parent) @ node._matrix
+
+    # Chains of ten objects, each one the child of the previous
+    root = Object3D()
+    node_list = []
+    for i in range(node_count):
+        node = Object3D()
+        node.translate(1, 0, 0)
+        (root if i % 10 == 0 else node_list[-1]).add(node)
+        node_list.append(node)
+    rng = np.random.default_rng(0)
+    moving_count = max(1, int(node_count * moving_fraction))
+    for name, read in (("uncached", uncached_global_matrix), ("cached", lambda node: node.global_matrix)):
+        start = time.perf_counter()
+        for frame in range(frame_count):
+            for index in rng.integers(0, node_count, moving_count):
+                node_list[index].translate(0, 0.01, 0)
+            for node in node_list:
+                read(node)
+        frame_time = (time.perf_counter() - start) / frame_count
+        print(f"{name:<10}{frame_time * 1000:>10.2f} ms per frame")
+    # Flattening the tree, as the renderer does every frame to find the meshes
+    start = time.perf_counter()
+    for frame in range(frame_count):
+        root._invalidate_descendant_cache()
+        root.descendants_of_type(Object3D)
+    print(f"{'rebuilt':<10}{(time.perf_counter() - start) / frame_count * 1000:>10.2f} ms per descendant list")
+    start = time.perf_counter()
+    for frame in range(frame_count):
+        root.descendants_of_type(Object3D)
+    print(f"{'cached':<10}{(time.perf_counter() - start) / frame_count * 1000:>10.2f} ms per descendant list")
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -1,16 +1,19 @@
 import OpenGL.GL as GL
 import pygame
 
+from core.resource_tracker import GLResource, ResourceTracker
 from core_ext.texture import Texture
 
 
-class RenderTarget:
+class RenderTarget(GLResource):
     """
     Create a framebuffer as the target when rendering
     """
     def __init__(self, resolution=(512, 512), texture=None, property_dict=None):
         # Values should equal texture dimensions
         self._width, self._height = resolution
+        # A texture given by the caller is not released with the target
+        self._owns_texture = texture is None
         if texture is not None:
             self._texture = texture
         else:
@@ -27,15 +30,19 @@ class RenderTarget:
             self._texture.upload_data()
         # Create a framebuffer
         self._framebuffer_ref = GL.glGenFramebuffers(1)
+        ResourceTracker.track("framebuffer", self._framebuffer_ref, self)
         GL.glBindFramebuffer(GL.GL_FRAMEBUFFER, self._framebuffer_ref)
         # Configure color buffer to use this texture
         GL.glFramebufferTexture(GL.GL_FRAMEBUFFER, GL.GL_COLOR_ATTACHMENT0,
                                 self._texture.texture_ref, 0)
         # Generate a buffer to store depth information
-        depth_buffer_ref = GL.glGenRenderbuffers(1)
-        GL.glBindRenderbuffer(GL.GL_RENDERBUFFER, depth_buffer_ref)
+        self._depth_buffer_ref = GL.glGenRenderbuffers(1)
+        GL.glBindRenderbuffer(GL.GL_RENDERBUFFER, self._depth_buffer_ref)
         GL.glRenderbufferStorage(GL.GL_RENDERBUFFER, GL.GL_DEPTH_COMPONENT, self._width, self._height)
-        GL.glFramebufferRenderbuffer(GL.GL_FRAMEBUFFER, GL.GL_DEPTH_ATTACHMENT, GL.GL_RENDERBUFFER, depth_buffer_ref)
+        # Depth values are stored in (at most) 4 bytes
+        ResourceTracker.track("renderbuffer", self._depth_buffer_ref, self, self._width * self._height * 4)
+        GL.glFramebufferRenderbuffer(GL.GL_FRAMEBUFFER, GL.GL_DEPTH_ATTACHMENT, GL.GL_RENDERBUFFER,
+                                     self._depth_buffer_ref)
         # Check framebuffer status
         if GL.glCheckFramebufferStatus(GL.GL_FRAMEBUFFER) != GL.GL_FRAMEBUFFER_COMPLETE:
             raise Exception("Framebuffer status error")
@@ -55,3 +62,15 @@ class RenderTarget:
     @property
     def texture(self):
         return self._texture
+
+    def release(self):
+        """ Delete the framebuffer, its depth buffer and the texture it created """
+        if self._framebuffer_ref is not None:
+            GL.glDeleteFramebuffers(1, [self._framebuffer_ref])
+            GL.glDeleteRenderbuffers(1, [self._depth_buffer_ref])
+            ResourceTracker.untrack("framebuffer", self._framebuffer_ref)
+            ResourceTracker.untrack("renderbuffer", self._depth_buffer_ref)
+            self._framebuffer_ref = None
+            self._depth_buffer_ref = None
+            if self._owns_texture:
+                self._texture.release()
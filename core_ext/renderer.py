@@ -1,6 +1,9 @@
 import OpenGL.GL as GL
 import pygame
 
+from core.uniform import Uniform
+from core_ext.frame_uniforms import FrameUniforms
+from core_ext.instanced_mesh import InstancedMesh
 from core_ext.mesh import Mesh
 from light.light import Light
 from light.shadow import Shadow
@@ -15,6 +18,8 @@ class Renderer:
         GL.glClearColor(*clear_color, 1)
         self._window_size = pygame.display.get_surface().get_size()
         self._shadows_enabled = False
+        # Camera, light and shadow values shared by all meshes in a frame
+        self._frame_uniforms = FrameUniforms()
 
     @property
     def window_size(self):
@@ -25,10 +30,9 @@ class Renderer:
         return self._shadow_object
 
     def render(self, scene, camera, clear_color=True, clear_depth=True, render_target=None):
-        # Filter descendents
-        descendant_list = scene.descendant_list
-        mesh_filter = lambda x: isinstance(x, Mesh)
-        mesh_list = list(filter(mesh_filter, descendant_list))
+        # Flattened lists of meshes and lights, cached by the scene until its tree changes
+        mesh_list = scene.descendants_of_type(Mesh)
+        light_list = scene.descendants_of_type(Light)
 
         # shadow pass
         if self._shadows_enabled:
@@ -43,6 +47,7 @@ class Renderer:
             # only need to call glUseProgram & set matrices once
             GL.glUseProgram(self._shadow_object.material.program_ref)
             self._shadow_object.update_internal()
+            instanced_list = []
             for mesh in mesh_list:
                 # Skip invisible meshes
                 if not mesh.visible:
@@ -50,6 +55,11 @@ class Renderer:
                 # Only triangle-based meshes cast shadows
                 if mesh.material.setting_dict["drawStyle"] != GL.GL_TRIANGLES:
                     continue
+                # Instanced meshes are drawn afterwards, with the instanced depth material
+                if isinstance(mesh, InstancedMesh):
+                    if mesh.instance_count:
+                        instanced_list.append(mesh)
+                    continue
                 # Bind VAO
                 GL.glBindVertexArray(mesh.vao_ref)
                 # Update transform data
@@ -57,7 +67,18 @@ class Renderer:
                 # Update uniforms (matrix data) stored in shadow material
                 for var_name, uniform_obj in self._shadow_object.material.uniform_dict.items():
                     uniform_obj.upload_data()
-                GL.glDrawArrays(GL.GL_TRIANGLES, 0, mesh.geometry.vertex_count)
+                self._draw(mesh.geometry, GL.GL_TRIANGLES)
+            # One draw call for all the instances of each instanced mesh
+            if instanced_list:
+                instanced_material = self._shadow_object.instanced_material
+                GL.glUseProgram(instanced_material.program_ref)
+                for mesh in instanced_list:
+                    GL.glBindVertexArray(mesh.vao_ref_for(instanced_material.program_ref))
+                    instanced_material.uniform_dict["modelMatrix"].data = mesh.global_matrix
+                    for uniform_object in instanced_material.uniform_dict.values():
+                        uniform_object.upload_data()
+                    mesh.upload_instance_data()
+                    self._draw(mesh.geometry, GL.GL_TRIANGLES, mesh.instance_count)
 
         # Activate render target
         if render_target is None:
@@ -80,11 +101,16 @@ class Renderer:
         GL.glBlendFunc(GL.GL_SRC_ALPHA, GL.GL_ONE_MINUS_SRC_ALPHA)
         # Update camera view (calculate inverse)
         camera.update_view_matrix()
-        # Extract list of all Mesh instances in scene
-        descendant_list = scene.descendant_list
-        mesh_list = list(filter(lambda x: isinstance(x, Mesh), descendant_list))
-        # Extract list of all Light instances in scene
-        light_list = list(filter(lambda x: isinstance(x, Light), descendant_list))
+        # Upload the values shared by all meshes once per frame
+        if self._shadows_enabled:
+            self._frame_uniforms.update(camera, light_list, self._shadow_object)
+        else:
+            self._frame_uniforms.update(camera, light_list)
+        # Textures may have been bound since the last frame
+        Uniform.forget_texture_bindings()
+        if self._shadows_enabled:
+            Uniform.bind_texture(self._shadow_object.render_target.texture.texture_ref,
+                                 FrameUniforms.SHADOW_TEXTURE_UNIT)
         for mesh in mesh_list:
             # If this object is not visible, continue to next object in list
             if not mesh.visible:
@@ -96,24 +122,32 @@ class Renderer:
             mesh.material.uniform_dict["modelMatrix"].data = mesh.global_matrix
             mesh.material.uniform_dict["viewMatrix"].data = camera.view_matrix
             mesh.material.uniform_dict["projectionMatrix"].data = camera.projection_matrix
-            # If material uses light data, add lights from list
-            if "light0" in mesh.material.uniform_dict.keys():
-                for light_number in range(len(light_list)):
-                    light_name = "light" + str(light_number)
-                    light_instance = light_list[light_number]
-                    mesh.material.uniform_dict[light_name].data = light_instance
-            # Add camera position if needed (specular lighting)
-            if "viewPosition" in mesh.material.uniform_dict.keys():
-                mesh.material.uniform_dict["viewPosition"].data = camera.global_position
-            # Add shadow data if enabled and used by shader
-            if self._shadows_enabled and "shadow0" in mesh.material.uniform_dict.keys():
-                mesh.material.uniform_dict["shadow0"].data = self._shadow_object
             # Update uniforms stored in material
             for uniform_object in mesh.material.uniform_dict.values():
                 uniform_object.upload_data()
             # Update render settings
             mesh.material.update_render_settings()
-            GL.glDrawArrays(mesh.material.setting_dict["drawStyle"], 0, mesh.geometry.vertex_count)
+            if isinstance(mesh, InstancedMesh):
+                mesh.upload_instance_data()
+                self._draw(mesh.geometry, mesh.material.setting_dict["drawStyle"], mesh.instance_count)
+            else:
+                self._draw(mesh.geometry, mesh.material.setting_dict["drawStyle"])
+        # Index buffers bound later must not change the vertex array of the last mesh
+        GL.glBindVertexArray(0)
+
+    @staticmethod
+    def _draw(geometry, draw_style, instance_count=None):
+        """ Issue the draw call for the bound VAO: indexed or not, instanced or not """
+        if geometry.index is not None:
+            if instance_count is None:
+                GL.glDrawElements(draw_style, geometry.index.count, GL.GL_UNSIGNED_INT, None)
+            else:
+                GL.glDrawElementsInstanced(draw_style, geometry.index.count, GL.GL_UNSIGNED_INT, None,
+                                           instance_count)
+        elif instance_count is None:
+            GL.glDrawArrays(draw_style, 0, geometry.vertex_count)
+        else:
+            GL.glDrawArraysInstanced(draw_style, 0, geometry.vertex_count, instance_count)
 
     def enable_shadows(self, shadow_light, strength=0.5, resolution=(512, 512)):
         self._shadows_enabled = True
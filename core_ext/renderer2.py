@@ -1,10 +1,19 @@
 import OpenGL.GL as GL
+import numpy as np
 import pygame
 
+from core.profiler import Profiler
+from core.uniform import Uniform
+from core_ext.frame_uniforms import FrameUniforms
+from core_ext.instanced_mesh import InstancedMesh
 from core_ext.mesh import Mesh
+from core_ext.static_batcher import StaticBatchMesh
 from light.light import Light
 from light.shadow import Shadow
 
+# Used by render(measure=False): never enabled, so its scopes cost nothing
+_IDLE_PROFILER = Profiler()
+
 
 class Renderer:
     def __init__(self, clear_color=(0, 0, 0)):
@@ -14,6 +23,20 @@ class Renderer:
         GL.glClearColor(*clear_color, 1)
         self._window_size = pygame.display.get_surface().get_size()
         self._shadows_enabled = False
+        # Camera, light and shadow values shared by all meshes in a frame
+        self._frame_uniforms = FrameUniforms()
+        # Skip meshes whose bounding box is outside the camera view
+        self.frustum_culling = True
+        # State changes and draw calls of the last rendered frame
+        self._render_stats = {}
+        # Target used instead of the window, e.g. when running headless
+        self.default_render_target = None
+        # Times the shadow and draw passes; replace with the profiler of the application
+        self.profiler = Profiler()
+
+    @property
+    def render_stats(self):
+        return self._render_stats
 
     @property
     def window_size(self):
@@ -23,14 +46,17 @@ class Renderer:
     def shadow_object(self):
         return self._shadow_object
 
-    def render(self, scene, camera, clear_color=True, clear_depth=True, render_target=None):
-        # Filter descendents
-        descendant_list = scene.descendant_list
-        mesh_filter = lambda x: isinstance(x, Mesh)
-        mesh_list = list(filter(mesh_filter, descendant_list))
+    def render(self, scene, camera, clear_color=True, clear_depth=True, render_target=None, measure=True):
+        # measure=False draws without timing the passes or replacing render_stats,
+        # e.g. for an overlay drawn over the measured frame
+        profiler = self.profiler if measure else _IDLE_PROFILER
+        # Flattened lists of meshes and lights, cached by the scene until its tree changes
+        mesh_list = scene.descendants_of_type(Mesh)
+        light_list = scene.descendants_of_type(Light)
 
         # shadow pass
         if self._shadows_enabled:
+            profiler.begin("render.shadow", gpu=True)
             # Set render target properties
             GL.glBindFramebuffer(GL.GL_FRAMEBUFFER, self._shadow_object.render_target.framebuffer_ref)
             GL.glViewport(0, 0, self._shadow_object.render_target.width, self._shadow_object.render_target.height)
@@ -42,6 +68,7 @@ class Renderer:
             # only need to call glUseProgram & set matrices once
             GL.glUseProgram(self._shadow_object.material.program_ref)
             self._shadow_object.update_internal()
+            instanced_list = []
             for mesh in mesh_list:
                 # Skip invisible meshes
                 if not mesh.visible:
@@ -49,6 +76,11 @@ class Renderer:
                 # Only triangle-based meshes cast shadows
                 if mesh.material.setting_dict["drawStyle"] != GL.GL_TRIANGLES:
                     continue
+                # Instanced meshes are drawn afterwards, with the instanced depth material
+                if isinstance(mesh, InstancedMesh):
+                    if mesh.instance_count:
+                        instanced_list.append(mesh)
+                    continue
                 # Bind VAO
                 GL.glBindVertexArray(mesh.vao_ref)
                 # Update transform data
@@ -56,9 +88,24 @@ class Renderer:
                 # Update uniforms (matrix data) stored in shadow material
                 for var_name, uniform_obj in self._shadow_object.material.uniform_dict.items():
                     uniform_obj.upload_data()
-                GL.glDrawArrays(GL.GL_TRIANGLES, 0, mesh.geometry.vertex_count)
+                self._draw(mesh.geometry, GL.GL_TRIANGLES)
+            # One draw call for all the instances of each instanced mesh
+            if instanced_list:
+                instanced_material = self._shadow_object.instanced_material
+                GL.glUseProgram(instanced_material.program_ref)
+                for mesh in instanced_list:
+                    GL.glBindVertexArray(mesh.vao_ref_for(instanced_material.program_ref))
+                    instanced_material.uniform_dict["modelMatrix"].data = mesh.global_matrix
+                    for uniform_object in instanced_material.uniform_dict.values():
+                        uniform_object.upload_data()
+                    mesh.upload_instance_data()
+                    self._draw(mesh.geometry, GL.GL_TRIANGLES, mesh.instance_count)
+            profiler.end()
 
+        profiler.begin("render.draw", gpu=True)
         # Activate render target
+        if render_target is None:
+            render_target = self.default_render_target
         if render_target is None:
             # Set render target to window
             # (the value 0 is indicating the framebuffer attached to the window)
@@ -79,40 +126,138 @@ class Renderer:
         GL.glBlendFunc(GL.GL_SRC_ALPHA, GL.GL_ONE_MINUS_SRC_ALPHA)
         # Update camera view (calculate inverse)
         camera.update_view_matrix()
-        # Extract list of all Mesh instances in scene
-        descendant_list = scene.descendant_list
-        mesh_list = list(filter(lambda x: isinstance(x, Mesh), descendant_list))
-        # Extract list of all Light instances in scene
-        light_list = list(filter(lambda x: isinstance(x, Light), descendant_list))
-        for mesh in mesh_list:
-            # If this object is not visible, continue to next object in list
-            if not mesh.visible:
-                continue
-            GL.glUseProgram(mesh.material.program_ref)
+        # Upload the values shared by all meshes once per frame
+        if self._shadows_enabled:
+            self._frame_uniforms.update(camera, light_list, self._shadow_object)
+        else:
+            self._frame_uniforms.update(camera, light_list)
+        # Reset per frame counters; textures may have been bound since the last frame
+        Uniform.forget_texture_bindings()
+        texture_bind_start = Uniform.texture_bind_count
+        performed_start = Uniform.upload_stats["performed"]
+        skipped_start = Uniform.upload_stats["skipped"]
+        if self._shadows_enabled:
+            Uniform.bind_texture(self._shadow_object.render_target.texture.texture_ref,
+                                 FrameUniforms.SHADOW_TEXTURE_UNIT)
+        stats = {"culled": 0, "culled_parts": 0, "drawn": 0, "program_switches": 0,
+                 "vao_binds": 0, "texture_binds": 0, "settings_changes": 0, "draw_calls": 0,
+                 "uniform_uploads": 0, "uniform_skips": 0}
+        current_program_ref = None
+        current_vao_ref = None
+        current_settings_key = None
+        frustum_planes = camera.frustum_planes
+        for mesh in self._render_queue(mesh_list, camera, stats):
+            material = mesh.material
+            if material.program_ref != current_program_ref:
+                GL.glUseProgram(material.program_ref)
+                current_program_ref = material.program_ref
+                stats["program_switches"] += 1
             # Bind VAO
-            GL.glBindVertexArray(mesh.vao_ref)
+            if mesh.vao_ref != current_vao_ref:
+                GL.glBindVertexArray(mesh.vao_ref)
+                current_vao_ref = mesh.vao_ref
+                stats["vao_binds"] += 1
             # Update uniform values stored outside of material
-            mesh.material.uniform_dict["modelMatrix"].data = mesh.global_matrix
-            mesh.material.uniform_dict["viewMatrix"].data = camera.view_matrix
-            mesh.material.uniform_dict["projectionMatrix"].data = camera.projection_matrix
-            # If material uses light data, add lights from list
-            if "light0" in mesh.material.uniform_dict.keys():
-                for light_number in range(len(light_list)):
-                    light_name = "light" + str(light_number)
-                    light_instance = light_list[light_number]
-                    mesh.material.uniform_dict[light_name].data = light_instance
-            # Add camera position if needed (specular lighting)
-            if "viewPosition" in mesh.material.uniform_dict.keys():
-                mesh.material.uniform_dict["viewPosition"].data = camera.global_position
-            # Add shadow data if enabled and used by shader
-            if self._shadows_enabled and "shadow0" in mesh.material.uniform_dict.keys():
-                mesh.material.uniform_dict["shadow0"].data = self._shadow_object
+            material.uniform_dict["modelMatrix"].data = mesh.global_matrix
+            material.uniform_dict["viewMatrix"].data = camera.view_matrix
+            material.uniform_dict["projectionMatrix"].data = camera.projection_matrix
             # Update uniforms stored in material
-            for uniform_object in mesh.material.uniform_dict.values():
+            for uniform_object in material.uniform_dict.values():
                 uniform_object.upload_data()
-            # Update render settings
-            mesh.material.update_render_settings()
-            GL.glDrawArrays(mesh.material.setting_dict["drawStyle"], 0, mesh.geometry.vertex_count)
+            # Update render settings, unless the previous mesh used the same ones
+            settings_key = material.settings_key
+            if settings_key != current_settings_key:
+                material.update_render_settings()
+                current_settings_key = settings_key
+                stats["settings_changes"] += 1
+            if isinstance(mesh, InstancedMesh):
+                mesh.upload_instance_data()
+                self._draw(mesh.geometry, material.setting_dict["drawStyle"], mesh.instance_count)
+                stats["draw_calls"] += 1
+                stats["drawn"] += 1
+            elif isinstance(mesh, StaticBatchMesh) and mesh.part_count and self.frustum_culling:
+                # Draw only the merged meshes inside the view, joining consecutive ones
+                visible = mesh.part_visibility(frustum_planes)
+                range_list = mesh.visible_ranges(visible)
+                mesh.draw_ranges(range_list)
+                stats["draw_calls"] += len(range_list)
+                stats["culled_parts"] += mesh.part_count - int(visible.sum())
+                # A batch with every part outside the view draws nothing
+                if range_list:
+                    stats["drawn"] += 1
+            else:
+                self._draw(mesh.geometry, material.setting_dict["drawStyle"])
+                stats["draw_calls"] += 1
+                stats["drawn"] += 1
+        # Index buffers bound later must not change the vertex array of the last mesh
+        GL.glBindVertexArray(0)
+        stats["texture_binds"] = Uniform.texture_bind_count - texture_bind_start
+        stats["uniform_uploads"] = Uniform.upload_stats["performed"] - performed_start
+        stats["uniform_skips"] = Uniform.upload_stats["skipped"] - skipped_start
+        profiler.end()
+        if measure:
+            self._render_stats = stats
+
+    def _render_queue(self, mesh_list, camera, stats):
+        """
+        Return the visible meshes in drawing order, leaving out
+        the ones outside the camera view when frustum culling is enabled.
+        Opaque meshes are grouped by shader program, textures, render settings
+        and vertex array, so that consecutive draws change as little GL state
+        as possible. Transparent meshes follow, sorted from back to front.
+        """
+        opaque_list = []
+        transparent_list = []
+        camera_position = np.array(camera.global_position)
+        frustum_planes = camera.frustum_planes
+        for mesh in mesh_list:
+            # If this object is not visible, it is not drawn
+            if not mesh.visible:
+                continue
+            # An instanced mesh without instances has nothing to draw
+            if isinstance(mesh, InstancedMesh) and mesh.instance_count == 0:
+                continue
+            if self.frustum_culling and not self._in_frustum(mesh, frustum_planes):
+                stats["culled"] += 1
+                continue
+            material = mesh.material
+            if material.setting_dict["transparent"]:
+                distance = np.linalg.norm(np.array(mesh.global_position) - camera_position)
+                transparent_list.append((-distance, mesh))
+            else:
+                # Settings only need to compare equal, so their hash is enough to group them
+                key = (material.program_ref, material.texture_key,
+                       hash(material.settings_key), mesh.vao_ref)
+                opaque_list.append((key, mesh))
+        # Sorting only compares the keys; equal keys keep the scene order
+        opaque_list.sort(key=lambda item: item[0])
+        transparent_list.sort(key=lambda item: item[0])
+        return [mesh for _, mesh in opaque_list] + [mesh for _, mesh in transparent_list]
+
+    @staticmethod
+    def _in_frustum(mesh, frustum_planes):
+        """ Test the world bounding box of the mesh against the camera frustum planes """
+        center, extent = mesh.world_bounds
+        # Signed distance of the box center to each plane (scaled by the plane normal length)
+        distance = frustum_planes[:, 0:3] @ center + frustum_planes[:, 3]
+        # Largest distance from the center to a box corner, along each plane normal
+        radius = np.abs(frustum_planes[:, 0:3]) @ extent
+        # The box is outside if it is entirely behind any plane
+        return bool((distance >= -radius).all())
+
+    @staticmethod
+    def _draw(geometry, draw_style, instance_count=None):
+        """ Issue the draw call for the bound VAO: indexed or not, instanced or not """
+        if geometry.index is not None:
+            if instance_count is None:
+                GL.glDrawElements(draw_style, geometry.index.count, GL.GL_UNSIGNED_INT, None)
+            else:
+                GL.glDrawElementsInstanced(draw_style, geometry.index.count, GL.GL_UNSIGNED_INT, None,
+                                           instance_count)
+        elif instance_count is None:
+            GL.glDrawArrays(draw_style, 0, geometry.vertex_count)
+        else:
+            GL.glDrawArraysInstanced(draw_style, 0, geometry.vertex_count, instance_count)
 
     def enable_shadows(self, shadow_light, strength=0.5, resolution=(512, 512)):
         self._shadows_enabled = True
@@ -0,0 +1,173 @@
+import ctypes
+
+import OpenGL.GL as GL
+import numpy as np
+
+from core_ext.mesh import Mesh
+from geometry.geometry import Geometry, transform_normals, transform_positions
+
+
+class StaticBatchMesh(Mesh):
+    """
+    Mesh made by StaticBatcher from several meshes that never move.
+    Optionally keeps the range of vertices (or indices) and the bounding box
+    of every original mesh, so that the renderer can skip the parts outside
+    the camera view while still drawing the rest with few draw calls.
+    """
+    def __init__(self, geometry, material, part_ranges=None, part_bounds=None):
+        super().__init__(geometry, material)
+        # (start, count) of each part, in vertices or, for indexed geometries, in indices
+        self._part_ranges = part_ranges
+        # centers and half sizes of the parts, shape (part count, 3), in local coordinates
+        self._part_bounds = part_bounds
+
+    @property
+    def part_count(self):
+        return 0 if self._part_ranges is None else len(self._part_ranges)
+
+    def part_visibility(self, frustum_planes):
+        """
+        Return which parts have their bounding box inside the camera frustum;
+        the same test as the renderer uses for whole meshes, for all parts at once
+        """
+        matrix = self.global_matrix
+        centers, extents = self._part_bounds
+        world_centers = centers @ matrix[0:3, 0:3].T + matrix[0:3, 3]
+        world_extents = extents @ np.abs(matrix[0:3, 0:3]).T
+        distances = world_centers @ frustum_planes[:, 0:3].T + frustum_planes[:, 3]
+        radii = world_extents @ np.abs(frustum_planes[:, 0:3]).T
+        return (distances >= -radii).all(axis=1)
+
+    def visible_ranges(self, visible):
+        """ Return the (start, count) ranges of the visible parts, joining consecutive ones """
+        range_list = []
+        for (start, count), part_visible in zip(self._part_ranges, visible):
+            if not part_visible:
+                continue
+            if range_list and range_list[-1][0] + range_list[-1][1] == start:
+                range_list[-1][1] += count
+            else:
+                range_list.append([start, count])
+        return range_list
+
+    def draw_ranges(self, range_list):
+        """ Draw part of the geometry; the vertex array object must be bound """
+        draw_style = self.material.setting_dict["drawStyle"]
+        for start, count in range_list:
+            if self.geometry.index is not None:
+                # Offsets into the element buffer are given in bytes
+                GL.glDrawElements(draw_style, count, GL.GL_UNSIGNED_INT, ctypes.c_void_p(start * 4))
+            else:
+                GL.glDrawArrays(draw_style, start, count)
+
+
+class StaticBatcher:
+    """
+    Level build step that merges meshes which never move after being placed.
+    The vertices of each mesh are transformed once by its matrix, and meshes
+    whose materials draw alike and whose geometries have the same attributes
+    are concatenated into a single StaticBatchMesh, which replaces them in
+    the scene graph. Meshes must not be moved, nor their materials changed,
+    after being batched.
+    """
+    def __init__(self, keep_bounds=True, min_batch_size=2):
+        # Keep the bounds of every merged mesh, for frustum culling of the parts
+        self.keep_bounds = keep_bounds
+        # Groups with fewer meshes are left as they are
+        self.min_batch_size = min_batch_size
+        # Number of meshes merged and of batch meshes made by the last batch() call
+        self._stats = {"meshes": 0, "batches": 0}
+
+    @property
+    def stats(self):
+        return self._stats
+
+    def batch(self, root, mesh_list=None):
+        """
+        Replace meshes below root by batch meshes attached to root; return the batch meshes.
+        By default every mesh that can be batched is used; pass mesh_list to choose them.
+        """
+        if mesh_list is None:
+            mesh_list = root.descendants_of_type(Mesh)
+        group_dict = {}
+        for mesh in mesh_list:
+            if mesh is root or not self._can_batch(mesh):
+                continue
+            group_dict.setdefault(self._group_key(mesh), []).append(mesh)
+        # Vertices are stored relative to root, where the batch meshes are attached
+        root_inverse = np.linalg.inv(root.global_matrix)
+        batch_list = []
+        self._stats = {"meshes": 0, "batches": 0}
+        for group in group_dict.values():
+            if len(group) < self.min_batch_size:
+                continue
+            batch_mesh = self._merge(group, root_inverse)
+            for mesh in group:
+                mesh.parent.remove(mesh)
+            root.add(batch_mesh)
+            batch_list.append(batch_mesh)
+            self._stats["meshes"] += len(group)
+            self._stats["batches"] += 1
+        return batch_list
+
+    @staticmethod
+    def _can_batch(mesh):
+        """ Only single, visible triangle meshes without children are merged """
+        return (type(mesh) is Mesh
+                and mesh.visible
+                and not mesh.children_list
+                and mesh.parent is not None
+                and mesh.material.setting_dict["drawStyle"] == GL.GL_TRIANGLES
+                and not mesh.material.setting_dict["transparent"])
+
+    @staticmethod
+    def _group_key(mesh):
+        geometry = mesh.geometry
+        attribute_key = tuple(sorted((variable_name, attribute.data_type)
+                                     for variable_name, attribute in geometry.attribute_dict.items()))
+        return mesh.material.batch_key, attribute_key, geometry.index is not None
+
+    def _merge(self, group, root_inverse):
+        """ Build the batch mesh of a group of meshes """
+        first = group[0]
+        data_dict = {variable_name: [] for variable_name in first.geometry.attribute_dict}
+        index_list = []
+        part_ranges = []
+        centers = []
+        extents = []
+        vertex_offset = 0
+        index_offset = 0
+        for mesh in group:
+            geometry = mesh.geometry
+            matrix = root_inverse @ mesh.global_matrix
+            for variable_name, attribute in geometry.attribute_dict.items():
+                data = attribute.data
+                if variable_name == "vertexPosition":
+                    data = transform_positions(data, matrix)
+                elif variable_name in ("vertexNormal", "faceNormal"):
+                    data = transform_normals(data, matrix)
+                data_dict[variable_name].append(data)
+            vertex_count = len(geometry.attribute_dict["vertexPosition"].data)
+            if geometry.index is not None:
+                index_count = geometry.index.count
+                index_list.append(np.asarray(geometry.index.data, dtype=np.uint32) + vertex_offset)
+                part_ranges.append((index_offset, index_count))
+                index_offset += index_count
+            else:
+                part_ranges.append((vertex_offset, vertex_count))
+            vertex_offset += vertex_count
+            # Box of the transformed mesh, as Mesh.world_bounds computes it
+            center, extent = mesh.local_bounds
+            centers.append(matrix[0:3, 0:3] @ center + matrix[0:3, 3])
+            extents.append(np.abs(matrix[0:3, 0:3]) @ extent)
+
+        geometry = Geometry()
+        for variable_name, attribute in first.geometry.attribute_dict.items():
+            geometry.add_attribute(attribute.data_type, variable_name,
+                                   np.concatenate(data_dict[variable_name]))
+        if index_list:
+            geometry.set_index(np.concatenate(index_list))
+        if self.keep_bounds:
+            return StaticBatchMesh(geometry, first.material, part_ranges,
+                                   (np.array(centers), np.array(extents)))
+        return StaticBatchMesh(geometry, first.material)
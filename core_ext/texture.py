@@ -1,14 +1,22 @@
 import OpenGL.GL as GL
+import OpenGL.raw.GL.VERSION.GL_1_3 as GL_1_3
+import numpy as np
 import pygame
 
+from core.resource_tracker import GLResource, ResourceTracker
+from core.uniform import Uniform
 
-class Texture:
+
+class Texture(GLResource):
     def __init__(self, file_name=None, property_dict={}):
         # Pygame object for storing pixel data;
         # can load from image or manipulate directly
         self._surface = None
         # reference of available texture from GPU
         self._texture_ref = GL.glGenTextures(1)
+        ResourceTracker.track("texture", self._texture_ref, self)
+        # bytes of GPU memory used by the uploaded image and its mipmaps
+        self._memory_size = 0
         # default property values
         self._property_dict = {
             "magFilter": GL.GL_LINEAR,
@@ -33,6 +41,10 @@ class Texture:
     def texture_ref(self):
         return self._texture_ref
 
+    @property
+    def memory_size(self):
+        return self._memory_size
+
     def load_image(self, file_name):
         """ Load image from file """
         self._surface = pygame.image.load(file_name)
@@ -53,12 +65,83 @@ class Texture:
         height = self._surface.get_height()
         # Convert image data to string buffer
         pixel_data = pygame.image.tostring(self._surface, "RGBA", True)
+        self.upload_pixels(width, height, pixel_data)
+
+    def upload_pixels(self, width, height, pixel_data):
+        """ Upload RGBA pixel data, with the bottom row first, to GPU """
         # Specify texture used by the following functions
-        GL.glBindTexture(GL.GL_TEXTURE_2D, self._texture_ref)
+        self._bind()
         # Send pixel data to texture buffer
         GL.glTexImage2D(GL.GL_TEXTURE_2D, 0, GL.GL_RGBA, width, height, 0, GL.GL_RGBA, GL.GL_UNSIGNED_BYTE, pixel_data)
         # Generate mipmap image from uploaded pixel data
+        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAX_LEVEL, 1000)
         GL.glGenerateMipmap(GL.GL_TEXTURE_2D)
+        self._set_parameters()
+        # The mipmap chain adds a third to the size of the image
+        self._set_memory_size(width * height * 4 * 4 // 3)
+
+    def upload_mipmaps(self, level_list, internal_format=GL.GL_RGBA):
+        """
+        Upload an image together with its precomputed mipmap levels, given as
+        (height, width, 4) uint8 arrays with the bottom row first; a compressed
+        internal format makes the driver compress them
+        """
+        self._bind()
+        for level, pixels in enumerate(level_list):
+            height, width = pixels.shape[0:2]
+            GL.glTexImage2D(GL.GL_TEXTURE_2D, level, internal_format, width, height, 0,
+                            GL.GL_RGBA, GL.GL_UNSIGNED_BYTE, pixels)
+        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAX_LEVEL, len(level_list) - 1)
+        self._set_parameters()
+        if internal_format == GL.GL_RGBA:
+            self._set_memory_size(sum(pixels.nbytes for pixels in level_list))
+        else:
+            self._set_memory_size(sum(
+                int(GL.glGetTexLevelParameteriv(GL.GL_TEXTURE_2D, level, GL.GL_TEXTURE_COMPRESSED_IMAGE_SIZE))
+                for level in range(len(level_list))))
+
+    def upload_compressed_mipmaps(self, level_list, internal_format):
+        """ Upload mipmap levels already compressed in a GPU format, given as (width, height, data) """
+        self._bind()
+        for level, (width, height, data) in enumerate(level_list):
+            GL.glCompressedTexImage2D(GL.GL_TEXTURE_2D, level, internal_format, width, height, 0, data)
+        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAX_LEVEL, len(level_list) - 1)
+        self._set_parameters()
+        self._set_memory_size(sum(len(data) for _, _, data in level_list))
+
+    def read_compressed_mipmaps(self):
+        """ Return the levels of a texture stored in a compressed format, as (width, height, data) """
+        self._bind()
+        max_level = GL.glGetTexParameteriv(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAX_LEVEL)
+        level_list = []
+        for level in range(int(max_level) + 1):
+            width = int(GL.glGetTexLevelParameteriv(GL.GL_TEXTURE_2D, level, GL.GL_TEXTURE_WIDTH))
+            height = int(GL.glGetTexLevelParameteriv(GL.GL_TEXTURE_2D, level, GL.GL_TEXTURE_HEIGHT))
+            size = int(GL.glGetTexLevelParameteriv(GL.GL_TEXTURE_2D, level, GL.GL_TEXTURE_COMPRESSED_IMAGE_SIZE))
+            data = np.empty(size, dtype=np.uint8)
+            # The PyOpenGL wrapper of this function always reads level 0
+            GL_1_3.glGetCompressedTexImage(GL.GL_TEXTURE_2D, level, data)
+            level_list.append((width, height, data))
+        return level_list
+
+    def release(self):
+        """ Delete the texture from the GPU """
+        if self._texture_ref is not None:
+            GL.glDeleteTextures([self._texture_ref])
+            ResourceTracker.untrack("texture", self._texture_ref)
+            self._texture_ref = None
+            self._memory_size = 0
+
+    def _set_memory_size(self, size):
+        self._memory_size = size
+        ResourceTracker.resize("texture", self._texture_ref, size)
+
+    def _bind(self):
+        GL.glBindTexture(GL.GL_TEXTURE_2D, self._texture_ref)
+        # The binding of the active texture unit changed behind the uniforms' back
+        Uniform.forget_texture_bindings()
+
+    def _set_parameters(self):
         # Specify technique for magnifying/minifying textures
         GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAG_FILTER, self._property_dict["magFilter"])
         GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER, self._property_dict["minFilter"])
@@ -66,4 +149,4 @@ class Texture:
         GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_WRAP_S, self._property_dict["wrap"])
         GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_WRAP_T, self._property_dict["wrap"])
         # Set default border color to white; important for rendering shadows
-        GL.glTexParameterfv(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_BORDER_COLOR, [1, 1, 1, 1])
\ No newline at end of file
+        GL.glTexParameterfv(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_BORDER_COLOR, [1, 1, 1, 1])
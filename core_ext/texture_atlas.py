@@ -0,0 +1,182 @@
+import math
+
+import OpenGL.GL as GL
+import numpy as np
+import pygame
+
+from core_ext.texture import Texture
+from geometry.geometry import Geometry
+
+
+def pack_rectangles(size_list, width, max_height):
+    """
+    Place rectangles of the given (width, height) sizes in rows ("shelves")
+    of an image of the given width, tallest first.
+    Return the height used and the top-left corner of each rectangle,
+    None for the rectangles that do not fit within max_height.
+    """
+    position_list = [None] * len(size_list)
+    shelf_x = shelf_y = shelf_height = 0
+    for index in sorted(range(len(size_list)), key=lambda i: (-size_list[i][1], -size_list[i][0])):
+        rect_width, rect_height = size_list[index]
+        if rect_width > width:
+            continue
+        if shelf_x + rect_width > width:
+            # Start a new shelf below the current one
+            shelf_y += shelf_height
+            shelf_x = shelf_height = 0
+        if shelf_y + rect_height > max_height:
+            continue
+        position_list[index] = (shelf_x, shelf_y)
+        shelf_x += rect_width
+        shelf_height = max(shelf_height, rect_height)
+    return shelf_y + shelf_height, position_list
+
+
+class TextureAtlas(Texture):
+    """
+    One texture holding several images side by side, so that meshes using
+    different images can share a single bound texture (and a single material).
+    Texture coordinates of the meshes are remapped to the region of their image
+    with remap_uv or remap_geometry; they must stay within [0, 1], since the
+    region of an image cannot repeat.
+    """
+    def __init__(self, file_name_list, max_size=4096, max_image_size=1024, padding=4, property_dict=None):
+        # Images must not be repeated outside their regions
+        properties = {"wrap": GL.GL_CLAMP_TO_EDGE}
+        properties.update(property_dict or {})
+        super().__init__(None, properties)
+        # file name -> (x, y, width, height) of the image in the atlas, in pixels from the top left
+        self._region_dict = {}
+        # Images are shrunk so that, with their padding, they fit max_image_size
+        image_list = [self._load_scaled(file_name, max_image_size - 2 * padding) for file_name in file_name_list]
+        # The padding around each image repeats its border, so that filtering
+        # and the smaller mipmap levels do not mix neighbouring images
+        size_list = [(image.get_width() + 2 * padding, image.get_height() + 2 * padding) for image in image_list]
+        width, height, position_list = self._choose_layout(size_list, max_size)
+        if None in position_list:
+            missing = [file_name for file_name, position in zip(file_name_list, position_list) if position is None]
+            raise ValueError(f"Images do not fit in a {max_size}x{max_size} atlas: {missing}")
+        self._surface = pygame.Surface((width, height), pygame.SRCALPHA)
+        for file_name, image, (x, y) in zip(file_name_list, image_list, position_list):
+            self._blit_padded(image, x + padding, y + padding, padding)
+            self._region_dict[file_name] = (x + padding, y + padding, image.get_width(), image.get_height())
+        self.upload_data()
+
+    @staticmethod
+    def _load_scaled(file_name, max_image_size):
+        """ Load an image, shrinking it to fit max_image_size while keeping its proportions """
+        loaded = pygame.image.load(file_name)
+        image = pygame.Surface(loaded.get_size(), pygame.SRCALPHA)
+        image.blit(loaded, (0, 0))
+        scale = max_image_size / max(image.get_size())
+        if scale < 1:
+            size = (max(1, round(image.get_width() * scale)), max(1, round(image.get_height() * scale)))
+            image = pygame.transform.smoothscale(image, size)
+        return image
+
+    @staticmethod
+    def _choose_layout(size_list, max_size):
+        """ Try widths from small to max_size and keep the layout of smallest area """
+        best = None
+        total_area = sum(width * height for width, height in size_list)
+        width = 2 ** math.ceil(math.log2(max(max(width for width, _ in size_list), math.sqrt(total_area))))
+        while width <= max_size:
+            height, position_list = pack_rectangles(size_list, width, max_size)
+            if None not in position_list and (best is None or width * height < best[0] * best[1]):
+                best = (width, height, position_list)
+            width *= 2
+        if best is None:
+            return (max_size,) + pack_rectangles(size_list, max_size, max_size)
+        return best
+
+    def _blit_padded(self, image, x, y, padding):
+        """ Copy an image to the atlas, extending its border pixels over the padding """
+        width, height = image.get_size()
+        self._surface.blit(image, (x, y))
+        if padding == 0:
+            return
+        edge_list = [((0, 0, 1, height), (padding, height), (x - padding, y)),
+                     ((width - 1, 0, 1, height), (padding, height), (x + width, y)),
+                     ((0, 0, width, 1), (width, padding), (x, y - padding)),
+                     ((0, height - 1, width, 1), (width, padding), (x, y + height))]
+        for edge_rect, stretched_size, corner in edge_list:
+            self._surface.blit(pygame.transform.scale(image.subsurface(edge_rect), stretched_size), corner)
+        corner_list = [((0, 0), (x - padding, y - padding)),
+                       ((width - 1, 0), (x + width, y - padding)),
+                       ((0, height - 1), (x - padding, y + height)),
+                       ((width - 1, height - 1), (x + width, y + height))]
+        for pixel, corner in corner_list:
+            self._surface.fill(image.get_at(pixel), (corner[0], corner[1], padding, padding))
+
+    @property
+    def file_name_list(self):
+        return list(self._region_dict)
+
+    @property
+    def occupancy(self):
+        """ Fraction of the atlas area covered by images """
+        used_area = sum(width * height for _, _, width, height in self._region_dict.values())
+        return used_area / (self._surface.get_width() * self._surface.get_height())
+
+    def uv_transform(self, file_name):
+        """ Return the scale and offset mapping texture coordinates of an image to the atlas """
+        x, y, width, height = self._region_dict[file_name]
+        atlas_width, atlas_height = self._surface.get_size()
+        # Pixel rows are uploaded bottom to top, so v is measured from the bottom of the atlas
+        scale = np.array([width / atlas_width, height / atlas_height])
+        offset = np.array([x / atlas_width, (atlas_height - y - height) / atlas_height])
+        return scale, offset
+
+    def remap_uv(self, uv_data, file_name):
+        """ Return the (N, 2) texture coordinates of an image converted to atlas coordinates """
+        uv_data = np.asarray(uv_data, dtype=float)
+        if len(uv_data) and (uv_data.min() < -1e-3 or uv_data.max() > 1 + 1e-3):
+            raise ValueError(f"Texture coordinates outside [0, 1] cannot use the atlas region of {file_name}")
+        scale, offset = self.uv_transform(file_name)
+        return uv_data * scale + offset
+
+    def remap_geometry(self, geometry, file_name):
+        """ Return a copy of the geometry whose texture coordinates read the image from the atlas """
+        atlas_geometry = Geometry()
+        for variable_name, attribute in geometry.attribute_dict.items():
+            if variable_name == "vertexUV":
+                data = self.remap_uv(attribute.data, file_name)
+            else:
+                data = attribute.data.copy()
+            atlas_geometry.add_attribute(attribute.data_type, variable_name, data)
+        if geometry.index is not None:
+            atlas_geometry.set_index(np.array(geometry.index.data))
+        return atlas_geometry
+
+    def report(self):
+        """ Return a text summary of the atlas size and use """
+        width, height = self._surface.get_size()
+        return (f"atlas {width}x{height}: {len(self._region_dict)} images, "
+                f"{self.occupancy:.0%} occupied, {width * height * 4 / 2 ** 20:.1f} MB")
+
+    @staticmethod
+    def build_atlases(file_name_list, max_size=4096, max_image_size=1024, padding=4, property_dict=None):
+        """
+        Pack the images into as few atlases as needed; return the list of atlases
+        and a dictionary with the atlas holding each image
+        """
+        atlas_list = []
+        remaining = list(dict.fromkeys(file_name_list))
+        # Sizes only need to be known to split the images between atlases
+        size_dict = {}
+        for file_name in remaining:
+            width, height = pygame.image.load(file_name).get_size()
+            scale = min(1, (max_image_size - 2 * padding) / max(width, height))
+            size_dict[file_name] = (max(1, round(width * scale)) + 2 * padding,
+                                    max(1, round(height * scale)) + 2 * padding)
+        while remaining:
+            _, position_list = pack_rectangles([size_dict[file_name] for file_name in remaining],
+                                               max_size, max_size)
+            fitting = [file_name for file_name, position in zip(remaining, position_list) if position is not None]
+            if not fitting:
+                raise ValueError(f"Image larger than the {max_size}x{max_size} atlas: {remaining[0]}")
+            atlas_list.append(TextureAtlas(fitting, max_size, max_image_size, padding, property_dict))
+            remaining = [file_name for file_name in remaining if file_name not in fitting]
+        atlas_dict = {file_name: atlas for atlas in atlas_list for file_name in atlas.file_name_list}
+        return atlas_list, atlas_dict
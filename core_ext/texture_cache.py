@@ -0,0 +1,214 @@
+"""Cache of downscaled textures with precomputed mipmap levels"""
+import hashlib
+import os
+import time
+
+import OpenGL.GL as GL
+import numpy as np
+import pygame
+
+from core_ext.texture import Texture
+
+# Cached textures are stored next to their source file, in this folder
+CACHE_DIR_NAME = "__texcache__"
+# Bump when the layout of the cached arrays changes
+CACHE_VERSION = 1
+# Largest width or height of the textures of each quality tier (None keeps the size of the image)
+QUALITY_TIERS = {"low": 256, "medium": 512, "high": 1024, "full": None}
+# S3TC (DXT5) compression, 1 byte per pixel instead of 4
+COMPRESSED_RGBA_S3TC_DXT5 = 0x83F3
+COMPRESSION_EXTENSION = "GL_EXT_texture_compression_s3tc"
+
+
+def source_hash(file_name):
+    """Identify the contents of an image file"""
+    with open(file_name, 'rb') as in_file:
+        return hashlib.sha1(in_file.read()).hexdigest()
+
+
+def cache_path(file_name, quality, compressed=False):
+    """Return the path of the cache file of an image for a quality tier"""
+    directory, base_name = os.path.split(os.path.abspath(file_name))
+    suffix = ".dxt5.npz" if compressed else ".npz"
+    return os.path.join(directory, CACHE_DIR_NAME, f"{base_name}.{quality}{suffix}")
+
+
+def load_pixels(file_name, max_size=None):
+    """
+    Load an image as a (height, width, 4) uint8 array with the bottom row first,
+    shrunk to fit max_size while keeping its proportions
+    """
+    surface = pygame.image.load(file_name)
+    if max_size is not None and max(surface.get_size()) > max_size:
+        scale = max_size / max(surface.get_size())
+        size = (max(1, round(surface.get_width() * scale)), max(1, round(surface.get_height() * scale)))
+        # smoothscale needs 32 bit pixels
+        image = pygame.Surface(surface.get_size(), pygame.SRCALPHA)
+        image.blit(surface, (0, 0))
+        surface = pygame.transform.smoothscale(image, size)
+    pixel_data = pygame.image.tostring(surface, "RGBA", True)
+    return np.frombuffer(pixel_data, dtype=np.uint8).reshape(surface.get_height(), surface.get_width(), 4)
+
+
+def build_mipmaps(pixels):
+    """
+    Return the mipmap chain of an image, from the image itself down to 1x1.
+    Each level halves the size (rounding down, as OpenGL expects) by
+    averaging blocks of 2x2 pixels, like glGenerateMipmap.
+    """
+    level_list = [pixels]
+    while pixels.shape[0] > 1 or pixels.shape[1] > 1:
+        height, width = pixels.shape[0:2]
+        step_y = 2 if height > 1 else 1
+        step_x = 2 if width > 1 else 1
+        new_height, new_width = height // step_y, width // step_x
+        blocks = pixels[:new_height * step_y, :new_width * step_x].reshape(new_height, step_y, new_width, step_x, 4)
+        pixels = (blocks.mean(axis=(1, 3)) + 0.5).astype(np.uint8)
+        level_list.append(pixels)
+    return level_list
+
+
+def _load_cache(path, key):
+    """Return the cached levels as (width, height, data), or None if the cache is missing or stale"""
+    if not os.path.isfile(path):
+        return None
+    try:
+        with np.load(path) as cached:
+            if str(cached["key"]) != key:
+                return None
+            sizes = cached["sizes"]
+            return [(int(width), int(height), cached[f"level{level}"])
+                    for level, (width, height) in enumerate(sizes)]
+    except (OSError, ValueError, KeyError):
+        # Corrupted or truncated cache file; it will be regenerated
+        return None
+
+
+def _save_cache(path, key, level_list):
+    """Store the levels in the cache; failing to write the cache is not an error"""
+    temp_path = path + ".tmp"
+    arrays = {f"level{level}": np.asarray(data) for level, (_, _, data) in enumerate(level_list)}
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(temp_path, 'wb') as out_file:
+            np.savez(out_file, key=np.array(key),
+                     sizes=np.array([(width, height) for width, height, _ in level_list], dtype=np.int64),
+                     **arrays)
+        # Replace atomically so a concurrent reader never sees half a file
+        os.replace(temp_path, path)
+    except OSError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+class TextureCache:
+    """
+    Creates textures from image files through a disk cache of their mipmap
+    levels, downscaled to the largest size of a quality tier. The first load of
+    an image builds the levels and stores them; later loads read them back,
+    skipping the image decoding, the resizing and glGenerateMipmap.
+    With compress=True, and when the GPU supports S3TC, the levels are stored
+    and uploaded in the DXT5 compressed format, which takes a quarter of the memory.
+    Cache entries are keyed by a hash of the image file, so edited images are rebuilt.
+    """
+    def __init__(self, quality="high", compress=False, use_cache=True):
+        if quality not in QUALITY_TIERS:
+            raise ValueError(f"Unknown texture quality: {quality}")
+        self._quality = quality
+        self._compress = compress
+        self._use_cache = use_cache
+        # Known after a GL context exists; checked on the first upload
+        self._compression_supported = None
+        # Number of loads served from the cache and built from the image
+        self._stats = {"hits": 0, "misses": 0}
+
+    @property
+    def quality(self):
+        return self._quality
+
+    @property
+    def stats(self):
+        return self._stats
+
+    def _key(self, file_name):
+        return f"{CACHE_VERSION}:{self._quality}:{source_hash(file_name)}"
+
+    def prepare(self, file_name):
+        """
+        Read or build the levels of an image without OpenGL calls, so that it can run
+        on a worker thread; return the data to pass to upload()
+        """
+        key = self._key(file_name) if self._use_cache else None
+        if self._use_cache and self._compress:
+            cached = _load_cache(cache_path(file_name, self._quality, compressed=True), key)
+            if cached is not None:
+                return "compressed", cached, key
+        if self._use_cache:
+            cached = _load_cache(cache_path(file_name, self._quality), key)
+            if cached is not None:
+                return "rgba", [data for _, _, data in cached], key
+        level_list = build_mipmaps(load_pixels(file_name, QUALITY_TIERS[self._quality]))
+        if self._use_cache:
+            _save_cache(cache_path(file_name, self._quality), key,
+                        [(pixels.shape[1], pixels.shape[0], pixels) for pixels in level_list])
+        return "built", level_list, key
+
+    def upload(self, texture, file_name, prepared):
+        """ Upload the data returned by prepare() to a texture; must run on the GL thread """
+        kind, level_list, key = prepared
+        self._stats["misses" if kind == "built" else "hits"] += 1
+        if kind == "compressed":
+            texture.upload_compressed_mipmaps(level_list, COMPRESSED_RGBA_S3TC_DXT5)
+        elif self._compress and self._supports_compression():
+            # The driver compresses the levels once; the result is kept for the next runs
+            texture.upload_mipmaps(level_list, COMPRESSED_RGBA_S3TC_DXT5)
+            if self._use_cache:
+                _save_cache(cache_path(file_name, self._quality, compressed=True), key,
+                            texture.read_compressed_mipmaps())
+        else:
+            texture.upload_mipmaps(level_list)
+
+    def load(self, file_name, property_dict=None):
+        """ Return a texture of an image file, using the cache """
+        texture = Texture(None, property_dict)
+        self.upload(texture, file_name, self.prepare(file_name))
+        return texture
+
+    def _supports_compression(self):
+        if self._compression_supported is None:
+            extension_count = GL.glGetIntegerv(GL.GL_NUM_EXTENSIONS)
+            self._compression_supported = any(
+                GL.glGetStringi(GL.GL_EXTENSIONS, index).decode() == COMPRESSION_EXTENSION
+                for index in range(extension_count))
+        return self._compression_supported
+
+
+def benchmark(directory="images", quality="high"):
+    """
+    Compare, for every image of a folder, decoding the full image with
+    the size of its mipmapped texture against reading the cached levels
+    """
+    cache = TextureCache(quality)
+    print(f"{'file':<24}{'decode (ms)':>12}{'cached (ms)':>12}{'full (MB)':>11}{quality + ' (MB)':>11}")
+    totals = np.zeros(4)
+    for name in sorted(os.listdir(directory)):
+        if not name.lower().endswith((".png", ".jpg", ".jpeg")):
+            continue
+        file_name = os.path.join(directory, name)
+        start = time.perf_counter()
+        pixels = load_pixels(file_name)
+        decode_time = time.perf_counter() - start
+        # The first call fills the cache, the second one reads it
+        cache.prepare(file_name)
+        start = time.perf_counter()
+        _, level_list, _ = cache.prepare(file_name)
+        cached_time = time.perf_counter() - start
+        full_size = pixels.nbytes * 4 / 3 / 2 ** 20
+        cached_size = sum(data.nbytes for data in level_list) / 2 ** 20
+        totals += [decode_time, cached_time, full_size, cached_size]
+        print(f"{name:<24}{decode_time * 1000:>12.1f}{cached_time * 1000:>12.1f}{full_size:>11.1f}{cached_size:>11.1f}")
+    print(f"{'total':<24}{totals[0] * 1000:>12.1f}{totals[1] * 1000:>12.1f}{totals[2]:>11.1f}{totals[3]:>11.1f}")
+
+
+if __name__ == '__main__':
+    benchmark()
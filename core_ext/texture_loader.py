@@ -0,0 +1,98 @@
+import concurrent.futures
+import os
+import time
+
+import pygame
+
+from core_ext.texture import Texture
+
+
+def decode_image(file_name):
+    """ Load an image file and convert it to RGBA rows, bottom row first; runs on a worker thread """
+    surface = pygame.image.load(file_name)
+    return surface, pygame.image.tostring(surface, "RGBA", True)
+
+
+class TextureLoader:
+    """
+    Loads textures in the background. load() returns at once a texture showing
+    a placeholder color, and a pool of worker threads decodes the image file.
+    OpenGL calls must stay on the thread that owns the context, so the decoded
+    images are uploaded by update(), which the application calls once per frame.
+    The texture reference never changes, so materials keep using the same texture.
+    With a TextureCache, the workers read or build the cached mipmap levels instead.
+    """
+    def __init__(self, max_workers=None, placeholder_color=(128, 128, 128, 255), cache=None):
+        if max_workers is None:
+            # Leave one processor to the thread that renders
+            max_workers = max(1, (os.cpu_count() or 2) - 1)
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers,
+                                                               thread_name_prefix="texture-loader")
+        self._placeholder = pygame.Surface((1, 1), pygame.SRCALPHA)
+        self._placeholder.fill(placeholder_color)
+        self._cache = cache
+        # [texture, file name, future of the decoded image], in order of request
+        self._pending_list = []
+        self._stats = {"requested": 0, "uploaded": 0}
+
+    @property
+    def pending_count(self):
+        """ Number of textures still showing the placeholder """
+        return len(self._pending_list)
+
+    @property
+    def stats(self):
+        return self._stats
+
+    def load(self, file_name, property_dict=None):
+        """ Return a texture of an image file, which is decoded in the background """
+        texture = Texture(None, property_dict)
+        texture.surface = self._placeholder
+        texture.upload_data()
+        if self._cache is not None:
+            future = self._executor.submit(self._cache.prepare, file_name)
+        else:
+            future = self._executor.submit(decode_image, file_name)
+        self._pending_list.append([texture, file_name, future])
+        self._stats["requested"] += 1
+        return texture
+
+    def update(self, time_budget=None):
+        """
+        Upload the images decoded since the last call; must run on the GL thread.
+        With a time budget (seconds), remaining images wait for the next call.
+        Return the number of textures uploaded. Errors of the decoding, such as
+        a missing file, are raised here.
+        """
+        start = time.perf_counter()
+        uploaded = 0
+        while self._pending_list:
+            if time_budget is not None and time.perf_counter() - start > time_budget:
+                break
+            # Look for the first finished image, keeping the request order otherwise
+            entry = next((entry for entry in self._pending_list if entry[2].done()), None)
+            if entry is None:
+                break
+            self._pending_list.remove(entry)
+            texture, file_name, future = entry
+            if self._cache is not None:
+                self._cache.upload(texture, file_name, future.result())
+            else:
+                surface, pixel_data = future.result()
+                texture.surface = surface
+                texture.upload_pixels(surface.get_width(), surface.get_height(), pixel_data)
+            uploaded += 1
+            self._stats["uploaded"] += 1
+        return uploaded
+
+    def wait(self):
+        """ Block until every requested texture is decoded and uploaded """
+        while self._pending_list:
+            concurrent.futures.wait([entry[2] for entry in self._pending_list],
+                                    return_when=concurrent.futures.FIRST_COMPLETED)
+            self.update()
+
+    def shutdown(self):
+        """ Stop the worker threads; images still pending are not uploaded """
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._pending_list = []
@@ -0,0 +1,82 @@
+import json
+import math
+
+import numpy as np
+
+
+class CameraPath:
+    """
+    Keyframes of a camera position and of the point it looks at, over time.
+    Paths are recorded while playing (record() once per frame) or generated,
+    saved as JSON and replayed with apply(), interpolating between keyframes,
+    so that benchmarks see the same views on every run.
+    """
+    def __init__(self, keyframe_list=None):
+        # [time, position, target] with time in seconds, increasing
+        self._keyframe_list = list(keyframe_list or [])
+
+    @property
+    def keyframe_list(self):
+        return self._keyframe_list
+
+    @property
+    def duration(self):
+        return self._keyframe_list[-1][0] if self._keyframe_list else 0.0
+
+    def add_keyframe(self, time, position, target):
+        if self._keyframe_list and time <= self._keyframe_list[-1][0]:
+            raise ValueError("Keyframes must be added in order of time")
+        self._keyframe_list.append([float(time), [float(x) for x in position], [float(x) for x in target]])
+
+    def record(self, camera, time, distance=1.0):
+        """ Add the current view of a camera: its position and a point in front of it """
+        # Frames where no time has passed add nothing
+        if self._keyframe_list and time <= self._keyframe_list[-1][0]:
+            return
+        matrix = camera.global_matrix
+        position = matrix[0:3, 3]
+        # Cameras look down their local -z axis
+        forward = -matrix[0:3, 2] / np.linalg.norm(matrix[0:3, 2])
+        self.add_keyframe(time, position, position + forward * distance)
+
+    def sample(self, time):
+        """ Return the interpolated position and target at a time, clamped to the path """
+        if not self._keyframe_list:
+            raise ValueError("The camera path has no keyframes")
+        time_list = [keyframe[0] for keyframe in self._keyframe_list]
+        time = min(max(time, time_list[0]), time_list[-1])
+        index = max(1, int(np.searchsorted(time_list, time, side="right")))
+        if index >= len(time_list):
+            _, position, target = self._keyframe_list[-1]
+            return np.array(position), np.array(target)
+        (time0, position0, target0), (time1, position1, target1) = self._keyframe_list[index - 1:index + 1]
+        weight = (time - time0) / (time1 - time0)
+        position = (1 - weight) * np.array(position0) + weight * np.array(position1)
+        target = (1 - weight) * np.array(target0) + weight * np.array(target1)
+        return position, target
+
+    def apply(self, camera, time):
+        """ Move a camera, attached to the scene itself, to the view of the path at a time """
+        position, target = self.sample(time)
+        camera.set_position(position)
+        camera.look_at(target)
+
+    def save(self, file_name):
+        with open(file_name, "w") as out_file:
+            json.dump({"keyframes": self._keyframe_list}, out_file, indent=1)
+
+    @staticmethod
+    def load(file_name):
+        with open(file_name) as in_file:
+            return CameraPath(json.load(in_file)["keyframes"])
+
+    @staticmethod
+    def orbit(center=(0, 0, 0), radius=10.0, height=5.0, duration=10.0, keyframe_count=64, turns=1.0):
+        """ Generate a path circling around a point while looking at it """
+        path = CameraPath()
+        for index in range(keyframe_count + 1):
+            fraction = index / keyframe_count
+            angle = 2 * math.pi * turns * fraction
+            position = [center[0] + radius * math.cos(angle), center[1] + height, center[2] + radius * math.sin(angle)]
+            path.add_keyframe(duration * fraction, position, center)
+        return path
@@ -10,6 +10,6 @@ class DirectionalLightHelper(GridHelper):
             grid_color=color,
             center_color=color
         )
-        self.geometry.attribute_dict["vertexPosition"].data.extend([[0, 0, 0], [0, 0, -10]])
-        self.geometry.attribute_dict["vertexColor"].data.extend([color, color])
+        self.geometry.attribute_dict["vertexPosition"].extend([[0, 0, 0], [0, 0, -10]])
+        self.geometry.attribute_dict["vertexColor"].extend([color, color])
         self.geometry.upload_data(["vertexPosition", "vertexColor"])
@@ -0,0 +1,74 @@
+import OpenGL.GL as GL
+import pygame
+
+from core_ext.texture import Texture
+from core_ext.texture_atlas import pack_rectangles
+
+# Printable ASCII and the accented letters of Portuguese
+DEFAULT_CHARACTERS = (''.join(chr(code) for code in range(32, 127))
+                      + "áàâãéêíóôõúüçÁÀÂÃÉÊÍÓÔÕÚÜÇºª")
+
+
+class GlyphAtlas(Texture):
+    """
+    Texture with every character of a font rendered once, in white, so that
+    text can be drawn as one quad per character in any color (the material
+    base color) without rendering the font again.
+    Atlases are shared: use GlyphAtlas.get() to obtain the atlas of a font.
+    """
+    # (font name, font file, size, characters) -> atlas
+    _atlas_dict = {}
+
+    def __init__(self, system_font_name="Arial", font_size=24, font_file_name=None,
+                 characters=DEFAULT_CHARACTERS, width=512, padding=2):
+        # Glyphs must not be repeated outside their regions
+        super().__init__(None, {"wrap": GL.GL_CLAMP_TO_EDGE})
+        if not pygame.font.get_init():
+            pygame.font.init()
+        if font_file_name is not None:
+            font = pygame.font.Font(font_file_name, font_size)
+        else:
+            font = pygame.font.SysFont(system_font_name, font_size)
+        # Height in pixels of a line of text
+        self._line_height = font.get_height()
+        # Unknown characters are drawn as this one
+        self._fallback = "?" if "?" in characters else characters[0]
+        characters = list(dict.fromkeys(characters))
+        glyph_list = [font.render(character, True, (255, 255, 255)) for character in characters]
+        size_list = [(glyph.get_width() + 2 * padding, glyph.get_height() + 2 * padding) for glyph in glyph_list]
+        height, position_list = pack_rectangles(size_list, width, 8192)
+        if None in position_list:
+            raise ValueError(f"Characters of {system_font_name} {font_size} do not fit in the glyph atlas")
+        self._surface = pygame.Surface((width, height), pygame.SRCALPHA)
+        # character -> (u0, v0, u1, v1, width in pixels, height in pixels)
+        self._glyph_dict = {}
+        for character, glyph, (x, y) in zip(characters, glyph_list, position_list):
+            self._surface.blit(glyph, (x + padding, y + padding))
+            glyph_width, glyph_height = glyph.get_size()
+            # Pixel rows are uploaded bottom to top, so v is measured from the bottom of the atlas
+            self._glyph_dict[character] = ((x + padding) / width,
+                                           (height - y - padding - glyph_height) / height,
+                                           (x + padding + glyph_width) / width,
+                                           (height - y - padding) / height,
+                                           glyph_width, glyph_height)
+        self.upload_data()
+
+    @staticmethod
+    def get(system_font_name="Arial", font_size=24, font_file_name=None, characters=DEFAULT_CHARACTERS):
+        """ Return the shared atlas of a font, rendering it on the first request """
+        key = (system_font_name, font_size, font_file_name, characters)
+        if key not in GlyphAtlas._atlas_dict:
+            GlyphAtlas._atlas_dict[key] = GlyphAtlas(system_font_name, font_size, font_file_name, characters)
+        return GlyphAtlas._atlas_dict[key]
+
+    @property
+    def line_height(self):
+        return self._line_height
+
+    def glyph(self, character):
+        """ Return the texture region (u0, v0, u1, v1) and the pixel size (width, height) of a character """
+        return self._glyph_dict.get(character, self._glyph_dict[self._fallback])
+
+    def text_size(self, text):
+        """ Width and height in pixels of a line of text """
+        return sum(self.glyph(character)[4] for character in text), self._line_height
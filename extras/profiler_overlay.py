@@ -0,0 +1,63 @@
+import time
+
+from core_ext.camera import Camera
+from core_ext.scene import Scene
+from extras.text_mesh import TextMesh
+
+
+class ProfilerOverlay:
+    """
+    Draws the statistics of a profiler over the rendered image: the frame
+    time percentiles, the slowest parts and the draw calls of the renderer.
+    The text is refreshed a few times per second; between refreshes the
+    lines are unchanged and cost only their draw calls.
+    """
+    def __init__(self, profiler, window_size, line_count=12, font_size=16,
+                 font_color=(255, 255, 0), refresh_interval=0.25):
+        self._profiler = profiler
+        self._line_count = line_count
+        self._refresh_interval = refresh_interval
+        self._last_refresh = 0.0
+        width, height = window_size
+        # One unit per pixel, with the origin at the bottom left of the window
+        self._camera = Camera()
+        self._camera.set_orthographic(0, width, 0, height, -1, 1)
+        self._scene = Scene()
+        self._line_list = []
+        for line in range(line_count):
+            text_mesh = TextMesh(system_font_name="Consolas", font_size=font_size, font_color=font_color,
+                                 pixel_size=1, position=(8, height - 8 - line * (font_size + 4)),
+                                 alignment=(0, 1), max_length=48)
+            self._scene.add(text_mesh)
+            self._line_list.append(text_mesh)
+
+    def update(self, render_stats=None):
+        """ Rewrite the lines with the latest statistics, at most once per refresh interval """
+        now = time.perf_counter()
+        if now - self._last_refresh < self._refresh_interval:
+            return
+        self._last_refresh = now
+        summary = self._profiler.summary()
+        frame = summary["frame"]
+        text_list = [f"frame p50 {frame['p50']:5.1f} p95 {frame['p95']:5.1f} p99 {frame['p99']:5.1f} ms"]
+        if render_stats:
+            text_list.append(f"draw calls {render_stats.get('draw_calls', 0)}, "
+                             f"meshes {render_stats.get('drawn', 0)}, culled {render_stats.get('culled', 0)}")
+        # Slowest parts first
+        part_list = sorted(((name, stats) for name, stats in summary.items() if name != "frame" and stats["count"]),
+                           key=lambda item: -item[1]["p50"])
+        for name, stats in part_list:
+            text_list.append(f"{name[:20]:<20} {stats['p50']:6.2f} {stats['p95']:6.2f}")
+        for text_mesh, text in zip(self._line_list, text_list + [""] * self._line_count):
+            text_mesh.set_text(text)
+
+    def render(self, renderer, render_target=None):
+        """
+        Draw the lines over the image already in the window or render target;
+        the overlay is not timed and the render statistics of the scene are kept
+        """
+        renderer.render(self._scene, self._camera, clear_color=False, render_target=render_target, measure=False)
+
+    def release(self):
+        for text_mesh in self._line_list:
+            text_mesh.release()
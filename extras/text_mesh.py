@@ -0,0 +1,106 @@
+import OpenGL.GL as GL
+import numpy as np
+
+from core_ext.mesh import Mesh
+from extras.glyph_atlas import GlyphAtlas
+from geometry.geometry import Geometry
+from material.texture import TextureMaterial
+
+# Corners of each character quad, in the order of RectangleGeometry:
+# triangles p0-p1-p3 and p0-p3-p2, with p0 bottom left and p3 top right
+_CORNER_X = np.array([0, 1, 1, 0, 1, 0])
+_CORNER_Y = np.array([0, 0, 1, 0, 1, 1])
+
+
+class TextGeometry(Geometry):
+    """
+    One quad per character, read from a glyph atlas. The buffers have room for
+    a number of characters and are rewritten in place when the text changes;
+    only the quads of the current text are drawn.
+    """
+    def __init__(self, atlas, text="", pixel_size=0.01, position=(0, 0), alignment=(0, 0), max_length=16):
+        super().__init__()
+        self._atlas = atlas
+        # Size in world units of one pixel of the font
+        self._pixel_size = pixel_size
+        self._position = position
+        self._alignment = alignment
+        self._capacity = max(1, max_length)
+        self.add_attribute("vec3", "vertexPosition", np.zeros((6 * self._capacity, 3)), GL.GL_DYNAMIC_DRAW)
+        self.add_attribute("vec2", "vertexUV", np.zeros((6 * self._capacity, 2)), GL.GL_DYNAMIC_DRAW)
+        self._text = None
+        self.set_text(text)
+
+    @property
+    def text(self):
+        return self._text
+
+    def set_text(self, text):
+        """ Rewrite the quads for a new text; return False, doing nothing, if the text is the same """
+        if text == self._text:
+            return False
+        self._text = text
+        glyphs = np.array([self._atlas.glyph(character) for character in text], dtype=float).reshape(-1, 6)
+        widths = glyphs[:, 4]
+        heights = glyphs[:, 5]
+        # Characters follow each other on the line by their widths
+        left = np.cumsum(widths) - widths
+        text_width, text_height = widths.sum(), self._atlas.line_height
+        x = self._position[0] + (left[:, None] + _CORNER_X * widths[:, None]
+                                 - self._alignment[0] * text_width) * self._pixel_size
+        y = self._position[1] + (_CORNER_Y * heights[:, None]
+                                 - self._alignment[1] * text_height) * self._pixel_size
+        position_data = np.stack([x, y, np.zeros_like(x)], axis=-1).reshape(-1, 3)
+        u = np.where(_CORNER_X == 1, glyphs[:, 2:3], glyphs[:, 0:1])
+        v = np.where(_CORNER_Y == 1, glyphs[:, 3:4], glyphs[:, 1:2])
+        uv_data = np.stack([u, v], axis=-1).reshape(-1, 2)
+        if len(text) > self._capacity:
+            # Grow the buffers; the dynamic attributes keep room for longer texts
+            self._capacity = max(len(text), 2 * self._capacity)
+            for variable_name, data in (("vertexPosition", position_data), ("vertexUV", uv_data)):
+                attribute = self._attribute_dict[variable_name]
+                attribute.data = np.concatenate([data, np.zeros((6 * self._capacity - len(data), data.shape[1]))])
+                attribute.upload_data()
+        elif len(text):
+            self.update_attribute("vertexPosition", position_data)
+            self.update_attribute("vertexUV", uv_data)
+        # Only the quads of this text are drawn
+        self._vertex_count = len(position_data)
+        if len(position_data):
+            self._bounding_box = (position_data.min(axis=0), position_data.max(axis=0))
+        else:
+            self._bounding_box = (np.zeros(3), np.zeros(3))
+        return True
+
+
+class TextMesh(Mesh):
+    """
+    A line of text drawn from the shared glyph atlas of its font.
+    set_text() only changes the mesh when the text is different, so it can be
+    called every frame; all text meshes share the texture material program.
+    """
+    def __init__(self, text="", system_font_name="Arial", font_size=24, font_file_name=None,
+                 font_color=(0, 0, 0), pixel_size=0.01, position=(0, 0), alignment=(0, 0),
+                 max_length=16, property_dict=None):
+        atlas = GlyphAtlas.get(system_font_name, font_size, font_file_name)
+        geometry = TextGeometry(atlas, text, pixel_size, position, alignment, max_length)
+        properties = {"transparent": True, "baseColor": [channel / 255 for channel in font_color]}
+        properties.update(property_dict or {})
+        material = TextureMaterial(atlas, properties)
+        super().__init__(geometry, material)
+
+    @property
+    def text(self):
+        return self._geometry.text
+
+    def set_text(self, text):
+        """ Show a new text; return whether the mesh changed """
+        if not self._geometry.set_text(text):
+            return False
+        minimum, maximum = self._geometry.bounding_box
+        self._local_bounds = ((minimum + maximum) / 2, (maximum - minimum) / 2)
+        return True
+
+    def release(self, release_geometry=True, release_material=True):
+        """ The geometry and material belong to this mesh; the glyph atlas is shared and kept """
+        super().release(release_geometry, release_material)
@@ -6,7 +6,8 @@ class BikiniGeometry(Geometry):
     def __init__(self):
         super().__init__()
 
-        vertices, texture = my_obj_reader('objetos/bikini.obj')
+        vertices, texture, index = my_obj_reader('objetos/bikini.obj', indexed=True)
 
         self.add_attribute("vec3", "vertexPosition", vertices)
         self.add_attribute("vec2", "vertexUV", texture)
+        self.set_index(index)
@@ -7,8 +7,9 @@ class bolaGeometry(Geometry):
         super().__init__()
 
         # Carregar vértices do arquivo .obj
-        vertices, texture = my_obj_reader('objetos/bola.obj')
+        vertices, texture, index = my_obj_reader('objetos/bola.obj', indexed=True)
 
 
         self.add_attribute("vec3", "vertexPosition", vertices)
         self.add_attribute("vec2", "vertexUV", texture)
+        self.set_index(index)
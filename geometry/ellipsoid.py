@@ -1,5 +1,7 @@
 import math
 
+import numpy as np
+
 from core.matrix import Matrix
 from geometry.parametric import ParametricGeometry
 
@@ -15,11 +17,12 @@ class EllipsoidGeometry(ParametricGeometry):
             # where 0 <= theta < pi, 0 <= phi < 2*pi.
             # Then, u = phi / (2*pi), v = (1 - theta/pi).
             # Then, phi = 2 * pi * u, theta = (1 - v)*pi.
-            phi = 2 * math.pi * u
-            theta = (1 - v) * math.pi
-            return [width / 2 * math.sin(theta) * math.cos(phi),
-                    height / 2 * math.sin(theta) * math.sin(phi),
-                    depth / 2 * math.cos(theta)]
+            # u and v are arrays holding the whole grid.
+            phi = 2 * np.pi * u
+            theta = (1 - v) * np.pi
+            return [width / 2 * np.sin(theta) * np.cos(phi),
+                    height / 2 * np.sin(theta) * np.sin(phi),
+                    depth / 2 * np.cos(theta)]
 
         super().__init__(u_start=0,
                          u_end=1,
@@ -27,7 +30,8 @@ class EllipsoidGeometry(ParametricGeometry):
                          v_start=0,
                          v_end=1,
                          v_resolution=theta_segments,
-                         surface_function=surface_function)
+                         surface_function=surface_function,
+                         vectorized=True)
         # Rotate the ellipsoid around the x-axis on -90 degrees.
         # The vertices and normals will be recalculated.
         self.apply_matrix(Matrix.make_rotation_x(-math.pi/2))
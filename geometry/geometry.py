@@ -1,8 +1,11 @@
+import OpenGL.GL as GL
 import numpy as np
 from core.attribute import Attribute
+from core.index import Index
+from core.resource_tracker import GLResource
 
 
-class Geometry:
+class Geometry(GLResource):
     """ Stores attribute data and the total number of vertices """
     def __init__(self):
         # Store Attribute objects, indexed by name of associated variable in shader.
@@ -10,23 +13,60 @@ class Geometry:
         self._attribute_dict = {}
         # number of vertices
         self._vertex_count = None
+        # Optional element buffer; when present, meshes are drawn with glDrawElements
+        self._index = None
+        # Box containing every vertex position, computed when first needed
+        self._bounding_box = None
 
     @property
     def attribute_dict(self):
         return self._attribute_dict
 
+    @property
+    def index(self):
+        return self._index
+
     @property
     def vertex_count(self):
         return self._vertex_count
 
-    def add_attribute(self, data_type, variable_name, data):
-        attribute = Attribute(data_type, data)
+    @property
+    def bounding_box(self):
+        """ Return the minimum and maximum corners of the axis-aligned box containing the vertices """
+        if self._bounding_box is None:
+            position = self._attribute_dict["vertexPosition"].data.astype(float)
+            if len(position) == 0:
+                self._bounding_box = (np.zeros(3), np.zeros(3))
+            else:
+                self._bounding_box = (position.min(axis=0), position.max(axis=0))
+        return self._bounding_box
+
+    def add_attribute(self, data_type, variable_name, data, usage=GL.GL_STATIC_DRAW):
+        """ Add an attribute; use usage=GL.GL_DYNAMIC_DRAW for data that changes every frame """
+        attribute = Attribute(data_type, data, usage)
+        # A replaced attribute would keep its buffer on the GPU
+        if variable_name in self._attribute_dict:
+            self._attribute_dict[variable_name].release()
         self._attribute_dict[variable_name] = attribute
         # Update the vertex count
         if variable_name == "vertexPosition":
             # Number of vertices may be calculated from
             # the length of any Attribute object's array of data
             self._vertex_count = len(data)
+            self._bounding_box = None
+
+    def set_index(self, data):
+        """ Make this an indexed geometry; data holds three vertex indices per triangle """
+        if self._index is not None:
+            self._index.release()
+        self._index = Index(data)
+
+    def release(self):
+        """ Delete the GPU buffers of the attributes and indices """
+        for attribute in self._attribute_dict.values():
+            attribute.release()
+        if self._index is not None:
+            self._index.release()
 
     def upload_data(self, variable_names=None):
         if not variable_names:
@@ -38,64 +78,118 @@ class Geometry:
                 # Number of vertices may be calculated from
                 # the length of any Attribute object's array of data
                 self._vertex_count = len(self._attribute_dict[variable_name].data)
+                self._bounding_box = None
+
+    def update_attribute(self, variable_name, data, start=0):
+        """
+        Replace the elements of an attribute from index start on with data
+        and upload only that range; the number of vertices does not change
+        """
+        attribute = self._attribute_dict[variable_name]
+        end = start + len(data)
+        if end > len(attribute.data):
+            raise IndexError(f"Attribute {variable_name} has only {len(attribute.data)} elements")
+        attribute.data[start:end] = data
+        attribute.upload_range(start, end)
+        if variable_name == "vertexPosition":
+            self._bounding_box = None
 
     def apply_matrix(self, matrix):
-        """ Transform the data in an attribute using a matrix """
-        old_position_data = self._attribute_dict["vertexPosition"].data
-        new_position_data = []
-        for old_pos in old_position_data:
-            # Avoid changing list references
-            new_pos = old_pos.copy()
-            # Add the homogeneous fourth coordinate
-            new_pos.append(1)
-            # Multiply by matrix.
-            # No need to transform new_pos to np.array.
-            new_pos = matrix @ new_pos
-            # Remove the homogeneous coordinate
-            new_pos = list(new_pos[0:3])
-            # Add to the new data list
-            new_position_data.append(new_pos)
-        self._attribute_dict["vertexPosition"].data = new_position_data
+        """
+        Transform the positions of the geometry, and its normal vectors if it has them,
+        using a matrix; all the vertices are transformed at once, in place
+        """
+        position_data = self._attribute_dict["vertexPosition"].data
+        position_data[:] = transform_positions(position_data, matrix)
         # New data must be uploaded
         self._attribute_dict["vertexPosition"].upload_data()
-        self._vertex_count = len(new_position_data)
-
-        # Extract the rotation submatrix
-        rotation_matrix = np.array(
-            [matrix[0][0:3],
-             matrix[1][0:3],
-             matrix[2][0:3]]
-        ).astype(float)
-
-        old_vertex_normal_data = self._attribute_dict["vertexNormal"].data
-        new_vertex_normal_data = []
-        for old_normal in old_vertex_normal_data:
-            # Avoid changing list references
-            new_normal = old_normal.copy()
-            new_normal = rotation_matrix @ new_normal
-            new_vertex_normal_data.append(new_normal)
-        self._attribute_dict["vertexNormal"].data = new_vertex_normal_data
-        # New data must be uploaded
-        self._attribute_dict["vertexNormal"].upload_data()
-
-        old_face_normal_data = self._attribute_dict["faceNormal"].data
-        new_face_normal_data = []
-        for old_normal in old_face_normal_data:
-            # Avoid changing list references
-            new_normal = old_normal.copy()
-            new_normal = rotation_matrix @ new_normal
-            new_face_normal_data.append(new_normal)
-        self._attribute_dict["faceNormal"].data = new_face_normal_data
-        # New data must be uploaded
-        self._attribute_dict["faceNormal"].upload_data()
+        self._vertex_count = len(position_data)
+        self._bounding_box = None
+        # OBJ geometries only have positions and texture coordinates
+        for variable_name in ("vertexNormal", "faceNormal"):
+            if variable_name in self._attribute_dict:
+                normal_data = self._attribute_dict[variable_name].data
+                normal_data[:] = transform_normals(normal_data, matrix)
+                self._attribute_dict[variable_name].upload_data()
 
     def merge(self, other_geometry):
         """
         Merge data from attributes of other geometry into this object.
         Requires both geometries to have attributes with same names.
+        Indexed geometries can only be merged with indexed geometries.
         """
+        if self._attribute_dict.keys() != other_geometry.attribute_dict.keys():
+            raise ValueError("Merged geometries must have the same attributes")
+        if (self._index is None) != (other_geometry.index is None):
+            raise ValueError("Indexed geometries can only be merged with indexed geometries")
+        if self._index is not None:
+            # Indices of the other geometry refer to vertices appended after ours
+            offset = self._vertex_count
+            self._index.data = np.concatenate([np.asarray(self._index.data),
+                                               np.asarray(other_geometry.index.data) + offset])
+            self._index.upload_data()
         for variable_name, attribute_instance in self._attribute_dict.items():
-            attribute_instance.data.extend(other_geometry.attribute_dict[variable_name].data)
+            attribute_instance.extend(other_geometry.attribute_dict[variable_name].data)
             # New data must be uploaded
             attribute_instance.upload_data()
+        self._vertex_count = len(self._attribute_dict["vertexPosition"].data)
+        self._bounding_box = None
+
+
+def transform_positions(position_data, matrix):
+    """ Return the (N, 3) positions transformed by a 4x4 matrix """
+    # Same as appending a homogeneous 1 to each position and keeping x, y, z of the product
+    return position_data @ matrix[0:3, 0:3].T + matrix[0:3, 3]
+
+
+def transform_normals(normal_data, matrix):
+    """
+    Return the (N, 3) unit normal vectors transformed by a 4x4 matrix.
+    Normals are multiplied by the inverse transpose of the upper 3x3 block, which
+    keeps them perpendicular to the surface under non-uniform scaling.
+    A block without inverse (a zero scale, e.g. to flatten a shape) is used as it is.
+    """
+    block = matrix[0:3, 0:3]
+    if abs(np.linalg.det(block)) > 1e-12:
+        normal_matrix = np.linalg.inv(block).T
+    else:
+        normal_matrix = block
+    normal_data = normal_data @ normal_matrix.T
+    length = np.linalg.norm(normal_data, axis=1, keepdims=True)
+    # Degenerate (zero) normals stay zero
+    return normal_data / np.where(length > 0, length, 1)
+
+
+def benchmark(filename="objetos/animal.obj", repeat=3):
+    """
+    Time the transform of every vertex of an OBJ model, comparing the original
+    per-vertex loop with the batched array version used by apply_matrix
+    """
+    import time
+    from core.matrix import Matrix
+    from core.obj_reader import my_obj_reader
+
+    position_data, _ = my_obj_reader(filename)
+    matrix = Matrix.make_translation(1, 2, 3) @ Matrix.make_rotation_y(0.5) @ Matrix.make_scale(2)
+    position_list = position_data.tolist()
+    # Best of several runs, to leave out allocator and cache noise
+    loop_time = batched_time = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        loop_result = []
+        for old_pos in position_list:
+            new_pos = old_pos.copy()
+            new_pos.append(1)
+            loop_result.append(list((matrix @ new_pos)[0:3]))
+        loop_time = min(loop_time, time.perf_counter() - start)
+        start = time.perf_counter()
+        batched_result = transform_positions(position_data, matrix)
+        batched_time = min(batched_time, time.perf_counter() - start)
+    same = np.allclose(np.array(loop_result), batched_result, atol=1e-4)
+    print(f"{filename}: {len(position_data)} vertices")
+    print(f"per-vertex loop {loop_time * 1000:10.1f} ms")
+    print(f"batched         {batched_time * 1000:10.1f} ms  ({loop_time / batched_time:.0f}x, same result: {same})")
+
 
+if __name__ == '__main__':
+    benchmark()
@@ -7,8 +7,9 @@ class JetskiGeometry(Geometry):
         super().__init__()
 
         # Carregar vértices do arquivo .obj
-        vertices, texture = my_obj_reader('objetos/JetSki.obj')
+        vertices, texture, index = my_obj_reader('objetos/JetSki.obj', indexed=True)
 
 
         self.add_attribute("vec3", "vertexPosition", vertices)
         self.add_attribute("vec2", "vertexUV", texture)
+        self.set_index(index)
@@ -5,9 +5,10 @@ class OculosGeometry(Geometry):
     def __init__(self):
         super().__init__()
 
-        vertices, texture = my_obj_reader('objetos/oculos.obj')
+        vertices, texture, index = my_obj_reader('objetos/oculos.obj', indexed=True)
 
 
         self.add_attribute("vec3", "vertexPosition", vertices)
         self.add_attribute("vec2", "vertexUV", texture)
+        self.set_index(index)
         #self.count_vertices()
@@ -6,93 +6,93 @@ class ParametricGeometry(Geometry):
     """
     Parametric geometry defined by
     (x, y, z) = surface_function(u, v),
-    where u and v are the parameters
+    where u and v are the parameters.
+    With vectorized=True, surface_function receives two arrays of
+    parameters and returns the arrays [x, y, z], evaluating the whole
+    grid in one call; otherwise it is called once per point.
     """
+    # default vertex colors of the six corners of each grid cell
+    _CELL_COLORS = np.array([[1, 0, 0], [0, 1, 0], [0, 0, 1],
+                             [0, 1, 1], [1, 0, 1], [1, 1, 0]], dtype=np.float32)
+
     def __init__(self,
                  u_start, u_end, u_resolution,
                  v_start, v_end, v_resolution,
-                 surface_function):
+                 surface_function, vectorized=False):
         super().__init__()
-        # Generate set of points on function
+        data = self.tessellate(u_start, u_end, u_resolution,
+                               v_start, v_end, v_resolution,
+                               surface_function, vectorized)
+        self.add_attribute("vec3", "vertexPosition", data["position"])
+        self.add_attribute("vec3", "vertexColor", data["color"])
+        self.add_attribute("vec2", "vertexUV", data["uv"])
+        self.add_attribute("vec3", "vertexNormal", data["vertex_normal"])
+        self.add_attribute("vec3", "faceNormal", data["face_normal"])
+
+    @staticmethod
+    def tessellate(u_start, u_end, u_resolution,
+                   v_start, v_end, v_resolution,
+                   surface_function, vectorized=False):
+        """
+        Return the vertex data of the surface as arrays, two triangles per grid cell:
+        "position", "color", "uv", "vertex_normal" and "face_normal"
+        """
         delta_u = (u_end - u_start) / u_resolution
         delta_v = (v_end - v_start) / v_resolution
+        # Grid of parameters, shape (u_resolution + 1, v_resolution + 1)
+        u, v = np.meshgrid(u_start + np.arange(u_resolution + 1) * delta_u,
+                           v_start + np.arange(v_resolution + 1) * delta_v,
+                           indexing="ij")
+        evaluate = ParametricGeometry._evaluate if vectorized else ParametricGeometry._evaluate_points
+        # Points of the surface, and points slightly ahead in u and in v
+        # to estimate the vertex normals
+        points = evaluate(surface_function, u, v)
+        points_u = evaluate(surface_function, u + delta_u / 1e3, v)
+        points_v = evaluate(surface_function, u, v + delta_v / 1e3)
+        vertex_normals = ParametricGeometry._normals(points, points_u, points_v)
+        uvs = np.stack(np.meshgrid(np.arange(u_resolution + 1) / u_resolution,
+                                   np.arange(v_resolution + 1) / v_resolution,
+                                   indexing="ij"), axis=-1)
+
+        # Corners a, b, c, d of cell (i, j) are the grid points (i, j), (i + 1, j),
+        # (i + 1, j + 1) and (i, j + 1); its triangles are (a, b, c) and (a, c, d).
+        row = v_resolution + 1
+        cell_start = (np.arange(u_resolution)[:, None] * row + np.arange(v_resolution)).ravel()
+        corner_offset = np.array([0, row, row + 1, 0, row + 1, 1])
+        corners = (cell_start[:, None] + corner_offset).ravel()
+
+        points = points.reshape(-1, 3)
+        position = points[corners]
+        triangles = position.reshape(-1, 3, 3)
+        face_normals = ParametricGeometry._normals(triangles[:, 0], triangles[:, 1], triangles[:, 2])
+        return {
+            "position": position,
+            "color": np.tile(ParametricGeometry._CELL_COLORS, (len(cell_start), 1)),
+            "uv": uvs.reshape(-1, 2)[corners],
+            "vertex_normal": vertex_normals.reshape(-1, 3)[corners],
+            "face_normal": np.repeat(face_normals, 3, axis=0),
+        }
 
-        position_list = []
-        texture_position_list = []
-        vertex_normal_list = []
-        for u_index in range(u_resolution + 1):
-            xyz_list = []
-            uv_list = []
-            n_list = []
-            for v_index in range(v_resolution + 1):
-                # 3D vertex coordinates
-                u = u_start + u_index * delta_u
-                v = v_start + v_index * delta_v
-                p = surface_function(u, v)
-                xyz_list.append(p)
-                # 3D normal coordinates
-                p1 = surface_function(u + delta_u/1e3, v)
-                p2 = surface_function(u, v + delta_v/1e3)
-                normal_vector = self.calculate_normal(p, p1, p2)
-                n_list.append(normal_vector)
-                # 2D texture coordinates
-                u_texture = u_index / u_resolution
-                v_texture = v_index / v_resolution
-                uv_list.append([u_texture, v_texture])
-            position_list.append(xyz_list)
-            vertex_normal_list.append(n_list)
-            texture_position_list.append(uv_list)
-
-        # Store vertex data
-        position_data = []
-        color_data = []
-        uv_data = []
-        # default vertex colors
-        c1, c2, c3 = [1, 0, 0], [0, 1, 0], [0, 0, 1]
-        c4, c5, c6 = [0, 1, 1], [1, 0, 1], [1, 1, 0]
-        vertex_normal_data = []
-        face_normal_data = []
-
-        # Group vertex data into triangles.
-        # Note: .copy() is necessary to avoid storing references.
-        # position_data will be also copied in apply_matrix() in the Geometry class.
-        for i_index in range(u_resolution):
-            for j_index in range(v_resolution):
-                # position data
-                p_a = position_list[i_index + 0][j_index + 0]
-                p_b = position_list[i_index + 1][j_index + 0]
-                p_c = position_list[i_index + 1][j_index + 1]
-                p_d = position_list[i_index + 0][j_index + 1]
-                position_data += [p_a.copy(), p_b.copy(), p_c.copy(),
-                                  p_a.copy(), p_c.copy(), p_d.copy()]
-                # color data
-                color_data += [c1, c2, c3,
-                               c4, c5, c6]
-                # uv data of texture coordinates
-                uv_a = texture_position_list[i_index + 0][j_index + 0]
-                uv_b = texture_position_list[i_index + 1][j_index + 0]
-                uv_c = texture_position_list[i_index + 1][j_index + 1]
-                uv_d = texture_position_list[i_index + 0][j_index + 1]
-                uv_data += [uv_a, uv_b, uv_c,
-                            uv_a, uv_c, uv_d]
-                # vertex normal vectors
-                n_a = vertex_normal_list[i_index + 0][j_index + 0]
-                n_b = vertex_normal_list[i_index + 1][j_index + 0]
-                n_c = vertex_normal_list[i_index + 1][j_index + 1]
-                n_d = vertex_normal_list[i_index + 0][j_index + 1]
-                vertex_normal_data += [n_a.copy(), n_b.copy(), n_c.copy(),
-                                       n_a.copy(), n_c.copy(), n_d.copy()]
-                # face normal vectors
-                fn0 = self.calculate_normal(p_a, p_b, p_c)
-                fn1 = self.calculate_normal(p_a, p_c, p_d)
-                face_normal_data += [fn0.copy(), fn0.copy(), fn0.copy(),
-                                     fn1.copy(), fn1.copy(), fn1.copy()]
-
-        self.add_attribute("vec3", "vertexPosition", position_data)
-        self.add_attribute("vec3", "vertexColor", color_data)
-        self.add_attribute("vec2", "vertexUV", uv_data)
-        self.add_attribute("vec3", "vertexNormal", vertex_normal_data)
-        self.add_attribute("vec3", "faceNormal", face_normal_data)
+    @staticmethod
+    def _evaluate(surface_function, u, v):
+        """ Call a vectorized surface function; constant coordinates are broadcast to the grid """
+        x, y, z = np.broadcast_arrays(*[np.asarray(c, dtype=float) for c in surface_function(u, v)])
+        return np.stack([x, y, z], axis=-1)
+
+    @staticmethod
+    def _evaluate_points(surface_function, u, v):
+        """ Call a surface function once per point of the grid """
+        points = [surface_function(u_value, v_value) for u_value, v_value in zip(u.ravel(), v.ravel())]
+        return np.array(points, dtype=float).reshape(u.shape + (3,))
+
+    @staticmethod
+    def _normals(p0, p1, p2):
+        """ calculate_normal for arrays of points, along the last axis """
+        orthogonal_vectors = np.cross(p1 - p0, p2 - p0)
+        norms = np.linalg.norm(orthogonal_vectors, axis=-1, keepdims=True)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(norms > 1e-6, orthogonal_vectors / norms,
+                            p0 / np.linalg.norm(p0, axis=-1, keepdims=True))
 
     @staticmethod
     def calculate_normal(p0, p1, p2):
@@ -103,3 +103,41 @@ class ParametricGeometry(Geometry):
         normal_vector = orthogonal_vector / norm if norm > 1e-6 \
             else np.array(p0) / np.linalg.norm(p0)
         return normal_vector
+
+
+def benchmark(resolution=512, repeat=3):
+    """
+    Time the tessellation of the sky sphere and of a large surface,
+    calling the surface function per point and once for the whole grid
+    """
+    import time
+    import math
+
+    def sphere_point(u, v):
+        return [math.sin((1 - v) * math.pi) * math.cos(2 * math.pi * u),
+                math.sin((1 - v) * math.pi) * math.sin(2 * math.pi * u),
+                math.cos((1 - v) * math.pi)]
+
+    def sphere_grid(u, v):
+        return [np.sin((1 - v) * np.pi) * np.cos(2 * np.pi * u),
+                np.sin((1 - v) * np.pi) * np.sin(2 * np.pi * u),
+                np.cos((1 - v) * np.pi)]
+
+    for name, u_resolution, v_resolution in [("sky sphere", 32, 16),
+                                             (f"{resolution}x{resolution} surface", resolution, resolution)]:
+        timings = []
+        for surface_function, vectorized in [(sphere_point, False), (sphere_grid, True)]:
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                data = ParametricGeometry.tessellate(0, 1, u_resolution, 0, 1, v_resolution,
+                                                     surface_function, vectorized)
+                best = min(best, time.perf_counter() - start)
+            timings.append(best)
+        print(f"{name}: {len(data['position'])} vertices")
+        print(f"per point  {timings[0] * 1000:10.1f} ms")
+        print(f"whole grid {timings[1] * 1000:10.1f} ms  ({timings[0] / timings[1]:.0f}x)")
+
+
+if __name__ == '__main__':
+    benchmark()
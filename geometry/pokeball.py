@@ -7,8 +7,9 @@ class pokeballGeometry(Geometry):
         super().__init__()
 
         # Carregar vértices do arquivo .obj
-        vertices, texture = my_obj_reader('objetos/pokeball.obj')
+        vertices, texture, index = my_obj_reader('objetos/pokeball.obj', indexed=True)
 
 
         self.add_attribute("vec3", "vertexPosition", vertices)
         self.add_attribute("vec2", "vertexUV", texture)
+        self.set_index(index)
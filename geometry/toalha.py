@@ -6,8 +6,9 @@ class ToalhaGeometry(Geometry):
     def __init__(self):
         super().__init__()
 
-        vertices, texture = my_obj_reader('objetos/toalha.obj')
+        vertices, texture, index = my_obj_reader('objetos/toalha.obj', indexed=True)
 
 
         self.add_attribute("vec3", "vertexPosition", vertices)
-        self.add_attribute("vec2", "vertexUV", texture)
\ No newline at end of file
+        self.add_attribute("vec2", "vertexUV", texture)
+        self.set_index(index)
\ No newline at end of file
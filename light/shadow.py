@@ -27,6 +27,8 @@ class Shadow:
         )
         # Render only depth data to target texture
         self._material = DepthMaterial()
+        # Same, for instanced meshes: all the instances in one draw call
+        self._instanced_material = DepthMaterial(use_instancing=True)
         # Controls darkness of shadow
         self._strength = strength
         # Used to avoid visual artifacts due to
@@ -45,6 +47,10 @@ class Shadow:
     def material(self):
         return self._material
 
+    @property
+    def instanced_material(self):
+        return self._instanced_material
+
     @property
     def light_source(self):
         return self._light_source
@@ -59,5 +65,6 @@ class Shadow:
 
     def update_internal(self):
         self._camera.update_view_matrix()
-        self._material.uniform_dict["viewMatrix"].data = self._camera.view_matrix
-        self._material.uniform_dict["projectionMatrix"].data = self._camera.projection_matrix
+        for material in (self._material, self._instanced_material):
+            material.uniform_dict["viewMatrix"].data = self._camera.view_matrix
+            material.uniform_dict["projectionMatrix"].data = self._camera.projection_matrix
@@ -1,11 +1,29 @@
+import argparse
+import os
+import sys
+
+# Sem ecrã (servidores, CI): python main.py --headless --frames 300
+# O ambiente tem de ser configurado antes de importar o OpenGL
+if "--headless" in sys.argv:
+    from core import headless
+    headless.setup_environment()
+
 import numpy as np
 import pygame
 
 from core.menu import GameMenu
 from core.base import Base
+from core.headless import save_image
+from core.resource_tracker import ResourceTracker
+from core.utils import Utils
+from core_ext.asset_registry import AssetRegistry
 from core_ext.camera import Camera
 from core_ext.renderer2 import Renderer
 from core_ext.scene import Scene
+from core_ext.texture_cache import TextureCache
+from core_ext.texture_loader import TextureLoader
+from extras.camera_path import CameraPath
+from extras.profiler_overlay import ProfilerOverlay
 from extras.movement_rig import MovementRig
 from extras.movement_rig3 import MovementRig3
 from music.music import Music
@@ -25,8 +43,25 @@ class Main(Base):
         print("Para mexer a camera usar as teclas q(esquerda),e (direita),t (cima), g(baixo) ou o cursor")
         print("Para mudar a camera telca 'c', espaço para saltar e shift para sprintar")
       
+        # Guardar os binários dos shaders entre execuções
+        Utils.program_binary_dir = "__shadercache__"
+
+        # As imagens das texturas são lidas em segundo plano;
+        # até estarem prontas as texturas mostram uma cor neutra.
+        # A cache guarda as texturas reduzidas (qualidade "high": até 1024 px)
+        # e com os mipmaps já calculados
+        self.texture_loader = TextureLoader(cache=TextureCache(quality="high"))
+        AssetRegistry.texture_loader = self.texture_loader
+
         # Criação da cena e rigs
         self.renderer = Renderer()
+        # Profiler: F3 liga/desliga (com os tempos no ecrã), F4 grava profile.csv e profile.json
+        self.renderer.profiler = self.profiler
+        # Em modo headless as imagens são desenhadas no render target
+        self.renderer.default_render_target = self.render_target
+        # Em modo headless os tempos são recolhidos mas não desenhados: as imagens têm de ser iguais em cada execução
+        self.profiler_overlay = None if self.headless else ProfilerOverlay(self.profiler, self.renderer.window_size)
+        self.camera_path = None
         self.scene = Scene()
         self.rig = MovementRig()
         self.rig3 = MovementRig3()
@@ -34,6 +69,9 @@ class Main(Base):
         # Criação do nivel
         self.Nivel1 = Nivel1(self.scene, self.rig, self.rig3, self.time)
         self.objects_to_ignore = self.Nivel1.objects_to_ignore
+        # Em modo headless todas as imagens têm de ser iguais em cada execução
+        if self.headless:
+            self.texture_loader.wait()
 
         # Adiciona os objetos a serem ignorados
         self.objects_to_ignore.append(self.rig)
@@ -75,6 +113,10 @@ class Main(Base):
 
         Music()
 
+        # Recursos partilhados (texturas, geometrias e shaders)
+        print(AssetRegistry.report())
+        Utils.print_program_cache_stats()
+
     def camera_cinematografica(self):
         '''
         Função que controla a camera cinematográfica
@@ -126,27 +168,63 @@ class Main(Base):
         '''
         Função que atualiza o jogo
         '''
-        self.Nivel1.distort_material.uniform_dict["time"].data += self.delta_time/5
-        self.Nivel1.time = self.time
-       
-        self.TempoCounter.check_if_player_fell()
-        self.TempoCounter.check_if_player_reached_start()
-        self.TempoCounter.check_if_player_reached_end()
-
-        self.camera_cinematografica()
-        self.Nivel1.update_Cubos()
-        self.Nivel1.update_jump(self.delta_time)
-        self.checkpoint()
-        self.camera_change()
-        
-        collision = self.Coli.check_collisions(self.camera, self.static_camera, self.rig, self.rig3, self._delta_time)
-
-        self.rig.update(self.input, self.delta_time, collision)
-        self.rig3.update(self.input, self.delta_time, collision)
-            
-        self.renderer.render(self.scene, self.active_camera)
+        # Envia para a GPU as texturas que acabaram de ser lidas
+        with self.profiler.scope("textures"):
+            self.texture_loader.update(time_budget=0.005)
+
+        with self.profiler.scope("game"):
+            self.Nivel1.distort_material.uniform_dict["time"].data += self.delta_time/5
+            self.Nivel1.time = self.time
+
+            self.TempoCounter.check_if_player_fell()
+            self.TempoCounter.check_if_player_reached_start()
+            self.TempoCounter.check_if_player_reached_end()
+
+            self.camera_cinematografica()
+            self.Nivel1.update_Cubos()
+            self.Nivel1.update_jump(self.delta_time)
+            self.checkpoint()
+            self.camera_change()
+
+        with self.profiler.scope("collision"):
+            collision = self.Coli.check_collisions(self.camera, self.static_camera, self.rig, self.rig3, self._delta_time)
+
+        with self.profiler.scope("rigs"):
+            self.rig.update(self.input, self.delta_time, collision)
+            self.rig3.update(self.input, self.delta_time, collision)
+
+        with self.profiler.scope("render"):
+            self.renderer.render(self.scene, self.active_camera)
         self.TempoCounter.updateCurrentTime(self.Nivel1.cTime1)
 
+        # Tempos no ecrã enquanto o profiler está ligado; o overlay não conta para render.draw nem para render_stats
+        if self.profiler.enabled and self.profiler_overlay is not None:
+            self.profiler_overlay.update(self.renderer.render_stats)
+            self.profiler_overlay.render(self.renderer)
+        if self.input.is_key_down("f4"):
+            self.profiler.export_csv("profile.csv")
+            self.profiler.export_json("profile.json")
+            print(self.profiler.report())
+        # F5 começa/termina a gravação do percurso da câmara, repetido pelo benchmark
+        if self.input.is_key_down("f5"):
+            if self.camera_path is None:
+                self.camera_path = CameraPath()
+                self.camera_path_start = self.time
+            else:
+                self.camera_path.save("camera_path.json")
+                print(f"camera_path.json: {len(self.camera_path.keyframe_list)} keyframes")
+                self.camera_path = None
+        if self.camera_path is not None:
+            self.camera_path.record(self.active_camera, self.time - self.camera_path_start)
+
+    def shutdown(self):
+        '''
+        Função chamada ao sair do jogo
+        '''
+        self.texture_loader.shutdown()
+        # Objetos da GPU ainda vivos; os marcados como "leaked" perderam o dono sem release()
+        print(ResourceTracker.report())
+
 
 def main():
     pygame.init()
@@ -161,8 +239,34 @@ def main():
             pass
     pygame.quit()
 
-if __name__ == "__main__":
-    main()
+def run_headless(frame_count, output_dir=None, save_every=60):
+    '''
+    Desenha frame_count imagens sem ecrã, com passo de tempo fixo;
+    opcionalmente guarda uma imagem a cada save_every frames
+    '''
+    def on_frame(game, frame_index):
+        if output_dir is not None and frame_index % save_every == 0:
+            save_image(game.render_target, os.path.join(output_dir, f"frame_{frame_index:05d}.png"))
+
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+    game = Main(screen_size=[800, 600], headless=True)
+    game.profiler.enabled = True
+    game.run_frames(frame_count, on_frame=on_frame)
+    print(game.profiler.report())
+    return game
 
-# Instantiate this class and run the program
-Main(screen_size=[800, 600]).run()
\ No newline at end of file
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="BeachRush")
+    parser.add_argument("--headless", action="store_true", help="render offscreen, without a window")
+    parser.add_argument("--frames", type=int, default=300, help="frames to render in headless mode")
+    parser.add_argument("--output", help="folder for the images saved in headless mode")
+    parser.add_argument("--save-every", type=int, default=60, help="save one image every this many frames")
+    arguments = parser.parse_args()
+    if arguments.headless:
+        run_headless(arguments.frames, arguments.output, arguments.save_every)
+    else:
+        main()
+        # Instantiate this class and run the program
+        Main(screen_size=[800, 600]).run()
\ No newline at end of file
@@ -3,17 +3,25 @@ from material.material import Material
 
 class DepthMaterial(Material):
 
-    def __init__(self):
+    def __init__(self, use_instancing=False):
+        # Instanced meshes (InstancedMesh) supply one model matrix per instance
+        if use_instancing:
+            instance_declaration = "in mat4 instanceMatrix;"
+            instance_transform = " * instanceMatrix"
+        else:
+            instance_declaration = ""
+            instance_transform = ""
         # vertex shader code
         vertex_shader_code = """
         in vec3 vertexPosition;
+        """ + instance_declaration + """
         uniform mat4 projectionMatrix;
         uniform mat4 viewMatrix;
         uniform mat4 modelMatrix;
         
         void main()
         {
-            gl_Position = projectionMatrix * viewMatrix * modelMatrix * vec4(vertexPosition, 1);
+            gl_Position = projectionMatrix * viewMatrix * modelMatrix""" + instance_transform + """ * vec4(vertexPosition, 1);
         }
         """
 
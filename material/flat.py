@@ -27,15 +27,7 @@ class FlatMaterial(LightedMaterial):
 
     @property
     def vertex_shader_code(self):
-        return """
-            struct Light
-            {
-                int lightType;  // 1 = AMBIENT, 2 = DIRECTIONAL, 3 = POINT
-                vec3 color;  // used by all lights
-                vec3 direction; // used by directional lights
-                vec3 position;  // used by point lights
-                vec3 attenuation;  // used by all lights
-            };""" + self.declaring_light_uniforms_in_shader_code + """
+        return self.frame_uniforms_in_shader_code + """
             vec3 calculateLight(Light light, vec3 pointPosition, vec3 pointNormal)
             {
                 float ambient = 0;
@@ -70,8 +62,6 @@ class FlatMaterial(LightedMaterial):
                 return light.color * (ambient + diffuse + specular);
             }
             
-            uniform mat4 projectionMatrix;
-            uniform mat4 viewMatrix;
             uniform mat4 modelMatrix;
             in vec3 vertexPosition;
             in vec2 vertexUV;
@@ -1,5 +1,6 @@
 import OpenGL.GL as GL
 
+from core_ext.frame_uniforms import FrameUniforms
 from material.lighted import LightedMaterial
 
 
@@ -33,7 +34,7 @@ class LambertMaterial(LightedMaterial):
             self.add_uniform("bool", "useShadow", False)
         else:
             self.add_uniform("bool", "useShadow", True)
-            self.add_uniform("Shadow", "shadow0", None)
+            self.add_uniform("int", "shadowDepthTextureSampler", FrameUniforms.SHADOW_TEXTURE_UNIT)
 
         self.locate_uniforms()
 
@@ -47,9 +48,7 @@ class LambertMaterial(LightedMaterial):
 
     @property
     def vertex_shader_code(self):
-        return """
-            uniform mat4 projectionMatrix;
-            uniform mat4 viewMatrix;
+        return self.frame_uniforms_in_shader_code + """
             uniform mat4 modelMatrix;
             in vec3 vertexPosition;
             in vec2 vertexUV;
@@ -58,23 +57,7 @@ class LambertMaterial(LightedMaterial):
             out vec2 UV;
             out vec3 normal;
             
-            struct Shadow
-            {
-                // direction of light that casts shadow
-                vec3 lightDirection;
-                // data from camera that produces depth texture
-                mat4 projectionMatrix;
-                mat4 viewMatrix;
-                // texture that stores depth values from shadow camera
-                sampler2D depthTextureSampler;
-                // regions in shadow multiplied by (1-strength)
-                float strength;
-                // reduces unwanted visual artifacts
-                float bias;
-            };
-            
             uniform bool useShadow;
-            uniform Shadow shadow0;
             out vec3 shadowPosition0;
 
             void main()
@@ -86,7 +69,7 @@ class LambertMaterial(LightedMaterial):
                 
                 if (useShadow)
                 {
-                    vec4 temp0 = shadow0.projectionMatrix * shadow0.viewMatrix * modelMatrix * vec4(vertexPosition, 1);
+                    vec4 temp0 = shadowProjectionMatrix * shadowViewMatrix * modelMatrix * vec4(vertexPosition, 1);
                     shadowPosition0 = vec3(temp0);
                 }            
             }
@@ -94,16 +77,7 @@ class LambertMaterial(LightedMaterial):
 
     @property
     def fragment_shader_code(self):
-        return """        
-            struct Light
-            {
-                int lightType;  // 1 = AMBIENT, 2 = DIRECTIONAL, 3 = POINT
-                vec3 color;  // used by all lights
-                vec3 direction;  // used by directional lights
-                vec3 position;  // used by point lights
-                vec3 attenuation;  // used by directional lights
-            };\n\n""" \
-            + self.declaring_light_uniforms_in_shader_code + """
+        return self.frame_uniforms_in_shader_code + """
             vec3 calculateLight(Light light, vec3 pointPosition, vec3 pointNormal)
             {
                 float ambient = 0;
@@ -149,23 +123,8 @@ class LambertMaterial(LightedMaterial):
             in vec3 normal;
             out vec4 fragColor;
             
-            struct Shadow
-            {
-                // direction of light that casts shadow
-                vec3 lightDirection;
-                // data from camera that produces depth texture
-                mat4 projectionMatrix;
-                mat4 viewMatrix;
-                // texture that stores depth values from shadow camera
-                sampler2D depthTextureSampler;
-                // regions in shadow multiplied by (1-strength)
-                float strength;
-                // reduces unwanted visual artifacts
-                float bias;
-            };
-            
             uniform bool useShadow;
-            uniform Shadow shadow0;
+            uniform sampler2D shadowDepthTextureSampler;
             in vec3 shadowPosition0;
 
             void main()
@@ -187,18 +146,18 @@ class LambertMaterial(LightedMaterial):
                 if (useShadow)
                 {
                     // determine if surface is facing towards light direction
-                    float cosAngle = dot(normalize(normal), -normalize(shadow0.lightDirection));
+                    float cosAngle = dot(normalize(normal), -normalize(shadowLightDirection));
                     bool facingLight = (cosAngle > 0.01);
                     // convert range [-1, 1] to range [0, 1]
                     // for UV coordinate and depth information
                     vec3 shadowCoord = (shadowPosition0.xyz + 1.0) / 2.0;
-                    float closestDistanceToLight = texture(shadow0.depthTextureSampler, shadowCoord.xy).r;
+                    float closestDistanceToLight = texture(shadowDepthTextureSampler, shadowCoord.xy).r;
                     float fragmentDistanceToLight = clamp(shadowCoord.z, 0, 1);
                     // determine if fragment lies in shadow of another object
-                    bool inShadow = (fragmentDistanceToLight > closestDistanceToLight + shadow0.bias);
+                    bool inShadow = (fragmentDistanceToLight > closestDistanceToLight + shadowBias);
                     if (facingLight && inShadow)
                     {
-                        float s = 1.0 - shadow0.strength;
+                        float s = 1.0 - shadowStrength;
                         color *= vec4(s, s, s, 1);
                     }
                 }               
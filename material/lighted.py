@@ -1,26 +1,27 @@
+from core_ext.frame_uniforms import FrameUniforms
 from material.material import Material
 
 
 class LightedMaterial(Material):
     def __init__(self, number_of_light_sources=1):
+        if number_of_light_sources > FrameUniforms.MAX_LIGHTS:
+            raise ValueError(f"At most {FrameUniforms.MAX_LIGHTS} light sources are supported")
         self._number_of_light_sources = number_of_light_sources
         # Properties vertex_shader_code and fragment_shader_code
         # will be defined in inherited classes FlatMaterial, LambertMaterial,
         # and PhongMaterial
         super().__init__(self.vertex_shader_code, self.fragment_shader_code)
-        # Add light uniforms to self._uniform_dict
-        for i in range(self._number_of_light_sources):
-            self.add_uniform("Light", f"light{i}", None)
+        # Lights, camera position and shadow data are not material uniforms:
+        # the renderer uploads them once per frame to the FrameData block
 
     @property
-    def declaring_light_uniforms_in_shader_code(self):
-        """ Create a text line with light uniforms to be inserted into a shader code """
-        return "\n" + "\n".join(f"\t\t\tuniform Light light{i};"
-                                for i in range(self._number_of_light_sources)) + "\n"
+    def frame_uniforms_in_shader_code(self):
+        """ Declaration of the per-frame uniform block, with the Light struct and the light array """
+        return FrameUniforms.shader_code
 
     @property
     def adding_lights_in_shader_code(self):
-        return "\n" + "\n".join(f"\t\t\t\tlight += calculateLight(light{i}, position, calcNormal);"
+        return "\n" + "\n".join(f"\t\t\t\tlight += calculateLight(lights[{i}], position, calcNormal);"
                                 for i in range(self._number_of_light_sources))
 
     @property
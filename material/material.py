@@ -1,12 +1,17 @@
 import OpenGL.GL as GL
+import numpy as np
 
+from core.resource_tracker import GLResource
 from core.uniform import Uniform
-from core.utils import Utils
+from core.uniform_buffer import UniformBuffer
+from core_ext.asset_registry import AssetRegistry
+from core_ext.frame_uniforms import FrameUniforms
 
 
-class Material:
+class Material(GLResource):
     def __init__(self, vertex_shader_code, fragment_shader_code):
-        self._program_ref = Utils.initialize_program(vertex_shader_code, fragment_shader_code)
+        # Materials with identical shader code share one compiled program
+        self._program_ref = AssetRegistry.program(vertex_shader_code, fragment_shader_code)
         # Store Uniform objects, indexed by name of associated variable in shader.
         # Each shader typically contains these uniforms; values will be set during render process from Mesh / Camera.
         self._uniform_dict = {
@@ -16,7 +21,9 @@ class Material:
         }
         # Store OpenGL render settings, indexed by variable name
         self._setting_dict = {
-            "drawStyle": GL.GL_TRIANGLES
+            "drawStyle": GL.GL_TRIANGLES,
+            # Transparent meshes are drawn after the opaque ones, from back to front
+            "transparent": False,
         }
 
     @property
@@ -38,6 +45,47 @@ class Material:
         """ Initialize all uniform variable references """
         for variable_name, uniform_object in self._uniform_dict.items():
             uniform_object.locate_variable(self._program_ref, variable_name)
+        # Shaders that declare the per-frame block read it from the shared uniform buffer
+        UniformBuffer.bind_block(self._program_ref, FrameUniforms.BLOCK_NAME, FrameUniforms.BINDING_POINT)
+
+    @property
+    def settings_key(self):
+        """ Meshes with equal keys need no render state change between their draws """
+        return (type(self).__name__,) + tuple(sorted(self._setting_dict.items()))
+
+    @property
+    def texture_key(self):
+        """ Texture objects read by the shader, used to group draws by texture """
+        return tuple(uniform_object.data[0] for uniform_object in self._uniform_dict.values()
+                     if uniform_object.data_type == "sampler2D")
+
+    @property
+    def batch_key(self):
+        """
+        Materials with equal keys draw a vertex in the same way, so their meshes
+        can be merged into one draw call; the transform matrices are left out
+        """
+        uniform_values = []
+        for variable_name, uniform_object in self._uniform_dict.items():
+            if variable_name in ("modelMatrix", "viewMatrix", "projectionMatrix"):
+                continue
+            data = uniform_object.data
+            if isinstance(data, (int, float, list, tuple, np.ndarray)):
+                value = np.asarray(data, dtype=float).tobytes()
+            else:
+                # Objects such as lights are only equal to themselves
+                value = id(data)
+            uniform_values.append((variable_name, uniform_object.data_type, value))
+        return (self._program_ref, self.settings_key, tuple(uniform_values))
+
+    def release(self):
+        """
+        Give back the reference to the shared program; AssetRegistry.evict_unused()
+        deletes it once no material uses it. Textures are not owned by the material.
+        """
+        if self._program_ref is not None:
+            AssetRegistry.release(self._program_ref)
+            self._program_ref = None
 
     def update_render_settings(self):
         """ Configure OpenGL with render settings """
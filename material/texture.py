@@ -4,19 +4,27 @@ from material.material import Material
 
 
 class TextureMaterial(Material):
-    def __init__(self, texture, property_dict=None):
+    def __init__(self, texture, property_dict=None, use_instancing=False):
+        # Instanced meshes (InstancedMesh) supply one model matrix per instance
+        if use_instancing:
+            instance_declaration = "in mat4 instanceMatrix;"
+            instance_transform = " * instanceMatrix"
+        else:
+            instance_declaration = ""
+            instance_transform = ""
         vertex_shader_code = """
             uniform mat4 projectionMatrix;
             uniform mat4 viewMatrix;
             uniform mat4 modelMatrix;
             in vec3 vertexPosition;
             in vec2 vertexUV;
+            """ + instance_declaration + """
             uniform vec2 repeatUV;
             uniform vec2 offsetUV;
             out vec2 UV;
             void main()
             {
-                gl_Position = projectionMatrix * viewMatrix * modelMatrix * vec4(vertexPosition, 1.0);
+                gl_Position = projectionMatrix * viewMatrix * modelMatrix""" + instance_transform + """ * vec4(vertexPosition, 1.0);
                 UV = vertexUV * repeatUV + offsetUV;
             }
         """
@@ -1,9 +1,12 @@
 import math
 import numpy as np
 
+from core.matrix import Matrix
+from core_ext.asset_registry import AssetRegistry
+from core_ext.instanced_mesh import InstancedMesh
 from core_ext.mesh import Mesh
-from core_ext.texture import Texture
-from extras.text_texture import TextTexture
+from core_ext.static_batcher import StaticBatcher
+from extras.text_mesh import TextMesh
 from geometry.animal import animalGeometry
 from geometry.arvore import ArvoreGeometry
 from geometry.bola import bolaGeometry
@@ -75,6 +78,10 @@ class Nivel1:
         self.rig3 = rig3
         self.time = time
         self.objects_to_ignore = []
+        # Objetos que nunca se movem e partilham material, juntos numa só malha;
+        # os objetos repetidos do nível são malhas instanciadas e os cubos servem às colisões,
+        # por isso só os portais entram (3 draw calls passam a 1)
+        self.static_meshes = []
 
         # Luz ambiente
         self.ambient_light = AmbientLight(color=[0.1, 0.1, 0.1])
@@ -87,8 +94,8 @@ class Nivel1:
         self.objects_to_ignore.append(self.directional_light)
 
         # Oceano
-        rgb_noise_texture = Texture("images/rgb-noise.jpg")
-        water_texture = Texture("images/water.jpg")
+        rgb_noise_texture = AssetRegistry.texture("images/rgb-noise.jpg")
+        water_texture = AssetRegistry.texture("images/water.jpg")
         self.distort_material = Material(vertex_shader_code, fragment_shader_code)
         self.distort_material.add_uniform("sampler2D", "rgbNoise", [rgb_noise_texture.texture_ref, 1])
         self.distort_material.add_uniform("sampler2D", "image", [water_texture.texture_ref, 2])
@@ -96,7 +103,7 @@ class Nivel1:
         self.distort_material.add_uniform("vec2", "repeatUV", [10, 10])
         self.distort_material.locate_uniforms()
 
-        ocean_geometry = RectangleGeometry(width=200, height=100)
+        ocean_geometry = AssetRegistry.geometry(RectangleGeometry, width=200, height=100)
         self.ocean = Mesh(ocean_geometry, self.distort_material)
         self.ocean.rotate_x(-math.pi/2)
         self.ocean.set_position([0, 0, -55])
@@ -104,16 +111,16 @@ class Nivel1:
         self.objects_to_ignore.append(self.ocean)
 
         # Céu
-        sky_geometry = SphereGeometry(radius=100)
-        sky_material = TextureMaterial(texture=Texture(file_name="images/sky.jpg"))
+        sky_geometry = AssetRegistry.geometry(SphereGeometry, radius=100)
+        sky_material = TextureMaterial(texture=AssetRegistry.texture("images/sky.jpg"))
         self.sky = Mesh(sky_geometry, sky_material)
         self.scene.add(self.sky)
         self.objects_to_ignore.append(self.sky)
 
         # Areia
-        sand_geometry = RectangleGeometry(width=200, height=100)
+        sand_geometry = AssetRegistry.geometry(RectangleGeometry, width=200, height=100)
         sand_material = TextureMaterial(
-            texture=Texture(file_name="images/sand.jpg"),
+            texture=AssetRegistry.texture("images/sand.jpg"),
             property_dict={"repeatUV": [20, 20]}
         )
         self.sand = Mesh(sand_geometry, sand_material)
@@ -124,35 +131,31 @@ class Nivel1:
 
         
         # Passadiço vertical
-        passa_material = TextureMaterial(texture=Texture("images/passa.png"))
-        passa_geometry = passaGeometry()
+        passa_material = TextureMaterial(texture=AssetRegistry.texture("images/passa.png"), use_instancing=True)
+        passa_geometry = AssetRegistry.geometry(passaGeometry)
         passa_positions = [
                            [30,-2,55.5],[30,-2,64],[30,-2,72.5],[30,-2,81],[30,-2,89.5]
                            ]
-        for position in passa_positions:
-            passa = Mesh(passa_geometry, passa_material)
-            passa.set_position(position)
-            self.scene.add(passa)
-            self.objects_to_ignore.append(passa)
+        passa = InstancedMesh.from_positions(passa_geometry, passa_material, passa_positions)
+        self.scene.add(passa)
+        self.objects_to_ignore.append(passa)
 
         # Passadiço horizontal
-        passa_material = TextureMaterial(texture=Texture("images/passa.png"))
-        passa_geometry = passa2Geometry()
+        passa_material = TextureMaterial(texture=AssetRegistry.texture("images/passa.png"), use_instancing=True)
+        passa_geometry = AssetRegistry.geometry(passa2Geometry)
         passa_positions = [
                            [-80.5,-2,53.5],[-72,-2,53.5],[-63.5,-2,53.5], [-55,-2,53.5],[-46.5,-2,53.5],
                            [-38,-2,53.5], [-29.5,-2,53.5],[-21,-2,53.5],[-12.5,-2,53.5],[-4,-2,53.5],
                            [4.5,-2,53.5],[13,-2,53.5],[21.5,-2,53.5],[30,-2,53.5],[38.5,-2,53.5],
                            [30,-2,53.5],[38.5,-2,53.5],[47,-2,53.5],[55.5,-2,53.5],[64,-2,53.5],[72.5,-2,53.5],[81,-2,53.5]
                            ]
-        for position in passa_positions:
-            passa = Mesh(passa_geometry, passa_material)
-            passa.set_position(position)
-            self.scene.add(passa)
-            self.objects_to_ignore.append(passa)
+        passa = InstancedMesh.from_positions(passa_geometry, passa_material, passa_positions)
+        self.scene.add(passa)
+        self.objects_to_ignore.append(passa)
 
         # Árvores
-        arvore_material = TextureMaterial(texture=Texture("images/arvore2.jpg"))
-        arvore_geometry = ArvoreGeometry()
+        arvore_material = TextureMaterial(texture=AssetRegistry.texture("images/arvore2.jpg"), use_instancing=True)
+        arvore_geometry = AssetRegistry.geometry(ArvoreGeometry)
         arvore_positions= [
                         [-70, -3, 60],[-60, -3, 60],[-50, -3, 60],[-40, -3, 60],[-30, -3, 60],
                         [-20, -3, 60],[-10, -3, 60],[10, -3, 60],
@@ -169,15 +172,13 @@ class Nivel1:
                         [20, -3, 80],[25, -3, 80],[35, -3, 80],[40, -3, 80],
                         [50, -3, 80],
                         ]
-        for position in arvore_positions:
-            arvore = Mesh(arvore_geometry, arvore_material)
-            arvore.set_position(position)
-            self.scene.add(arvore)
-            self.objects_to_ignore.append(arvore)
+        arvore = InstancedMesh.from_positions(arvore_geometry, arvore_material, arvore_positions)
+        self.scene.add(arvore)
+        self.objects_to_ignore.append(arvore)
 
         # Rochas
-        rocks_material = TextureMaterial(texture=Texture("images/rock.jpg"))
-        rocks_geometry = rocksGeometry()
+        rocks_material = TextureMaterial(texture=AssetRegistry.texture("images/rock.jpg"), use_instancing=True)
+        rocks_geometry = AssetRegistry.geometry(rocksGeometry)
         rock_positions = [
                           [-80, -1, -50],[-80, -1, -45],[-80, -1, -40],[-80, -1, -35],[-80, -1, -30],[-80, -1, -25],
                           [-80, -1, -20],[-80, -1, -15],[-80, -1, -10],[-80, -1, -5],[-80, -1, 0],
@@ -188,77 +189,76 @@ class Nivel1:
                           [85, -1, 0],[85, -1, 5],[85, -1, 10],[85, -1, 15],[85, -1, 20],[85, -1, 25],
                           [85, -1, 30],[85, -1, 35],[85, -1, 40],[83, -1, 45],
                           ]
-        for position in rock_positions:
-            rocks = Mesh(rocks_geometry, rocks_material)
-            rocks.set_position(position)
-            self.scene.add(rocks)
-            self.objects_to_ignore.append(rocks)
+        rocks = InstancedMesh.from_positions(rocks_geometry, rocks_material, rock_positions)
+        self.scene.add(rocks)
+        self.objects_to_ignore.append(rocks)
 
         # Toalhas
-        texturas = ["images/SLB.jpg", "images/goku.png", "images/master.jpg", "images/lakers.png", "images/mario.png", "images/psg.png", "images/loveless.png", "images/pompup.png", "images/fish.png", "images/muppets.png", "images/owl.png", "images/wazowski.png"]
-        toalha_geometry = ToalhaGeometry()
+        texturas = ["images/slb.jpg", "images/goku.png", "images/master.jpg", "images/lakers.png", "images/mario.png", "images/psg.png", "images/loveless.png", "images/pompup.png", "images/fish.png", "images/muppets.png", "images/owl.png", "images/wazowski.png"]
+        toalha_geometry = AssetRegistry.geometry(ToalhaGeometry)
         toalha_positions = [[-50, 0, 15],[-50, 0, 10],[-35, 0, 5],[-35, 0, 2],[-20, 0, 10],
                             [-15, 0, 10],[-15, 0, 5],[-10, 0, 5],[-10, 0, 10],[-7, 0, 15],[-6, 0, 10],[-2, 0, 5],
                             [0, 0, 10],[6, 0, 10],[10, 0, 5],[14, 0, 10],[16, 0, 15],[19, 0, 5],[22, 0, 10],
                             [25, 0, 5],[35, 0, 5],[40, 0, 15],[40, 0, 7],[55, 0, 10],[55, 0, 5],[70, 0, 10],[70, 0, 15]]
+        # Todas as imagens das toalhas numa só textura (atlas), partilhada por um só material;
+        # o registo guarda o atlas, que assim não aparece como perdido no relatório de recursos
+        toalha_atlas = AssetRegistry.texture_atlas(texturas, max_image_size=512)
+        toalha_material = TextureMaterial(texture=toalha_atlas, use_instancing=True)
+        # Uma malha instanciada por textura escolhida, com as coordenadas UV da sua imagem no atlas
+        toalha_matrices = {}
         for position in toalha_positions:
-            toalha_material = TextureMaterial(texture=Texture(np.random.choice(texturas)))
-            toalha = Mesh(toalha_geometry, toalha_material)
-            toalha.set_position(position)
-            toalha.scale(2.5)
+            textura = np.random.choice(texturas)
+            matrix = Matrix.make_translation(*position) @ Matrix.make_scale(2.5)
+            toalha_matrices.setdefault(textura, []).append(matrix)
+        for textura, matrices in toalha_matrices.items():
+            toalha = InstancedMesh(toalha_atlas.remap_geometry(toalha_geometry, textura), toalha_material, matrices)
             self.scene.add(toalha)
             self.objects_to_ignore.append(toalha)
 
         # Sombrinhas
-        sombrinha_material = TextureMaterial(texture=Texture("images/parasol.jpg"))
-        sombrinha_geometry = sombrinhaGeometry()
+        sombrinha_material = TextureMaterial(texture=AssetRegistry.texture("images/parasol.jpg"), use_instancing=True)
+        sombrinha_geometry = AssetRegistry.geometry(sombrinhaGeometry)
         sombrinha_positions= [
                         [-60, 0, 7],[-40, 0, 2],[-30, 0, 4.5],[-20, 0, 2],[-10, 0, 8],
                         [10, 0, 3],[20, 0, 2],[30, 0, 4.5],[40, 0, 2],[60, 0, 7]
                         ]
-        for position in sombrinha_positions:
-            sombrinha = Mesh(sombrinha_geometry, sombrinha_material)
-            sombrinha.set_position(position)
-            self.scene.add(sombrinha)
-            self.objects_to_ignore.append(sombrinha)
+        sombrinha = InstancedMesh.from_positions(sombrinha_geometry, sombrinha_material, sombrinha_positions)
+        self.scene.add(sombrinha)
+        self.objects_to_ignore.append(sombrinha)
 
         # Cadeiras
-        cadeira_material = TextureMaterial(texture=Texture("images/whool.jpg"))
-        cadeira_geometry = cadeiraGeometry()
+        cadeira_material = TextureMaterial(texture=AssetRegistry.texture("images/whool.jpg"), use_instancing=True)
+        cadeira_geometry = AssetRegistry.geometry(cadeiraGeometry)
         cadeira_positions= [
                         [-59, 0, 9],[-39, 0, 4],[-29, 0, 6.5],[-19, 0, 4],[-9, 0, 10],
                         [9, 0, 5],[19, 0, 4],[29, 0, 6.5],[39, 0, 4],[59, 0, 9],
                         ]
-        for position in cadeira_positions:
-            cadeira = Mesh(cadeira_geometry, cadeira_material)
-            cadeira.set_position(position)
-            self.scene.add(cadeira)
-            self.objects_to_ignore.append(cadeira)
+        cadeira = InstancedMesh.from_positions(cadeira_geometry, cadeira_material, cadeira_positions)
+        self.scene.add(cadeira)
+        self.objects_to_ignore.append(cadeira)
 
         # Espreguiçadeiras
-        espreguica_material = TextureMaterial(texture=Texture("images/esp.jpg"))
-        espreguica_geometry = espreguicaGeometry()
+        espreguica_material = TextureMaterial(texture=AssetRegistry.texture("images/esp.jpg"), use_instancing=True)
+        espreguica_geometry = AssetRegistry.geometry(espreguicaGeometry)
         espreguica_positions= [
                         [-59, 0, 40],[-39, 0, 40],[-29, 0, 40],[-19, 0, 40],[-9, 0, 40],
                         [9, 0, 40],[19, 0, 40],[29, 0, 40],[39, 0, 40],[59, 0, 40],
                         ]
-        for position in espreguica_positions:
-            espreguica = Mesh(espreguica_geometry, espreguica_material)
-            espreguica.set_position(position)
-            self.scene.add(espreguica)
-            self.objects_to_ignore.append(espreguica)
+        espreguica = InstancedMesh.from_positions(espreguica_geometry, espreguica_material, espreguica_positions)
+        self.scene.add(espreguica)
+        self.objects_to_ignore.append(espreguica)
 
         # Casa
-        casa_material = TextureMaterial(texture=Texture("images/casa.png"))
-        casa_geometry = casaGeometry()
+        casa_material = TextureMaterial(texture=AssetRegistry.texture("images/casa.png"))
+        casa_geometry = AssetRegistry.geometry(casaGeometry)
         casa = Mesh(casa_geometry, casa_material, True, 5)
         casa.set_position([-30, 0, 30])
         self.scene.add(casa)
 
 
         # Óculos
-        oculos_material = TextureMaterial(texture=Texture("images/oculos.jpg"))
-        oculos_geometry = OculosGeometry()
+        oculos_material = TextureMaterial(texture=AssetRegistry.texture("images/oculos.jpg"))
+        oculos_geometry = AssetRegistry.geometry(OculosGeometry)
         self.oculos = Mesh(oculos_geometry, oculos_material)
         self.oculos.set_position([0, 0, 0.09])
         self.oculos.rotate_y(179.1)
@@ -266,25 +266,28 @@ class Nivel1:
         self.objects_to_ignore.append(self.oculos)
 
         # Portais
-        portal_material = TextureMaterial(texture=Texture("images/portal.jpg"))
-        portal_geometry = portalGeometry()
+        portal_material = TextureMaterial(texture=AssetRegistry.texture("images/portal.jpg"))
+        portal_geometry = AssetRegistry.geometry(portalGeometry)
         portal = Mesh(portal_geometry, portal_material)
         portal.set_position([-18, 52.0, 48.0])
         self.scene.add(portal)
         self.objects_to_ignore.append(portal)
+        self.static_meshes.append(portal)
         portal = Mesh(portal_geometry, portal_material)
         portal.set_position([-24, 52.0, -50.0])
         portal.rotate_y(math.pi/2)
         self.scene.add(portal)
         self.objects_to_ignore.append(portal)
+        self.static_meshes.append(portal)
         portal = Mesh(portal_geometry, portal_material)
         portal.set_position([48,32,2])
         self.scene.add(portal)
         self.objects_to_ignore.append(portal)
+        self.static_meshes.append(portal)
 
         # Placa das direções
-        placa_material = TextureMaterial(texture=Texture("images/p2.png"))
-        placa_geometry = placaGeometry()
+        placa_material = TextureMaterial(texture=AssetRegistry.texture("images/p2.png"))
+        placa_geometry = AssetRegistry.geometry(placaGeometry)
         placa = Mesh(placa_geometry, placa_material)
         placa.set_position([-2, 0, 16])
         self.scene.add(placa)
@@ -292,43 +295,43 @@ class Nivel1:
 
 
         # Placa das instruções
-        stand_material = TextureMaterial(texture=Texture("images/metal.jpg"))
-        stand_geometry = standGeometry()
+        stand_material = TextureMaterial(texture=AssetRegistry.texture("images/metal.jpg"))
+        stand_geometry = AssetRegistry.geometry(standGeometry)
         self.stand = Mesh(stand_geometry, stand_material)
         self.stand.set_position([8, 0, 14])
         self.scene.add(self.stand)
 
         # Animais
-        animal_material = TextureMaterial(texture=Texture("images/k2.png"))
-        animal_geometry = animalGeometry()
+        animal_material = TextureMaterial(texture=AssetRegistry.texture("images/k2.png"))
+        animal_geometry = AssetRegistry.geometry(animalGeometry)
         animal = Mesh(animal_geometry, animal_material)
         animal.set_position([-10, -1, -25])
         self.scene.add(animal)
-        golfinho_material = TextureMaterial(texture=Texture("images/golfinho.jpg"))
-        golfinho_geometry = golfinhoGeometry()
+        golfinho_material = TextureMaterial(texture=AssetRegistry.texture("images/golfinho.jpg"))
+        golfinho_geometry = AssetRegistry.geometry(golfinhoGeometry)
         golfinho = Mesh(golfinho_geometry, golfinho_material)
         golfinho.set_position([-5, -0.25, -20])
         self.scene.add(golfinho)
 
         # Bola
-        bola_material = TextureMaterial(texture=Texture("images/volleyball.png"))
-        bola_geometry = bolaGeometry()
+        bola_material = TextureMaterial(texture=AssetRegistry.texture("images/volleyball.png"))
+        bola_geometry = AssetRegistry.geometry(bolaGeometry)
         bola = Mesh(bola_geometry, bola_material)
         bola.set_position([-5, 0.15, -3.5])
         self.scene.add(bola)
 
         # Easter Egg
-        pokeball_material = TextureMaterial(texture=Texture("images/poke.png"))
-        pokeball_geometry = pokeballGeometry()
+        pokeball_material = TextureMaterial(texture=AssetRegistry.texture("images/poke.png"))
+        pokeball_geometry = AssetRegistry.geometry(pokeballGeometry)
         pokeball = Mesh(pokeball_geometry, pokeball_material)
         pokeball.set_position([0, -0.001, -12])
         self.scene.add(pokeball)
         self.objects_to_ignore.append(pokeball)
 
         # Boneco
-        modelo_material = TextureMaterial(texture=Texture("images/Cor_Modelo.jpg"))
-        modelo_geometry = ModeloGeometry()
-        modelopul_geometry = ModeloPulGeometry()
+        modelo_material = TextureMaterial(texture=AssetRegistry.texture("images/Cor_Modelo.jpg"))
+        modelo_geometry = AssetRegistry.geometry(ModeloGeometry)
+        modelopul_geometry = AssetRegistry.geometry(ModeloPulGeometry)
         self.modelo = Mesh(modelo_geometry, modelo_material)
         self.modelopul = Mesh(modelopul_geometry, modelo_material)
         self.modelo.set_position([0, 0, 0])
@@ -339,29 +342,27 @@ class Nivel1:
         self.objects_to_ignore.append(self.modelo)
 
         # Current time
-        RectGeometry = RectangleGeometry(width=2)
-        cTime = TextTexture(text= f"0 s",
-                               system_font_name="Impact",
+        # O texto é desenhado a partir do atlas de caracteres da fonte;
+        # mudar o texto só reescreve os vértices
+        self.cTime1 = TextMesh(text="0 s", system_font_name="Impact",
                                font_size=32, font_color=[200, 0, 0],
-                               image_width=600, image_height=300, transparent=True)
-        materialT = TextureMaterial(cTime)
-        self.cTime1 = Mesh(RectGeometry, materialT)
+                               pixel_size=1/300, position=(-1, 0.5), alignment=(0, 1), max_length=24)
         self.cTime1.set_position([2.5, 4.1, -4])
         self.rig.add(self.cTime1)
         self.rig3.add(self.cTime1)
         self.objects_to_ignore.append(self.cTime1)
 
         # Nadador salvador
-        salva_material = TextureMaterial(texture=Texture("images/mass_monster.png"))
-        salva_geometry = salvaGeometry()
+        salva_material = TextureMaterial(texture=AssetRegistry.texture("images/mass_monster.png"))
+        salva_geometry = AssetRegistry.geometry(salvaGeometry)
         salva = Mesh(salva_geometry, salva_material)
         salva.set_position([-25, 4.8, 20])
         self.scene.add(salva)
         self.objects_to_ignore.append(salva)
 
         # Cubos
-        cubo_material = TextureMaterial(texture=Texture("images/mine.png"))
-        cubo_geometry = CuboGeometry()
+        cubo_material = TextureMaterial(texture=AssetRegistry.texture("images/mine.png"))
+        cubo_geometry = AssetRegistry.geometry(CuboGeometry)
         cubo = Mesh(cubo_geometry, cubo_material)
         self.cube_positions = {
             "grupo1": [[-1.75, 2.0, 19.5], [-1.75, 4.0, 27.5], [-1.75, 6.0, 35.5]],
@@ -408,6 +409,21 @@ class Nivel1:
                 self.scene.add(cubo)
                 self.cube_meshes[grupo].append(cubo)
 
+        # Passo final da construção do nível
+        self.build_static_batches()
+
+    def build_static_batches(self):
+        '''
+        Junta os objetos estáticos que partilham material numa só malha,
+        reduzindo o número de draw calls. As malhas juntas saem da cena.
+        Objetos com material único não ganham nada e ficam de fora.
+        '''
+        batcher = StaticBatcher(keep_bounds=True)
+        batch_list = batcher.batch(self.scene, self.static_meshes)
+        # As malhas juntas não entram nas colisões
+        self.objects_to_ignore.extend(batch_list)
+        return batcher.stats
+
     def update_jump(self, delta_time):
         if self.rig.is_jumping:
             if self.modelo in self.rig._look_attachment.children_list:
@@ -5,10 +5,7 @@ import time
 
 import numpy as np
 
-from core_ext.mesh import Mesh
-from extras.text_texture import TextTexture
-from geometry.rectangle import RectangleGeometry
-from material.texture import TextureMaterial
+from extras.text_mesh import TextMesh
 
 
 class Tempo:
@@ -26,21 +23,15 @@ class Tempo:
         self.final_portal_position = [48, 26, 2]
 
         self.time_file_path = pathlib.Path("time_records.txt")
-        self.tempos_string = "|| "
-        for i, time in enumerate(self.get_three_lowest_times(self.time_file_path)):
-            self.tempos_string += f"{i+1} -> {time:.0f} s  || "
+        self.tempos_string = self.leaderboard_string(self.get_three_lowest_times(self.time_file_path))
 
         self.rig = rig
         self.rig3 = rig3
 
         # LeaderBoard
-        geometry = RectangleGeometry(width=2)
-        message = TextTexture(text=self.tempos_string,
-                            system_font_name="Impact",
-                            font_size=32, font_color=[200, 0, 0],
-                            image_width=600, image_height=300, transparent=True)
-        material = TextureMaterial(message)
-        self.mensagem = Mesh(geometry, material)
+        self.mensagem = TextMesh(text=self.tempos_string, system_font_name="Impact",
+                                 font_size=32, font_color=[200, 0, 0],
+                                 pixel_size=1/300, position=(-1, 0.5), alignment=(0, 1), max_length=64)
         self.mensagem.set_position([-1.3, 4.1, -4])
         self.rig.add(self.mensagem)
         self.rig3.add(self.mensagem)
@@ -58,6 +49,15 @@ class Tempo:
                     time_str = line.split("Time:")[1].strip().split()[0]
                     times.append(float(time_str))
         return sorted(times)[:3]
+
+    def leaderboard_string(self, times):
+        '''
+        Build the leaderboard text from the best times.
+        '''
+        tempos_string = "|| "
+        for i, time in enumerate(times):
+            tempos_string += f"{i+1} -> {time:.0f} s  || "
+        return tempos_string
     
     def start_timer(self):
         '''
@@ -125,28 +125,19 @@ class Tempo:
             self.rig3.set_position([0, 0, 0])  # Reset player position
             time_file_path = pathlib.Path("time_records.txt")
             self.three_lowest_times = self.get_three_lowest_times(time_file_path)
-            message = TextTexture(text=self.tempos_string,
-                               system_font_name="Impact",
-                               font_size=32, font_color=[200, 0, 0],
-                               image_width=600, image_height=300, transparent=True)
-            material = TextureMaterial(message)
-            self.mensagem._material = material
+            self.tempos_string = self.leaderboard_string(self.three_lowest_times)
+            self.mensagem.set_text(self.tempos_string)
             self.checkPoint = False
 
     def updateCurrentTime(self, cTime1):
         '''
-        Update the current time text.
+        Update the current time text; the mesh only changes when the shown second changes.
         '''
         if self.timer_running:
             elapsed_time = time.time() - self.start_time
         else:
             elapsed_time = 0
-        cTime = TextTexture(text= f" Current Time: {elapsed_time:.0f} s",
-                               system_font_name="Impact",
-                               font_size=32, font_color=[200, 0, 0],
-                               image_width=600, image_height=300, transparent=True)
-        materialT = TextureMaterial(cTime)
-        cTime1._material = materialT
+        cTime1.set_text(f" Current Time: {elapsed_time:.0f} s")
 
     '''
     if self.TempoCounter.timer_running: